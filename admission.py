@@ -0,0 +1,193 @@
+"""
+Admission control for heavy statement parses.
+
+estimate_cost() prices an upload in page-equivalents from its type, size
+and (for PDFs) page count. Uploads below HEAVY_COST are parsed straight
+away. Heavy ones must take one of MAX_HEAVY_PER_PROCESS in-process slots
+and one of MAX_HEAVY_PER_HOST host-wide slots; host slots are flock()ed
+files under ADMISSION_DIR, so they are shared by every gunicorn worker and
+released automatically if a worker dies.
+
+This assumes gunicorn's sync workers (gunicorn.conf.py), where a request
+that waits for a slot blocks its whole worker. So nothing waits: when no
+slot is free, admit() raises Overloaded at once and the app answers 503
+with Retry-After. The host cap defaults to one less than WEB_CONCURRENCY,
+so however many heavy parses arrive, one worker stays free for cheap
+requests such as /health, which never touch any of this.
+
+A slot's holder writes its pid into the slot file, so stats() counts busy
+slots by reading the files and never competes with admit() for the locks.
+"""
+import fcntl
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+ADMISSION_DIR = os.environ.get("ADMISSION_DIR", "data/admission")
+# Page-equivalents from which an upload counts as heavy
+HEAVY_COST = float(os.environ.get("ADMISSION_HEAVY_COST", 20))
+MAX_HEAVY_PER_PROCESS = int(os.environ.get("ADMISSION_MAX_PER_PROCESS", 1))
+# Keeps one sync worker out of heavy parses (WEB_CONCURRENCY is set by gunicorn.conf.py)
+MAX_HEAVY_PER_HOST = int(os.environ.get(
+    "ADMISSION_MAX_PER_HOST", max(1, int(os.environ.get("WEB_CONCURRENCY", 2)) - 1)
+))
+RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", 10))
+
+# Bytes of input that cost about as much to parse as one PDF page
+_BYTES_PER_UNIT = {
+    ".pdf": 60 * 1024,
+    ".csv": 256 * 1024,
+    ".xlsx": 64 * 1024,
+    ".xls": 64 * 1024,
+    ".docx": 32 * 1024,
+}
+_PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+# Only the first bytes are scanned for page objects
+_PAGE_SCAN_BYTES = 64 * 1024 * 1024
+
+
+class Overloaded(Exception):
+    """No capacity for a heavy parse; retry_after is a hint in seconds."""
+
+    def __init__(self, reason, retry_after=RETRY_AFTER):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _pdf_pages(path) -> int:
+    """Page objects visible in the raw file (0 when they sit in compressed streams)."""
+    try:
+        with open(path, "rb") as f:
+            return len(_PAGE_RE.findall(f.read(_PAGE_SCAN_BYTES)))
+    except OSError:
+        return 0
+
+
+def estimate_cost(path) -> float:
+    """Approximate parse cost of an upload, in PDF-page equivalents."""
+    ext = os.path.splitext(path.lower())[1]
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 0.0
+    cost = size / _BYTES_PER_UNIT.get(ext, 64 * 1024)
+    if ext == ".pdf":
+        cost = max(cost, _pdf_pages(path))
+    return round(cost, 1)
+
+
+# ──────────────────────────────────────────────────────────
+# Counters (per process)
+# ──────────────────────────────────────────────────────────
+_process_slots = threading.BoundedSemaphore(MAX_HEAVY_PER_PROCESS)
+_counter_lock = threading.Lock()
+_counters = {
+    "light": 0,
+    "admitted": 0,
+    "rejected_process_busy": 0,
+    "rejected_host_busy": 0,
+    "running": 0,
+}
+
+
+def _count(**deltas):
+    with _counter_lock:
+        for key, delta in deltas.items():
+            _counters[key] += delta
+
+
+# ──────────────────────────────────────────────────────────
+# Host-wide slots
+# ──────────────────────────────────────────────────────────
+def _try_slot(kind, count):
+    """Return an open file holding one of count flock slots, or None if all are taken."""
+    os.makedirs(ADMISSION_DIR, exist_ok=True)
+    for i in range(count):
+        f = open(os.path.join(ADMISSION_DIR, f"{kind}-{i}.lock"), "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            continue
+        f.truncate(0)
+        f.write(f"{os.getpid()}\n")
+        f.flush()
+        return f
+    return None
+
+
+def _release(f):
+    if f is not None:
+        f.truncate(0)
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+
+def _holder_alive(path) -> bool:
+    """True when the slot file names a running process (its holder)."""
+    try:
+        with open(path) as f:
+            pid = int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return False
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        # Died holding the slot; the kernel already dropped its flock
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _busy_slots(kind, count) -> int:
+    """How many of the host's slots are held right now (read from the slot files, for metrics)."""
+    return sum(
+        _holder_alive(os.path.join(ADMISSION_DIR, f"{kind}-{i}.lock")) for i in range(count)
+    )
+
+
+@contextmanager
+def admit(cost):
+    """
+    Hold capacity for a parse of the given cost for the duration of the
+    with-block. Raises Overloaded when no slot is free; it never waits.
+    """
+    if cost < HEAVY_COST:
+        _count(light=1)
+        yield
+        return
+
+    if not _process_slots.acquire(blocking=False):
+        _count(rejected_process_busy=1)
+        raise Overloaded("worker busy with another large statement")
+    host_slot = _try_slot("run", MAX_HEAVY_PER_HOST)
+    if host_slot is None:
+        _process_slots.release()
+        _count(rejected_host_busy=1)
+        raise Overloaded("server busy with other large statements")
+
+    _count(admitted=1, running=1)
+    try:
+        yield
+    finally:
+        _count(running=-1)
+        _release(host_slot)
+        _process_slots.release()
+
+
+def stats() -> dict:
+    """Per-process counters plus live host-wide slot usage."""
+    with _counter_lock:
+        out = dict(_counters)
+    out.update(
+        host_running=_busy_slots("run", MAX_HEAVY_PER_HOST),
+        heavy_cost=HEAVY_COST,
+        max_per_process=MAX_HEAVY_PER_PROCESS,
+        max_per_host=MAX_HEAVY_PER_HOST,
+    )
+    return out
@@ -0,0 +1,204 @@
+"""
+Batch analysis of a directory tree of statements, without the web app.
+
+    python batch.py INPUT_DIR OUTPUT_DIR [--workers N] [--password PW]
+
+Every supported file under INPUT_DIR is parsed and analysed with
+engine.process_file() on a process pool, one file per task. OUTPUT_DIR
+receives
+
+    files/<relative path>.parquet   analysed transactions of each file
+    transactions.parquet            all of them, with a Source column
+    summary.json                    per-file status, rows and timings plus
+                                    overall throughput (files, rows and
+                                    input MB per second)
+
+Categorisation runs in-process inside each worker (the pool already uses
+every core). Each file is parsed under memguard's per-process growth cap,
+so one oversized statement fails on its own instead of taking the run down.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import engine
+import memguard
+import money
+import parallel
+from parsers import (
+    PasswordRequired, WrongPassword, UnsupportedFormat, ParseError, MemoryBudgetExceeded,
+)
+from result_store import arrow_table
+
+EXTENSIONS = (".pdf", ".csv", ".xlsx", ".xls", ".docx")
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1))
+FILES_SUBDIR = "files"
+COMBINED_NAME = "transactions.parquet"
+SUMMARY_NAME = "summary.json"
+
+# Columns written for every file; Source is added in the combined output
+COLUMNS = ("Date", "Description", "Debit", "Credit", "Balance", "Amount",
+           "Reconciled", "Category", "Merchant")
+
+
+def _schema():
+    import pyarrow as pa
+
+    # Amounts are exact: the frame's int64 paise as decimal(18, 2) rupees
+    amount = pa.decimal128(money.DECIMAL_PRECISION, money.DECIMAL_SCALE)
+    return pa.schema([
+        ("Date", pa.date32()),
+        ("Description", pa.string()),
+        ("Debit", amount),
+        ("Credit", amount),
+        ("Balance", amount),
+        ("Amount", amount),
+        ("Reconciled", pa.bool_()),
+        ("Category", pa.string()),
+        ("Merchant", pa.string()),
+    ])
+
+
+def find_statements(root) -> list:
+    """Relative paths of supported statement files under root, sorted."""
+    found = []
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name.lower())[1] in EXTENSIONS:
+                found.append(os.path.relpath(os.path.join(directory, name), root))
+    return found
+
+
+# ──────────────────────────────────────────────────────────
+# Worker side
+# ──────────────────────────────────────────────────────────
+def _init_worker():
+    # Files are already spread over processes; no nested categorisation pool
+    parallel.CATEGORIZE_WORKERS = 1
+    engine.warm_up()
+
+
+def _write_frame(df, path):
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(arrow_table(df[list(COLUMNS)], _schema()), path, compression="zstd")
+
+
+def analyse_file(root, rel, out_dir, password=None) -> dict:
+    """Parse, analyse and write one statement; returns its summary record."""
+    path = os.path.join(root, rel)
+    record = {"file": rel, "bytes": os.path.getsize(path)}
+    started = time.perf_counter()
+    try:
+        with memguard.request_scope():
+            df, agg = engine.process_file(path, password)
+        output = os.path.join(FILES_SUBDIR, rel + ".parquet")
+        _write_frame(df, os.path.join(out_dir, output))
+    except PasswordRequired:
+        record.update(status="needs_password")
+    except WrongPassword:
+        record.update(status="wrong_password")
+    except UnsupportedFormat:
+        record.update(status="unsupported")
+    except MemoryBudgetExceeded as e:
+        record.update(status="too_large", error=str(e))
+    except ParseError as e:
+        record.update(status="parse_error", error=str(e))
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    else:
+        record.update(
+            status="ok",
+            output=output,
+            rows=len(df),
+            pages=df.attrs.get("pages"),
+            debits=money.rupees(agg["debits"]),
+            credits=money.rupees(agg["credits"]),
+        )
+    record["seconds"] = round(time.perf_counter() - started, 4)
+    return record
+
+
+# ──────────────────────────────────────────────────────────
+# Parent side
+# ──────────────────────────────────────────────────────────
+def combine(out_dir, records):
+    """Concatenate the per-file outputs, in file order, into COMBINED_NAME."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _schema().append(pa.field("Source", pa.string()))
+    path = os.path.join(out_dir, COMBINED_NAME)
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for record in sorted(records, key=lambda r: r["file"]):
+            if record["status"] != "ok":
+                continue
+            table = pq.read_table(os.path.join(out_dir, record["output"]))
+            source = pa.array([record["file"]] * table.num_rows, type=pa.string())
+            writer.write_table(table.append_column("Source", source))
+    return path
+
+
+def run(root, out_dir, workers=BATCH_WORKERS, password=None, log=print) -> dict:
+    """Analyse every statement under root into out_dir; returns the summary."""
+    files = find_statements(root)
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    records = []
+    with ProcessPoolExecutor(max_workers=max(1, workers), initializer=_init_worker) as pool:
+        futures = [pool.submit(analyse_file, root, rel, out_dir, password) for rel in files]
+        for done, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            records.append(record)
+            if log:
+                log(f"[{done}/{len(files)}] {record['status']:<14} {record['file']}")
+    combine(out_dir, records)
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in records if r["status"] == "ok"]
+    rows = sum(r["rows"] for r in ok)
+    input_bytes = sum(r["bytes"] for r in records)
+    statuses = {}
+    for r in records:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+    summary = {
+        "input": os.path.abspath(root),
+        "workers": workers,
+        "files": len(records),
+        "statuses": statuses,
+        "rows": rows,
+        "input_mb": round(input_bytes / 2 ** 20, 2),
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(len(records) / elapsed, 2) if elapsed else None,
+        "rows_per_sec": round(rows / elapsed) if elapsed else None,
+        "mb_per_sec": round(input_bytes / 2 ** 20 / elapsed, 2) if elapsed else None,
+        "combined": COMBINED_NAME,
+        "results": sorted(records, key=lambda r: r["file"]),
+    }
+    with open(os.path.join(out_dir, SUMMARY_NAME), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a directory tree of bank statements.")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--password", default=None,
+                        help="password tried on encrypted PDFs")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    summary = run(args.input_dir, args.output_dir, args.workers, args.password,
+                  log=None if args.quiet else print)
+    summary.pop("results")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Throughput of categorisation + merchant extraction on a synthetic ledger,
+serially and sharded across 1..N worker processes (parallel.py).
+
+    python -m bench.categorize [--rows 1000000] [--workers 1,2,4,8]
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+
+def synthetic_ledger(rows, seed=42):
+    import train
+
+    random.seed(seed)
+    items = list(train.CANDIDATE_DATA.items())
+    descs = []
+    for _ in range(rows):
+        category, brands = random.choice(items)
+        descs.append(train.generate_sample(category, random.choice(brands)))
+    amounts = np.round(np.random.default_rng(seed).lognormal(6, 1.5, rows), 2)
+    return descs, amounts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", default="1,2,4,8")
+    args = parser.parse_args()
+
+    # Measure categorisation itself: no shared cache here or in the workers
+    os.environ["SHARED_CACHE_MB"] = "0"
+    import engine
+    import parallel
+
+    descs, amounts = synthetic_ledger(args.rows)
+    results = []
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        parallel.CATEGORIZE_WORKERS = workers
+        parallel.PARALLEL_MIN_ROWS = 0 if workers > 1 else args.rows + 1
+        parallel._pool = None
+        if workers > 1:
+            # Start the pool (and load the model in each worker) before timing
+            parallel.categorize_frame(descs[:workers], amounts[:workers],
+                                      engine.categorize_many, engine.extract_merchant)
+        started = time.perf_counter()
+        categories, merchants = parallel.categorize_frame(
+            descs, amounts, engine.categorize_many, engine.extract_merchant
+        )
+        elapsed = time.perf_counter() - started
+        rate = args.rows / elapsed
+        baseline = baseline or rate
+        results.append({"workers": workers, "seconds": round(elapsed, 3),
+                        "rows_per_sec": round(rate), "speedup": round(rate / baseline, 2)})
+        if parallel._pool is not None:
+            parallel._pool.shutdown()
+    print(json.dumps({"rows": args.rows, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Per-row memory of the transaction frame in the compact layout of txframe.py
+against the previous one (object strings for Date, Description, Category
+and Merchant, float rupees), on large synthetic analysed ledgers.
+
+Two ledgers are measured: one with the repeating narrations of the
+training generator, and one where nearly every narration carries its own
+UPI/NEFT/IMPS reference, as on real statements (Description then stays a
+plain column, see txframe.MAX_UNIQUE_RATIO). For each, reports the deep
+size per row of every column and of the whole frame, the Parquet size the
+result store writes, and the time of the aggregation and cube stages on
+both layouts. Both layouts must aggregate to the same figures before
+anything is reported.
+
+    python -m bench.frame [--rows 1000000]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+
+_BANKS = ("HDFC", "ICIC", "SBIN", "UTIB", "KKBK")
+_HANDLES = ("ybl", "okaxis", "oksbi", "paytm", "ibl")
+# Narrations without a reference number (these do repeat on statements)
+_PLAIN_SHARE = 0.05
+
+
+def reference_narration(brand, i) -> str:
+    """A statement narration for brand carrying the row's own reference number."""
+    # 7_919_993 is coprime with 10**12, so references never repeat
+    ref = f"{(i * 7_919_993 + 123_456_789) % 10 ** 12:012d}"
+    name = brand.upper()
+    kind = random.random()
+    if kind < 0.6:
+        return f"UPI/{ref}/{name}/{name.lower().replace(' ', '')}@{random.choice(_HANDLES)}/Payment"
+    if kind < 0.8:
+        return f"NEFT-{random.choice(_BANKS)}N{ref}-{name}"
+    return f"IMPS/P2A/{ref}/{name}"
+
+
+def legacy_ledger(rows, seed=42, narrations="repeating") -> pd.DataFrame:
+    """
+    An analysed ledger in the previous layout, one statement date string per
+    row. narrations is "repeating" (training generator) or "unique"
+    (reference_narration).
+    """
+    import train
+
+    random.seed(seed)
+    rng = np.random.default_rng(seed)
+    items = list(train.CANDIDATE_DATA.items())
+    descs, categories, merchants = [], [], []
+    for i in range(rows):
+        category, brands = random.choice(items)
+        brand = random.choice(brands)
+        if narrations == "unique" and random.random() >= _PLAIN_SHARE:
+            descs.append(reference_narration(brand, i))
+        else:
+            descs.append(train.generate_sample(category, brand))
+        categories.append(category)
+        merchants.append(brand.title())
+    days = pd.Timestamp("2020-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 5 * 365, rows)), unit="D")
+    amounts = np.round(rng.lognormal(6, 1.5, rows), 2)
+    credit = rng.random(rows) < 0.2
+    debit = np.where(credit, 0.0, amounts)
+    credit_amt = np.where(credit, amounts, 0.0)
+    return pd.DataFrame({
+        "Date": days.strftime("%d/%m/%Y").tolist(),
+        "Description": descs,
+        "Debit": debit,
+        "Credit": credit_amt,
+        "Balance": np.round(1e6 + np.cumsum(credit_amt - debit), 2),
+        "Amount": np.where(credit, -amounts, amounts),
+        "Reconciled": True,
+        "Category": categories,
+        "Merchant": merchants,
+    })
+
+
+def _per_row(df) -> dict:
+    usage = df.memory_usage(index=False, deep=True)
+    return {col: round(usage[col] / len(df), 1) for col in df.columns}
+
+
+def _parquet_bytes(df) -> int:
+    from result_store import parquet_ready
+
+    buf = io.BytesIO()
+    parquet_ready(df).to_parquet(buf, compression="zstd")
+    return buf.tell()
+
+
+def _stages(df, per_rupee):
+    """
+    (seconds, figures) of the aggregation and cube stages over df, the
+    money figures in rupees (per_rupee: units of df's amounts to a rupee).
+    """
+    import cube
+    import engine
+
+    started = time.perf_counter()
+    agg = engine.aggregate(df)
+    result_cube = cube.build_cube(df, agg["day"])
+    seconds = time.perf_counter() - started
+    figures = (
+        round(float(agg["debits"]) / per_rupee, 2),
+        round(float(agg["credits"]) / per_rupee, 2),
+        (agg["by_category"] / per_rupee).round(2).sort_index().to_dict(),
+        len(result_cube),
+        int(result_cube["count"].sum()),
+    )
+    return seconds, figures
+
+
+def _compare(legacy) -> dict:
+    """Memory, Parquet size and stage times of legacy against its compact layout."""
+    import money
+    import txframe
+
+    started = time.perf_counter()
+    compact = txframe.compact(legacy.copy())
+    convert_seconds = time.perf_counter() - started
+
+    legacy_seconds, legacy_figures = _stages(legacy, 1)
+    compact_seconds, compact_figures = _stages(compact, money.PAISE_PER_RUPEE)
+    if legacy_figures != compact_figures:
+        raise SystemExit("the compact frame aggregates differently from the legacy one")
+
+    legacy_row = txframe.bytes_per_row(legacy)
+    compact_row = txframe.bytes_per_row(compact)
+    return {
+        "rows": len(legacy),
+        "unique": {col: int(legacy[col].nunique()) for col in ("Date", "Description", "Category", "Merchant")},
+        "identical_aggregates": True,
+        "legacy_bytes_per_row": round(legacy_row, 1),
+        "compact_bytes_per_row": round(compact_row, 1),
+        "reduction": round(1 - compact_row / legacy_row, 3),
+        "legacy_columns": _per_row(legacy),
+        "compact_columns": _per_row(compact),
+        "compact_seconds": round(convert_seconds, 3),
+        "legacy_parquet_bytes": _parquet_bytes(legacy),
+        "compact_parquet_bytes": _parquet_bytes(compact),
+        "legacy_aggregate_seconds": round(legacy_seconds, 3),
+        "compact_aggregate_seconds": round(compact_seconds, 3),
+        "description_dtype": str(compact["Description"].dtype),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    # Aggregation only; no shared categorisation cache needed
+    os.environ["SHARED_CACHE_MB"] = "0"
+    print(json.dumps({
+        narrations: _compare(legacy_ledger(args.rows, narrations=narrations))
+        for narrations in ("repeating", "unique")
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""
+HTTP load test of the web app: latency percentiles, throughput and error
+rate per endpoint and file type, over a sweep of concurrency levels.
+
+Synthetic statements are generated once (CSV, XLSX, a table-layout PDF and
+a password-protected PDF) and uploaded by N client threads in a weighted
+random mix (--mix), for --duration seconds per concurrency level. A
+protected PDF goes to /analyze without a password and is then unlocked
+through /retry-password; each request is timed under its own endpoint.
+Unless --url points at a running server, gunicorn is started with
+gunicorn.conf.py on --port, with its results, admission slots, profiles
+and shared cache in a temporary directory.
+
+A request is ok when it returns the dashboard (or, for the first step of a
+protected PDF, the password prompt). Everything else is an error; 503s from
+admission control are also counted as "rejected". Latency percentiles are
+over ok requests, throughput over all of them.
+
+    python -m bench.loadtest [--concurrency 1,2,4,8] [--duration 20]
+                             [--mix csv=6,xlsx=2,pdf=1,locked_pdf=1]
+                             [--rows 500] [--pdf-rows 150] [--workers 2] [--url URL]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KINDS = ("csv", "xlsx", "pdf", "locked_pdf")
+PDF_PASSWORD = "loadtest"
+HEADER = ["Date", "Narration", "Withdrawal", "Deposit", "Balance"]
+NARRATIONS = ["UPI/SWIGGY/swiggy@ybl", "NEFT-SALARY ACME LTD", "POS DMART PUNE", "ATM WDL MUMBAI",
+              "IMPS-rahul@oksbi", "NETFLIX.COM", "INTEREST CREDIT", "REFUND AMAZON", "CC PAYMENT HDFC",
+              "UPI-ZOMATO-zomato@hdfcbank", "BESCOM ELECTRICITY BILL", "UBER INDIA TRIP"]
+
+
+# ──────────────────────────────────────────────────────────
+# Fixtures
+# ──────────────────────────────────────────────────────────
+def ledger(rows, seed=0) -> list:
+    """rows statement lines (Date, Narration, Withdrawal, Deposit, Balance) as strings."""
+    import datetime
+
+    rng = random.Random(seed)
+    balance = 250000.0
+    day = datetime.date(2024, 1, 1)
+    out = []
+    for i in range(rows):
+        amount = round(rng.uniform(10, 8000), 2)
+        credit = rng.random() < 0.2
+        balance += amount if credit else -amount
+        date = day + datetime.timedelta(days=i // 4)
+        out.append([
+            date.strftime("%d/%m/%Y"), rng.choice(NARRATIONS),
+            "" if credit else f"{amount:,.2f}", f"{amount:,.2f}" if credit else "", f"{balance:,.2f}",
+        ])
+    return out
+
+
+def csv_bytes(rows) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(HEADER)
+    writer.writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+
+def xlsx_bytes(rows) -> bytes:
+    import pandas as pd
+
+    buf = io.BytesIO()
+    pd.DataFrame(rows, columns=HEADER).to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def _pdf_text(s):
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_stream(rows, first) -> bytes:
+    """A ruled table of rows (with the header row on the first page)."""
+    xs = [40, 110, 310, 390, 470, 560]
+    row_height = 14
+    ops = ["0.5 w"]
+    if first:
+        ops.append("BT /F1 14 Tf 40 800 Td (SAMPLE BANK - Statement of account) Tj ET")
+        top = 770
+    else:
+        top = 800
+    table = ([HEADER] if first else []) + rows
+    ys = [top - row_height * i for i in range(len(table) + 1)]
+    ops += [f"{xs[0]} {y} m {xs[-1]} {y} l S" for y in ys]
+    ops += [f"{x} {ys[0]} m {x} {ys[-1]} l S" for x in xs]
+    for r, row in enumerate(table):
+        for c, value in enumerate(row):
+            ops.append(f"BT /F1 8 Tf {xs[c] + 2} {ys[r] - 10} Td ({_pdf_text(value)}) Tj ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def pdf_bytes(rows, password=None, per_page=50) -> bytes:
+    """A table-layout statement PDF, AES-encrypted when password is given."""
+    import pikepdf
+    from pikepdf import Dictionary, Name
+
+    pdf = pikepdf.Pdf.new()
+    font = pdf.make_indirect(Dictionary(Type=Name.Font, Subtype=Name.Type1, BaseFont=Name.Helvetica))
+    first = True
+    i = 0
+    while i < len(rows) or first:
+        n = per_page - 2 if first else per_page
+        page = pdf.add_blank_page(page_size=(595, 842))
+        page.Resources = Dictionary(Font=Dictionary(F1=font))
+        page.Contents = pdf.make_stream(_page_stream(rows[i:i + n], first))
+        i += n
+        first = False
+    buf = io.BytesIO()
+    encryption = pikepdf.Encryption(owner=password + "-owner", user=password, aes=True) if password else None
+    pdf.save(buf, encryption=encryption or False)
+    return buf.getvalue()
+
+
+def make_fixtures(rows, pdf_rows, kinds) -> dict:
+    """kind -> (filename, bytes, statement rows) for every kind in the mix."""
+    makers = {
+        "csv": lambda: ("loadtest.csv", csv_bytes(ledger(rows, 1)), rows),
+        "xlsx": lambda: ("loadtest.xlsx", xlsx_bytes(ledger(rows, 2)), rows),
+        "pdf": lambda: ("loadtest.pdf", pdf_bytes(ledger(pdf_rows, 3)), pdf_rows),
+        "locked_pdf": lambda: ("locked.pdf", pdf_bytes(ledger(pdf_rows, 4), PDF_PASSWORD), pdf_rows),
+    }
+    return {kind: makers[kind]() for kind in kinds}
+
+
+# ──────────────────────────────────────────────────────────
+# Requests
+# ──────────────────────────────────────────────────────────
+def _multipart(filename, content, fields=None):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n".encode("utf-8")
+    )
+    parts.append(content)
+    parts.append(f"\r\n--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _send(url, body, content_type, timeout):
+    """(status or None, response content type, body, seconds) of one POST."""
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            status, kind, data = resp.status, resp.headers.get("Content-Type", ""), resp.read()
+    except urllib.error.HTTPError as e:
+        status, kind, data = e.code, e.headers.get("Content-Type", ""), e.read()
+    except OSError as e:
+        status, kind, data = None, "", str(e).encode("utf-8")
+    return status, kind, data, time.perf_counter() - started
+
+
+def classify(status, content_type, body):
+    """(outcome, reason, JSON payload or None) of a response."""
+    if status is None:
+        return "error", "connection: " + body.decode("utf-8", "replace")[:80], None
+    payload = None
+    if content_type.startswith("application/json"):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+    if status == 503:
+        return "rejected", "503", payload
+    if status >= 400:
+        reason = payload.get("error", "") if isinstance(payload, dict) else ""
+        return "error", f"{status} {reason}"[:80].strip(), payload
+    if isinstance(payload, dict):
+        if payload.get("needs_password"):
+            return "ok", "needs_password", payload
+        return "error", str(payload.get("error", "unexpected JSON"))[:80], payload
+    return "ok", "dashboard", None
+
+
+def upload(base, kind, fixture, timeout, record):
+    """Upload one statement (and unlock it, for a protected PDF); record() each request."""
+    filename, content, _ = fixture
+    body, content_type = _multipart(filename, content)
+    status, ctype, data, seconds = _send(base + "/analyze", body, content_type, timeout)
+    outcome, reason, payload = classify(status, ctype, data)
+    record("/analyze", kind, seconds, outcome, reason)
+    if outcome != "ok" or not (payload and payload.get("needs_password")):
+        return
+    retry = json.dumps({"file_id": payload["file_id"], "password": PDF_PASSWORD}).encode("utf-8")
+    status, ctype, data, seconds = _send(base + "/retry-password", retry, "application/json", timeout)
+    outcome, reason, _ = classify(status, ctype, data)
+    if reason == "needs_password":
+        outcome, reason = "error", "password not accepted"
+    record("/retry-password", kind, seconds, outcome, reason)
+
+
+# ──────────────────────────────────────────────────────────
+# Sweep
+# ──────────────────────────────────────────────────────────
+def percentile(sorted_values, q):
+    """q-th percentile (0-100) of sorted values, linearly interpolated."""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def summarise(samples, seconds) -> dict:
+    """Counts, rates and latency percentiles (ms) of (seconds, outcome, reason) samples."""
+    outcomes = Counter(s[1] for s in samples)
+    latencies = sorted(s[0] for s in samples if s[1] == "ok")
+
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        "requests": len(samples),
+        "ok": outcomes["ok"],
+        "errors": len(samples) - outcomes["ok"],
+        "rejected": outcomes["rejected"],
+        "error_rate": round((len(samples) - outcomes["ok"]) / len(samples), 4) if samples else None,
+        "throughput_rps": round(len(samples) / seconds, 3) if seconds else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p90_ms": ms(percentile(latencies, 90)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "mean_ms": ms(sum(latencies) / len(latencies) if latencies else None),
+        "error_reasons": dict(Counter(s[2] for s in samples if s[1] != "ok").most_common(5)),
+    }
+
+
+def run_level(base, fixtures, weights, concurrency, duration, timeout, seed) -> dict:
+    """Drive concurrency clients for duration seconds; the level's report."""
+    samples = []
+    lock = threading.Lock()
+    kinds = list(weights)
+    deadline = time.perf_counter() + duration
+
+    def record(endpoint, kind, seconds, outcome, reason):
+        with lock:
+            samples.append((endpoint, kind, seconds, outcome, reason))
+
+    def client(n):
+        rng = random.Random(seed * 1000 + n)
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, [weights[k] for k in kinds])[0]
+            upload(base, kind, fixtures[kind], timeout, record)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,), daemon=True) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for endpoint in sorted({s[0] for s in samples}):
+        mine = [s for s in samples if s[0] == endpoint]
+        per_kind = {
+            kind: summarise([s[2:] for s in mine if s[1] == kind], elapsed)
+            for kind in kinds if any(s[1] == kind for s in mine)
+        }
+        per_kind["all"] = summarise([s[2:] for s in mine], elapsed)
+        endpoints[endpoint] = per_kind
+    uploads = sum(1 for s in samples if s[0] == "/analyze")
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "uploads_per_sec": round(uploads / elapsed, 3) if elapsed else None,
+        "all": summarise([s[2:] for s in samples], elapsed),
+        "endpoints": endpoints,
+    }
+
+
+# ──────────────────────────────────────────────────────────
+# Server
+# ──────────────────────────────────────────────────────────
+def _wait_healthy(base, proc, limit=120):
+    started = time.perf_counter()
+    while True:
+        try:
+            with urllib.request.urlopen(base + "/health", timeout=1):
+                return time.perf_counter() - started
+        except OSError:
+            if proc is not None and proc.poll() is not None:
+                raise RuntimeError("gunicorn exited during start-up")
+            if time.perf_counter() - started > limit:
+                raise RuntimeError(f"{base} did not become healthy")
+            time.sleep(0.2)
+
+
+def start_server(port, workers, state_dir, log):
+    """gunicorn on port with its state under state_dir; the Popen."""
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(workers),
+        RESULTS_DIR=os.path.join(state_dir, "results"),
+        ADMISSION_DIR=os.path.join(state_dir, "admission"),
+        PROFILE_DIR=os.path.join(state_dir, "profiles"),
+        SHARED_CACHE_PATH=os.path.join(state_dir, "catcache.bin"),
+        LEDGER_ENABLED="0",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "-c", "gunicorn.conf.py"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def parse_mix(text) -> dict:
+    weights = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise SystemExit(f"unknown file type {kind!r} in --mix (expected one of {', '.join(KINDS)})")
+        weights[kind] = float(weight or 1)
+    if not any(w > 0 for w in weights.values()):
+        raise SystemExit("--mix needs a positive weight")
+    return {k: w for k, w in weights.items() if w > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per concurrency level")
+    parser.add_argument("--mix", default="csv=6,xlsx=2,pdf=1,locked_pdf=1")
+    parser.add_argument("--rows", type=int, default=500, help="rows per CSV/XLSX statement")
+    parser.add_argument("--pdf-rows", type=int, default=150, help="rows per PDF statement")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers (ignored with --url)")
+    parser.add_argument("--port", type=int, default=5060)
+    parser.add_argument("--url", default=None, help="test a running server instead of starting one")
+    parser.add_argument("--timeout", type=float, default=300, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    fixtures = make_fixtures(args.rows, args.pdf_rows, weights)
+
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as state_dir:
+        proc = None
+        base = args.url.rstrip("/") if args.url else f"http://127.0.0.1:{args.port}"
+        log_path = os.path.join(state_dir, "server.log")
+        with open(log_path, "wb") as log:
+            if not args.url:
+                proc = start_server(args.port, args.workers, state_dir, log)
+            try:
+                try:
+                    ready = _wait_healthy(base, proc)
+                except RuntimeError as e:
+                    with open(log_path, "rb") as f:
+                        tail = f.read()[-4000:].decode("utf-8", "replace")
+                    raise SystemExit(f"{e}\n{tail}")
+                # One untimed upload of each kind, so first-request costs
+                # (imports, model loading) stay out of the first level
+                for kind in weights:
+                    upload(base, kind, fixtures[kind], args.timeout, lambda *a: None)
+                results = [
+                    run_level(base, fixtures, weights, c, args.duration, args.timeout, args.seed + i)
+                    for i, c in enumerate(levels)
+                ]
+            finally:
+                if proc is not None:
+                    proc.terminate()
+                    proc.wait(timeout=30)
+
+    report = {
+        "server": {
+            "url": base,
+            "started": proc is not None,
+            "workers": args.workers if proc is not None else None,
+            "ready_seconds": round(ready, 3),
+        },
+        "mix": weights,
+        "fixtures": {
+            kind: {"file": name, "bytes": len(content), "rows": rows}
+            for kind, (name, content, rows) in fixtures.items()
+        },
+        "levels": results,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Integer-paise money (money.py) against the previous float-rupee path, on a
+large synthetic analysed ledger.
+
+Times amount parsing (parsers.clean_val, integer paise from precompiled
+patterns, against the float version kept here verbatim), reconciliation
+(reconcile.reconcile against the float one with its 0.05 rupee tolerance,
+also kept here) and the aggregation and cube stages on frames that differ
+only in the money dtype. Both paths must
+parse, reconcile and aggregate to the same figures before any timing is
+reported. Also reports how far float sums drift from the exact total.
+
+    python -m bench.money [--rows 1000000] [--runs 3]
+"""
+import argparse
+import json
+import math
+import os
+import re
+import time
+
+import numpy as np
+
+LEGACY_TOLERANCE = 0.05
+
+
+def legacy_clean_val(v):
+    """parsers.clean_val before integer paise."""
+    if v is None:
+        return 0.0, False, False
+
+    s = str(v).strip().replace(",", "")
+    if s in ("", "-", "None", "nan", "NaN"):
+        return 0.0, False, False
+
+    # Remove currency symbols
+    s = re.sub(r"[₹$€£]", "", s).strip()
+
+    # Check parenthesized negative amounts
+    negative = False
+    if s.startswith("(") and s.endswith(")"):
+        negative = True
+        s = s[1:-1].strip()
+
+    # Check Dr/Cr suffix
+    is_dr = False
+    is_cr = False
+    if re.search(r"\bDr\.?\s*$", s, re.IGNORECASE):
+        is_dr = True
+        s = re.sub(r"\bDr\.?\s*$", "", s, flags=re.IGNORECASE).strip()
+    elif re.search(r"\bCr\.?\s*$", s, re.IGNORECASE):
+        is_cr = True
+        s = re.sub(r"\bCr\.?\s*$", "", s, flags=re.IGNORECASE).strip()
+
+    # Extract numeric part
+    s = re.sub(r"[^\d.\-]", "", s)
+    try:
+        val = float(s)
+        if negative:
+            val = -abs(val)
+        return val, is_dr, is_cr
+    except ValueError:
+        return 0.0, False, False
+
+
+def legacy_reconcile(df, magnitude=None, follow_balance=False, counted=None):
+    """reconcile.reconcile before integer paise (float rupees, 0.05 tolerance)."""
+    from reconcile import _is_descending
+
+    TOLERANCE = LEGACY_TOLERANCE
+    out = df.copy()
+    n = len(out)
+    debit = out["Debit"].to_numpy(dtype=float, copy=True)
+    credit = out["Credit"].to_numpy(dtype=float, copy=True)
+    balance = out["Balance"].to_numpy(dtype=float)
+    if magnitude is None:
+        magnitude = np.where(debit > 0, debit, credit)
+    magnitude = np.abs(np.asarray(magnitude, dtype=float))
+
+    # Chronological positions: reverse a newest-first statement
+    order = np.arange(n)[::-1] if "Date" in out.columns and _is_descending(out["Date"]) else np.arange(n)
+    bal = balance[order]
+    mag = magnitude[order]
+
+    checkable = np.zeros(n, dtype=bool)
+    delta = np.zeros(n)
+    if n >= 2:
+        checkable[1:] = (np.abs(bal[1:]) > TOLERANCE) & (np.abs(bal[:-1]) > TOLERANCE)
+        delta[1:] = bal[1:] - bal[:-1]
+    moved = checkable & (np.abs(delta) > TOLERANCE)
+
+    # Rows with no amount take it from the balance movement
+    filled = moved & (mag <= TOLERANCE)
+    mag = np.where(filled, np.abs(delta), mag)
+
+    agrees = np.abs(np.abs(delta) - mag) <= TOLERANCE
+    settle = moved & (agrees | follow_balance)
+    is_credit = settle & (delta > 0)
+    is_debit = settle & (delta < 0)
+
+    new_debit = debit.copy()
+    new_credit = credit.copy()
+    rows = order[is_credit]
+    new_credit[rows], new_debit[rows] = mag[is_credit], 0.0
+    rows = order[is_debit]
+    new_debit[rows], new_credit[rows] = mag[is_debit], 0.0
+
+    reconciled = np.ones(n, dtype=bool)
+    reconciled[order[checkable]] = agrees[checkable]
+
+    changed = (new_debit != debit) | (new_credit != credit)
+    out["Debit"] = new_debit
+    out["Credit"] = new_credit
+    out["Reconciled"] = reconciled
+
+    counted = np.ones(n, dtype=bool) if counted is None else np.asarray(counted, dtype=bool)
+    in_order = counted[order]
+    out.attrs["reconciliation"] = {
+        "rows": int(counted.sum()),
+        "checked": int((checkable & in_order).sum()),
+        "mismatched": int((~reconciled & counted).sum()),
+        "corrected": int((changed & counted).sum()),
+        "filled": int((filled & in_order).sum()),
+        "descending": bool(n and order[0] != 0),
+    }
+    return out
+
+
+def _statement_text(amounts, seed=7) -> list:
+    """Amounts as statement cells: digit grouping, Cr/Dr suffixes, blanks."""
+    rng = np.random.default_rng(seed)
+    suffixes = rng.choice(["", "", "", " Cr", " Dr", "", "(Dr)"], len(amounts))
+    cells = [f"{a:,.2f}{s}" for a, s in zip(amounts, suffixes)]
+    for i in rng.integers(0, len(cells), len(cells) // 50):
+        cells[i] = ""
+    return cells
+
+
+def _race(legacy_fn, fn, runs):
+    """
+    Best times and results of the float and the paise version of a stage,
+    run alternately so that both see the same machine state.
+    """
+    best = [float("inf"), float("inf")]
+    results = [None, None]
+    for _ in range(runs):
+        for i, f in enumerate((legacy_fn, fn)):
+            started = time.perf_counter()
+            results[i] = f()
+            best[i] = min(best[i], time.perf_counter() - started)
+    return best, results
+
+
+def _stages(df, per_rupee):
+    """Figures of the aggregation and cube stages over df, in rupees."""
+    import cube
+    import engine
+
+    agg = engine.aggregate(df)
+    result_cube = cube.build_cube(df, agg["day"])
+    return (
+        round(float(agg["debits"]) / per_rupee, 2),
+        round(float(agg["credits"]) / per_rupee, 2),
+        (agg["by_category"] / per_rupee).round(2).sort_index().to_dict(),
+        (agg["by_day"]["sum"] / per_rupee).round(2).to_dict(),
+        int(result_cube["count"].sum()),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    # Aggregation only; no shared categorisation cache needed
+    os.environ["SHARED_CACHE_MB"] = "0"
+    import money
+    import parsers
+    import reconcile
+    import txframe
+    from bench.frame import legacy_ledger
+
+    # Frames identical but for the money dtype
+    paise = txframe.compact(legacy_ledger(args.rows))
+    rupees = paise.copy()
+    for col in txframe.MONEY_COLUMNS:
+        rupees[col] = money.to_rupees(paise[col])
+
+    # ── Parsing ──
+    cells = _statement_text(np.abs(rupees["Amount"].to_numpy()))
+    (legacy_parse_seconds, parse_seconds), (legacy_parsed, parsed) = _race(
+        lambda: [legacy_clean_val(c) for c in cells], lambda: [parsers.clean_val(c) for c in cells], args.runs,
+    )
+    if [(round(v * 100), dr, cr) for v, dr, cr in legacy_parsed] != parsed:
+        raise SystemExit("clean_val parses differently from the float version")
+
+    # ── Reconciliation ──
+    statement = ["Date", "Debit", "Credit", "Balance"]
+    (legacy_rec_seconds, rec_seconds), (legacy_rec, rec) = _race(
+        lambda: legacy_reconcile(rupees[statement]), lambda: reconcile.reconcile(paise[statement]), args.runs,
+    )
+    if legacy_rec.attrs["reconciliation"] != rec.attrs["reconciliation"] \
+            or not np.array_equal(legacy_rec["Reconciled"], rec["Reconciled"]):
+        raise SystemExit("reconcile flags rows differently from the float version")
+
+    # ── Aggregation and cube ──
+    (legacy_agg_seconds, agg_seconds), (legacy_figures, figures) = _race(
+        lambda: _stages(rupees, 1), lambda: _stages(paise, money.PAISE_PER_RUPEE), args.runs,
+    )
+    if legacy_figures != figures:
+        raise SystemExit("the paise frame aggregates differently from the rupee one")
+
+    # ── Drift of float sums from the exact total ──
+    exact = int(paise["Amount"].to_numpy().sum())
+    floats = rupees["Amount"].to_numpy()
+    balance = float(np.cumsum(floats)[-1])
+
+    def drift(total):
+        return round(total * money.PAISE_PER_RUPEE - exact, 4)
+
+    print(json.dumps({
+        "rows": len(paise),
+        "identical_results": True,
+        "parse_cells_per_sec": {
+            "float": round(len(cells) / legacy_parse_seconds),
+            "paise": round(len(cells) / parse_seconds),
+        },
+        "reconcile_seconds": {"float": round(legacy_rec_seconds, 4), "paise": round(rec_seconds, 4)},
+        "aggregate_cube_seconds": {"float": round(legacy_agg_seconds, 4), "paise": round(agg_seconds, 4)},
+        "exact_total_rupees": money.rupees(exact),
+        "float_drift_paise": {
+            "sequential_sum": drift(sum(floats.tolist())),
+            "running_balance": drift(balance),
+            "numpy_pairwise_sum": drift(float(floats.sum())),
+            "fsum": drift(math.fsum(floats)),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
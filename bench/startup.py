@@ -0,0 +1,157 @@
+"""
+Measure cold-start cost of the web app.
+
+Reports the wall time of ``import app`` in a fresh interpreter, which heavy
+libraries that import pulls in, and the resident (RSS) and proportional
+(PSS) memory of every gunicorn worker after it has served a categorisation
+request, with and without the pre-fork warm-up from gunicorn.conf.py.
+
+    python -m bench.startup [--workers 2] [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("pandas", "sklearn", "pdfplumber", "pikepdf", "docx")
+
+_IMPORT_PROBE = (
+    "import sys, time\n"
+    "t = time.perf_counter()\n"
+    "import app\n"
+    "elapsed = time.perf_counter() - t\n"
+    "print(elapsed)\n"
+    "print(','.join(m for m in %r if m in sys.modules))\n" % (HEAVY_MODULES,)
+)
+
+SAMPLE_CSV = (
+    "Date,Narration,Debit,Credit,Balance\n"
+    "01/04/2024,UPI-SWIGGY-swiggy123@ybl-412345678901-Payment,349.00,,10000.00\n"
+    "02/04/2024,NEFT-UTR1234567890-Salary Payout TCS,,50000.00,60000.00\n"
+    "03/04/2024,Some unknown narration 77,120.00,,59880.00\n"
+)
+
+
+def measure_import(runs):
+    """Median wall time of `import app` across fresh interpreters."""
+    times = []
+    loaded = ""
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", _IMPORT_PROBE],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.split("\n")
+        times.append(float(out[0]))
+        loaded = out[1]
+    return {
+        "import_seconds_median": round(statistics.median(times), 4),
+        "heavy_modules_loaded": [m for m in loaded.split(",") if m],
+    }
+
+
+def _post_csv(url):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="warm.csv"\r\n'
+        "Content-Type: text/csv\r\n\r\n"
+        f"{SAMPLE_CSV}\r\n"
+        f"--{boundary}--\r\n"
+    ).encode("utf-8")
+    req = urllib.request.Request(
+        url, data=body,
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        resp.read()
+
+
+def _memory_kb(pid):
+    """Return (rss_kb, pss_kb) for a process from /proc/<pid>/smaps_rollup."""
+    rss = pss = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Rss:"):
+                rss = int(line.split()[1])
+            elif line.startswith("Pss:"):
+                pss = int(line.split()[1])
+    return rss, pss
+
+
+def _children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def measure_workers(preload, workers, port):
+    """Start gunicorn, exercise every worker, and read per-worker memory."""
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers),
+               PRELOAD_APP="1" if preload else "0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "-c", "gunicorn.conf.py"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        started = time.perf_counter()
+        while True:
+            try:
+                with urllib.request.urlopen(base + "/health", timeout=1):
+                    break
+            except OSError:
+                if proc.poll() is not None or time.perf_counter() - started > 60:
+                    raise RuntimeError("gunicorn did not come up")
+                time.sleep(0.1)
+        ready_seconds = time.perf_counter() - started
+
+        # Sync workers take turns on the listening socket, so a handful of
+        # requests per worker makes sure each one has categorised something.
+        for _ in range(workers * 4):
+            _post_csv(base + "/analyze")
+
+        per_worker = []
+        for pid in _children(proc.pid):
+            rss, pss = _memory_kb(pid)
+            per_worker.append({"pid": pid, "rss_mb": round(rss / 1024, 1),
+                               "pss_mb": round(pss / 1024, 1)})
+        master_rss, master_pss = _memory_kb(proc.pid)
+        return {
+            "preload": preload,
+            "ready_seconds": round(ready_seconds, 3),
+            "master_rss_mb": round(master_rss / 1024, 1),
+            "workers": per_worker,
+            "total_pss_mb": round(
+                master_pss / 1024 + sum(w["pss_mb"] for w in per_worker), 1
+            ),
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    report = {
+        "import": measure_import(args.runs),
+        "gunicorn": [
+            measure_workers(False, args.workers, args.port),
+            measure_workers(True, args.workers, args.port + 1),
+        ],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Line throughput of the text-layout PDF tokenizer (parsers.text_transactions)
+against the previous implementation, kept here verbatim as the reference.
+
+A synthetic corpus of statement lines is generated (transaction lines with
+one to three amounts, Cr/Dr suffixes, Indian digit grouping, narration
+continuations and page furniture, plus adversarial lines whose amounts
+repeat or sit inside the narration). Both implementations must produce
+identical transactions before any timing is reported.
+
+    python -m bench.textparse [--lines 200000] [--runs 5]
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+import parsers
+
+
+def legacy_transactions(lines):
+    """The line loop of parse_pdf_text before the single-pass tokenizer."""
+    date_pat = re.compile(
+        r"^(\d{1,2}[-/\s.]\d{1,2}[-/\s.]\d{2,4}|\d{1,2}[-/\s.](?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*[-/\s.]\d{2,4})",
+        re.IGNORECASE
+    )
+    amt_pat = re.compile(r"\b\d{1,3}(?:,\d{3})*\.\d{2}\b")
+    current_tx = None
+    raw_lines = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        date_match = date_pat.search(line)
+        amounts = amt_pat.findall(line)
+        if date_match and amounts:
+            if current_tx:
+                raw_lines.append(current_tx)
+            date_str = date_match.group(1)
+            amt_details = []
+            for a in amounts:
+                v, dr_flag, cr_flag = parsers.clean_val(a)
+                idx = line.find(a)
+                if idx != -1:
+                    suffix = line[idx + len(a):idx + len(a) + 3].lower()
+                    if "cr" in suffix:
+                        cr_flag = True
+                    elif "dr" in suffix:
+                        dr_flag = True
+                amt_details.append((v, dr_flag, cr_flag))
+            desc = line
+            desc = desc.replace(date_str, "")
+            for a in amounts:
+                desc = desc.replace(a, "")
+            desc = re.sub(r"\s+", " ", desc).strip()
+            current_tx = {"Date": date_str, "Description": desc, "amt_details": amt_details}
+        else:
+            if current_tx:
+                if not any(k in line.lower() for k in ("page", "statement", "date", "balance", "total")):
+                    current_tx["Description"] += " " + line
+    if current_tx:
+        raw_lines.append(current_tx)
+    return raw_lines
+
+
+_MERCHANTS = ["UPI/SWIGGY/swiggy@ybl", "NEFT-SALARY ACME LTD", "POS DMART PUNE", "ATM WDL MUMBAI",
+              "IMPS-rahul@oksbi", "NETFLIX.COM", "INTEREST CREDIT", "REFUND AMAZON", "CC PAYMENT HDFC"]
+_FURNITURE = ["Page 3 of 12", "Statement of account", "Opening Balance", "TOTAL", "Value Date"]
+_ODD_SPACE = ["  ", "\t", " ", " ", " \x1c "]
+
+
+def _amount(rng):
+    value = rng.choice([rng.uniform(1, 999), rng.uniform(1000, 99999), rng.uniform(1e5, 1e7)])
+    whole, frac = f"{value:.2f}".split(".")
+    groups = []
+    while len(whole) > 3:
+        groups.insert(0, whole[-3:])
+        whole = whole[:-3]
+    return ",".join([whole] + groups) + "." + frac
+
+
+def _date(rng):
+    d, m, y = rng.randint(1, 28), rng.randint(1, 12), rng.choice(["2023", "23", "2024"])
+    return rng.choice([f"{d:02d}/{m:02d}/{y}", f"{d}-{m:02d}-{y}", f"{d:02d} Mar {y}", f"{d:02d}.{m:02d}.{y}"])
+
+
+def corpus(n, seed=7):
+    """n synthetic statement lines, about 5% adversarial."""
+    rng = random.Random(seed)
+    lines = []
+    while len(lines) < n:
+        kind = rng.random()
+        if kind < 0.62:
+            amounts = [_amount(rng) for _ in range(rng.choice([1, 2, 2, 3]))]
+            suffixed = [a + rng.choice(["", "", " Cr", " Dr", "CR", "(Dr)"]) for a in amounts]
+            sep = rng.choice(_ODD_SPACE) if rng.random() < 0.1 else " "
+            lines.append(sep.join([_date(rng), rng.choice(_MERCHANTS)] + suffixed))
+        elif kind < 0.85:
+            lines.append(f"Ref {rng.randint(10 ** 9, 10 ** 10)} {rng.choice(_MERCHANTS).lower()}")
+        elif kind < 0.95:
+            lines.append(rng.choice(_FURNITURE) + (f" {_amount(rng)}" if rng.random() < 0.5 else ""))
+        else:
+            # Adversarial: repeated amounts, amounts in the narration or
+            # glued to punctuation, dates repeated in the text
+            a = _amount(rng)
+            date = _date(rng)
+            lines.append(rng.choice([
+                f"{date} PAID {a} FOR {a} {a}",
+                f"{date} {a} REF {a}.{a[-2:]} {_amount(rng)}",
+                f"{date} TXN ON {date} {a} Cr {_amount(rng)}",
+                f"{date} 1{a} {a} ,{a}, {_amount(rng)}",
+                f"{date}{a} X {a}",
+                f"{date} {a[-4:]} {a} Dr",
+                f"{date} NUL\0{a} {a}\0X",
+                "",
+            ]))
+    return lines
+
+
+def _best_rate(fn, lines, runs):
+    best = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn(lines)
+        best = min(best, time.perf_counter() - started)
+    return len(lines) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = corpus(args.lines)
+    expected = legacy_transactions(lines)
+    actual = parsers.text_transactions(lines)
+    if actual != expected:
+        bad = next(i for i, (a, b) in enumerate(zip(actual, expected)) if a != b) if len(actual) == len(expected) else None
+        raise SystemExit(f"tokenizer output differs from the reference (first mismatch: {bad})")
+
+    legacy = _best_rate(legacy_transactions, lines, args.runs)
+    tokenizer = _best_rate(parsers.text_transactions, lines, args.runs)
+    print(json.dumps({
+        "lines": len(lines),
+        "transactions": len(expected),
+        "identical": True,
+        "legacy_lines_per_sec": round(legacy),
+        "tokenizer_lines_per_sec": round(tokenizer),
+        "speedup": round(tokenizer / legacy, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Pre-aggregated day × category × merchant cube for instant drill-down.
+
+build_cube() collapses an analysed ledger into one row per
+(day, category, merchant) with spend/debit/credit sums (exact, in paise)
+and a transaction count. summarize() answers date-range, category and merchant filters, plus
+daily, weekly, monthly and yearly roll-ups, from the cube alone, so
+drill-down never rescans the transactions.
+"""
+import pandas as pd
+
+import money
+import txframe
+
+MEASURES = ("spend", "debit", "credit", "count")
+
+# Roll-up granularity -> pandas period frequency
+GRANULARITIES = {
+    "day": "D",
+    "week": "W-SUN",
+    "month": "M",
+    "year": "Y",
+}
+
+
+def build_cube(df: pd.DataFrame, day: pd.Series = None) -> pd.DataFrame:
+    """
+    Aggregate an analysed frame (Amount, Category, Merchant, Date) into the
+    cube. day may be passed in when the dates have already been parsed.
+    Rows with unparseable dates are kept under a NaT day, so unfiltered
+    totals still match the whole statement.
+    """
+    if day is None and "Date" in df.columns:
+        day = txframe.parse_dates(df["Date"])
+    elif day is None:
+        day = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    amount = df["Amount"]
+    frame = pd.DataFrame({
+        "day": day,
+        "Category": df["Category"].astype("category"),
+        "Merchant": df["Merchant"].astype("category"),
+        "spend": amount.abs(),
+        "debit": amount.where(amount > 0, 0),
+        "credit": (-amount).where(amount < 0, 0),
+        "count": 1,
+    })
+    return (
+        frame.groupby(["day", "Category", "Merchant"], observed=True, dropna=False, sort=True)
+        .agg(spend=("spend", "sum"), debit=("debit", "sum"),
+             credit=("credit", "sum"), count=("count", "sum"))
+        .astype({"count": "int32"})
+        .reset_index()
+    )
+
+
+def _as_list(value):
+    if value is None or value == "" or value == []:
+        return None
+    return [value] if isinstance(value, str) else list(value)
+
+
+def filter_cube(cube: pd.DataFrame, start=None, end=None, category=None, merchant=None) -> pd.DataFrame:
+    """Cube rows inside [start, end] (inclusive days) and the given categories/merchants."""
+    mask = pd.Series(True, index=cube.index)
+    if start is not None:
+        mask &= cube["day"] >= pd.Timestamp(start).normalize()
+    if end is not None:
+        mask &= cube["day"] <= pd.Timestamp(end).normalize()
+    categories = _as_list(category)
+    if categories:
+        mask &= cube["Category"].isin(categories)
+    merchants = _as_list(merchant)
+    if merchants:
+        mask &= cube["Merchant"].isin(merchants)
+    return cube[mask]
+
+
+def _rows(grouped: pd.DataFrame) -> list:
+    return [
+        [key, money.rupees(spend), int(count)]
+        for key, spend, count in zip(grouped.index, grouped["spend"], grouped["count"])
+    ]
+
+
+def summarize(cube: pd.DataFrame, start=None, end=None, category=None, merchant=None,
+              granularity="day", top_merchants=10) -> dict:
+    """
+    Totals, per-category and top-merchant breakdowns, and a time series at
+    the requested granularity (day, week, month or year) for the filtered
+    slice of the cube.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+    sliced = filter_cube(cube, start, end, category, merchant)
+    totals = {m: sliced[m].sum() for m in MEASURES}
+
+    by_category = (
+        sliced.groupby("Category", observed=True)[["spend", "count"]].sum()
+        .sort_values("spend", ascending=False)
+    )
+    by_merchant = (
+        sliced.groupby("Merchant", observed=True)[["spend", "count"]].sum()
+        .sort_values("spend", ascending=False)
+        .head(top_merchants)
+    )
+
+    dated = sliced[sliced["day"].notna()]
+    periods = dated["day"].dt.to_period(GRANULARITIES[granularity])
+    series = dated.groupby(periods)[["spend", "count"]].sum().sort_index()
+    series.index = series.index.start_time.strftime("%Y-%m-%d")
+
+    return {
+        "filters": {
+            "start": str(pd.Timestamp(start).date()) if start is not None else None,
+            "end": str(pd.Timestamp(end).date()) if end is not None else None,
+            "category": _as_list(category),
+            "merchant": _as_list(merchant),
+            "granularity": granularity,
+        },
+        "totals": {
+            "spend": money.rupees(totals["spend"]),
+            "debit": money.rupees(totals["debit"]),
+            "credit": money.rupees(totals["credit"]),
+            "count": int(totals["count"]),
+        },
+        "by_category": _rows(by_category),
+        "top_merchants": _rows(by_merchant),
+        "series": _rows(series),
+    }
@@ -0,0 +1,261 @@
+"""
+Date-range pushdown for parse_statement(date_from=, date_to=).
+
+The range is applied while a statement is read, as early as each format
+allows:
+
+  * PDF pages (read_pages): the first page is always read, since it holds
+    the table header and geometry. In a sorted statement the first page that
+    can hold in-range rows is found by bisecting over the others, so leading
+    pages wholly outside the range are never extracted, and reading stops
+    after the first page wholly past the range (by PAST_SLACK).
+  * rows (Rows): transactions outside the range are dropped as the parsers
+    assemble them, and a parser stops at the first transaction past the
+    range (by PAST_SLACK) once the statement has shown itself to be sorted.
+
+Every kept run of rows also keeps its out-of-range neighbour on either side
+(InRange False), so the balance reconciliation of its first and last rows
+sees the same neighbours as a full parse; parse_statement drops them after
+reconciling. Dates are read the way engine.parse_days reads the Date
+column: day first, with the format guessed from the first date and applied
+to the rest. Rows whose date cannot be read are dropped.
+"""
+import datetime
+import warnings
+
+import pandas as pd
+
+ASCENDING = 1
+DESCENDING = -1
+# Reading stops only this far past the range, so a few back-dated entries
+# just after it in an otherwise sorted statement are still seen
+PAST_SLACK = pd.Timedelta(days=7)
+
+
+def _bound(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime.date):
+        return pd.Timestamp(value).normalize()
+    try:
+        day = pd.Timestamp(str(value).strip())
+    except ValueError:
+        raise ValueError(f"Invalid date {value!r}; expected YYYY-MM-DD")
+    if pd.isna(day):
+        raise ValueError(f"Invalid date {value!r}; expected YYYY-MM-DD")
+    return day.normalize()
+
+
+class DateRange:
+    """Inclusive [start, end] range of days; either end may be open."""
+
+    def __init__(self, start=None, end=None):
+        self.start = _bound(start)
+        self.end = _bound(end)
+        if self.start is not None and self.end is not None and self.start > self.end:
+            raise ValueError("The start date is after the end date")
+        self._format = None
+        self._guessed = False
+        self._days = {}
+
+    @classmethod
+    def of(cls, start=None, end=None):
+        """A DateRange, or None when both ends are open."""
+        window = cls(start, end)
+        return window if window.start is not None or window.end is not None else None
+
+    # ── Reading dates ──
+    def day(self, text):
+        """The statement date in text as a normalised Timestamp, or None."""
+        try:
+            return self._days[text]
+        except KeyError:
+            pass
+        if not self._guessed and text:
+            from pandas.tseries.api import guess_datetime_format
+
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                self._format = guess_datetime_format(text, dayfirst=True)
+            self._guessed = True
+        day = None
+        if self._format is not None:
+            try:
+                day = pd.Timestamp(datetime.datetime.strptime(text, self._format)).normalize()
+            except ValueError:
+                day = None
+        elif text:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                parsed = pd.to_datetime(text, errors="coerce", dayfirst=True)
+            day = None if pd.isna(parsed) else parsed.normalize()
+        self._days[text] = day
+        return day
+
+    # ── Position of a day relative to the range ──
+    def contains(self, day) -> bool:
+        return day is not None and (self.start is None or day >= self.start) \
+            and (self.end is None or day <= self.end)
+
+    def before(self, day, direction) -> bool:
+        """day comes before the range in a statement sorted in direction."""
+        if direction == ASCENDING:
+            return self.start is not None and day < self.start
+        return self.end is not None and day > self.end
+
+    def past(self, day, direction) -> bool:
+        """day comes well after the range in a statement sorted in direction."""
+        if direction == ASCENDING:
+            return self.end is not None and day > self.end + PAST_SLACK
+        return self.start is not None and day < self.start - PAST_SLACK
+
+    def __repr__(self):
+        start = self.start.date() if self.start is not None else None
+        end = self.end.date() if self.end is not None else None
+        return f"DateRange({start}, {end})"
+
+
+class _Order:
+    """Tracks whether the days seen so far run one way."""
+
+    def __init__(self):
+        self.direction = None
+        self.sorted = True
+        self._last = None
+
+    def add(self, day):
+        if day is None or not self.sorted:
+            return
+        if self._last is not None and day != self._last:
+            step = ASCENDING if day > self._last else DESCENDING
+            if self.direction is None:
+                self.direction = step
+            elif step != self.direction:
+                self.sorted = False
+        self._last = day
+
+    @property
+    def known(self) -> bool:
+        return self.sorted and self.direction is not None
+
+
+class Rows(list):
+    """
+    The transactions a parser keeps, in file order. append() takes every
+    assembled transaction (a dict with a Date string) and keeps those in
+    the range plus their neighbours; once done is set, the parser may stop.
+    Without a range every transaction is kept.
+    """
+
+    def __init__(self, window=None):
+        super().__init__()
+        self.window = window
+        self.done = False
+        self._seen = 0
+        self._order = _Order()
+        self._held = None
+        self._after_kept = False
+        if window is None:
+            # Nothing to filter: keep list.append's speed
+            self.append = super().append
+
+    @property
+    def seen(self) -> int:
+        """Transactions offered to append(), kept or not."""
+        return len(self) if self.window is None else self._seen
+
+    def append(self, tx):
+        self._seen += 1
+        window = self.window
+        day = window.day(tx["Date"])
+        self._order.add(day)
+        inside = window.contains(day)
+        tx["InRange"] = inside
+        if inside:
+            if self._held is not None:
+                list.append(self, self._held)
+                self._held = None
+            list.append(self, tx)
+        elif self._after_kept:
+            list.append(self, tx)
+        else:
+            self._held = tx
+        self._after_kept = inside
+        if not inside and day is not None and self._order.known \
+                and window.past(day, self._order.direction):
+            self.done = True
+
+    def frame(self, columns) -> pd.DataFrame:
+        """The kept rows as a frame (with the given columns when empty)."""
+        return pd.DataFrame(list(self)) if self else pd.DataFrame(columns=list(columns))
+
+
+def read_pages(pages, read, dates, window=None):
+    """
+    Yield read(page) for each page of a statement that can hold rows in
+    window, in order (every page without a window). dates(content) lists
+    the date strings of a read page in order; pages whose dates cannot be
+    read are never skipped.
+    """
+    if window is None:
+        for page in pages:
+            yield read(page)
+        return
+
+    count = len(pages)
+    contents = {}
+    page_days = {}
+
+    def days_of(i):
+        if i not in page_days:
+            if i not in contents:
+                contents[i] = read(pages[i])
+            page_days[i] = [d for d in map(window.day, dates(contents[i])) if d is not None]
+        return page_days[i]
+
+    def order_of(indices):
+        order = _Order()
+        for i in sorted(indices):
+            for day in days_of(i):
+                order.add(day)
+        return order
+
+    start = 1
+    if count > 2:
+        order = order_of([0])
+        if order.direction is None:
+            order = order_of([0, count - 1])
+        if order.known:
+            direction = order.direction
+
+            def before(i):
+                days = days_of(i)
+                return bool(days) and window.before(days[-1], direction)
+
+            # Pages wholly before the range are a prefix of a sorted
+            # statement; bisect for its end, then make sure every page
+            # probed on the way really was in order before trusting it
+            # (nothing to search when the range starts on the first page)
+            lo, hi = (1, count) if before(0) else (1, 1)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if before(mid):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            probed = order_of(list(page_days))
+            if probed.sorted and probed.direction == direction:
+                # The page before holds the row just before the range
+                start = max(1, lo - 1)
+                for i in [i for i in contents if 0 < i < start]:
+                    del contents[i]
+
+    order = _Order()
+    for i in [0] + list(range(start, count)):
+        days = days_of(i)
+        content = contents.pop(i)
+        yield content
+        for day in days:
+            order.add(day)
+        if days and order.known and window.past(days[0], order.direction):
+            return
@@ -0,0 +1,580 @@
+"""
+The statement analysis pipeline, without any web framework.
+
+parse_statement() (from parsers) turns a file into a normalised frame,
+analyze() categorises it, extracts merchants, detects recurring payments
+and aggregates it, and dashboard_payload() builds the summaries the
+dashboard shows. process_file() runs parse and analysis for one file.
+app.py serves this over HTTP and batch.py runs it over directories of
+statements; both share the model, the compiled rules and warm_up().
+"""
+import os
+import pickle
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from parsers import parse_statement, clean_val, ParseError
+import memguard
+import money
+import online
+import parallel
+import reconcile
+import recurring
+import rules
+import sharedcache
+import txframe
+
+MODEL_PATH = "model/expense_model.pkl"
+
+# ──────────────────────────────────────────────────────────
+# ML Model – loaded lazily on first use, or up front by warm_up()
+# ──────────────────────────────────────────────────────────
+_ml_model = None
+_ml_model_loaded = False
+_ml_model_version = None
+
+
+def _get_model():
+    """Return the ML model, unpickling it (and importing sklearn) on first call."""
+    global _ml_model, _ml_model_loaded, _ml_model_version
+    if not _ml_model_loaded:
+        try:
+            with open(MODEL_PATH, "rb") as f:
+                _ml_model = pickle.load(f)
+                _ml_model_version = os.fstat(f.fileno()).st_mtime_ns
+        except Exception:
+            _ml_model = None
+        _ml_model_loaded = True
+    return _ml_model
+
+
+# ──────────────────────────────────────────────────────────
+# Categorisation Rules – layers 1, 3 & 4 (see rules.py)
+# ──────────────────────────────────────────────────────────
+# Compiled once at import, so a preloading gunicorn master shares it
+RULES = rules.load_rules()
+
+# Minimum ML confidence for layer 2 to override layer 1
+ML_MIN_CONFIDENCE = 0.4
+
+# Prices that mark a recurring series as a subscription (see recurring.py)
+SUBSCRIPTION_PRICES = recurring.subscription_prices(RULES)
+
+
+def _layer2_ml(descs: list) -> tuple:
+    """
+    Batched ML model prediction. Returns (categories, confidences), with
+    (None, 0) entries if no model is available.
+    Prefers the online model (the base model refined with user corrections)
+    once one exists.
+    """
+    model = online.current_model() or _get_model()
+    if model is None or not descs:
+        return [None] * len(descs), [0.0] * len(descs)
+    try:
+        probabilities = model.predict_proba(descs)
+        best = np.argmax(probabilities, axis=1)
+        return model.classes_[best], probabilities.max(axis=1)
+    except Exception:
+        return [None] * len(descs), [0.0] * len(descs)
+
+
+# ──────────────────────────────────────────────────────────
+# Host-wide cache of layer 1-3 results and merchants (see sharedcache.py)
+# ──────────────────────────────────────────────────────────
+# Opened on first use in each process, not at import: importing engine (and
+# so app, batch or a benchmark) must not create files, and a gunicorn
+# master that only warms up never needs the cache. None until then.
+SHARED_CACHE = None
+_shared_cache_opened = False
+_shared_cache_lock = threading.Lock()
+
+
+def _open_shared_cache():
+    global SHARED_CACHE, _shared_cache_opened
+    if not _shared_cache_opened:
+        with _shared_cache_lock:
+            if not _shared_cache_opened:
+                SHARED_CACHE = sharedcache.open_cache()
+                _shared_cache_opened = True
+    return SHARED_CACHE
+
+
+def cache_view():
+    """
+    The shared cache stamped with the current rule table and ML model, or
+    None when disabled. Entries written under another table or model (e.g.
+    before the online model learnt new corrections) read as misses.
+    """
+    if _open_shared_cache() is None:
+        return None
+    if online.current_model() is not None:
+        model = ("online", online.model_version())
+    else:
+        _get_model()
+        model = ("base", _ml_model_version)
+    return SHARED_CACHE.view(sharedcache.stamp_of(RULES.fingerprint, *model, ML_MIN_CONFIDENCE))
+
+
+def categorize_many(descriptions, amounts) -> np.ndarray:
+    """
+    4-layer hybrid categorisation engine over many rows at once.
+    Layer 1: Keyword rules
+    Layer 2: ML model prediction (if layer 1 yields Others/Transfer)
+    Layer 3: Regex pattern rules
+    Layer 4: Amount rules
+    Layers 1-3 are looked up in the shared cache first.
+    Returns an array of categories aligned with descriptions.
+    """
+    return RULES.categorize(
+        descriptions, amounts,
+        ml_predict=_layer2_ml, ml_min_confidence=ML_MIN_CONFIDENCE,
+        cache=cache_view(),
+    )
+
+
+def categorize_transaction(description: str, amount: float = 0.0) -> str:
+    """Categorise a single transaction (see categorize_many)."""
+    return categorize_many([description], [amount])[0]
+
+
+# ──────────────────────────────────────────────────────────
+# Merchant Name Extraction
+# ──────────────────────────────────────────────────────────
+_MERCHANT_NOISE_PATTERNS = [
+    re.compile(r"UPI[-/]", re.IGNORECASE),
+    re.compile(r"NEFT[-/]", re.IGNORECASE),
+    re.compile(r"IMPS[-/]", re.IGNORECASE),
+    re.compile(r"RTGS[-/]", re.IGNORECASE),
+    re.compile(r"\b(HDFC|SBI|ICICI|AXIS|KOTAK|IDFC|YES|PNB|BOB|CANARA|UNION)\s*BANK\b", re.IGNORECASE),
+    re.compile(r"\b(HDFC|SBIN|ICICI|AXIS|KOTAK|IDFC|YESB|PUNB|BARB)\b", re.IGNORECASE),
+    re.compile(r"\b\d{8,}\b"),                       # Long reference numbers
+    re.compile(r"\bUTR\s*\d+\b", re.IGNORECASE),
+    re.compile(r"\bREF\s*\d+\b", re.IGNORECASE),
+    re.compile(r"\b[A-Z0-9]{12,}\b"),                # Transaction IDs
+    re.compile(r"@\S+"),                              # UPI handles
+    re.compile(r"\b(PVT|LTD|LIMITED|PRIVATE)\b", re.IGNORECASE),
+    re.compile(r"\b(VIA|PAYMENT|PAID|FROM|TO)\b", re.IGNORECASE),
+]
+
+
+def extract_merchant(description: str) -> str:
+    """Extract clean merchant/payee name from a raw transaction description."""
+    text = str(description).strip()
+    if not text:
+        return "Unknown"
+
+    # Split on common separators (-, /, |)
+    parts = re.split(r"[-/|]", text)
+
+    # For UPI transactions, the merchant name is usually the second token
+    upper = text.upper()
+    if any(tag in upper for tag in ("UPI", "IMPS", "NEFT", "RTGS")):
+        # Try to pick the part that looks like a merchant name
+        candidates = []
+        for part in parts:
+            cleaned = part.strip()
+            if not cleaned:
+                continue
+            # Skip parts that are just noise
+            is_noise = False
+            if re.match(r"^\d+$", cleaned):
+                is_noise = True
+            if cleaned.upper() in ("UPI", "NEFT", "IMPS", "RTGS", "CR", "DR"):
+                is_noise = True
+            if re.match(r"^[A-Z0-9]{12,}$", cleaned):
+                is_noise = True
+            if "@" in cleaned:
+                is_noise = True
+            # Skip bank names
+            if any(b in cleaned.lower() for b in ["hdfc", "sbin", "icici", "axis",
+                                                    "kotak", "idfc", "yesb", "bank"]):
+                is_noise = True
+            if not is_noise and len(cleaned) > 1:
+                candidates.append(cleaned)
+
+        if candidates:
+            # Return the first meaningful candidate, title-cased
+            return candidates[0].strip().title()
+
+    # Fallback: strip all noise patterns from the raw text
+    result = text
+    for pat in _MERCHANT_NOISE_PATTERNS:
+        result = pat.sub(" ", result)
+
+    result = re.sub(r"\s+", " ", result).strip()
+
+    if len(result) < 2:
+        return "Unknown"
+
+    return result.title()
+
+
+# ──────────────────────────────────────────────────────────
+# Amount Cleaner
+# ──────────────────────────────────────────────────────────
+def clean_amt(v) -> int:
+    """
+    Parse an amount string into exact integer paise (see money.py). Handles:
+    - Indian number format (1,23,456.78)
+    - Parenthesised amounts as negative (debits)
+    - Dr/Cr suffix
+    - Empty / dash values
+    """
+    if v is None:
+        return 0
+
+    s = str(v).strip()
+    if s in ("", "-", "None", "nan", "NaN"):
+        return 0
+
+    # Detect parenthesised amounts → negative
+    negative = False
+    if s.startswith("(") and s.endswith(")"):
+        negative = True
+        s = s[1:-1].strip()
+
+    # Detect Dr suffix → treat as positive debit
+    if re.search(r"\bDr\.?\s*$", s, re.IGNORECASE):
+        s = re.sub(r"\bDr\.?\s*$", "", s, flags=re.IGNORECASE).strip()
+
+    # Detect Cr suffix → keep as-is (credit)
+    if re.search(r"\bCr\.?\s*$", s, re.IGNORECASE):
+        s = re.sub(r"\bCr\.?\s*$", "", s, flags=re.IGNORECASE).strip()
+
+    # Remove currency symbols and whitespace
+    s = re.sub(r"[₹$€£]", "", s).strip()
+
+    # Remove commas (handles Indian format: 1,23,456.78)
+    s = s.replace(",", "")
+
+    # Remove any remaining non-numeric chars except dot and minus
+    s = re.sub(r"[^\d.\-]", "", s)
+
+    try:
+        num = money.parse_paise(s)
+        if negative:
+            num = -abs(num)
+        return num
+    except (ValueError, TypeError):
+        return 0
+
+
+# ──────────────────────────────────────────────────────────
+# Aggregation
+# ──────────────────────────────────────────────────────────
+def parse_days(df: pd.DataFrame):
+    """Normalised transaction dates (NaT if unparseable), or None without a Date column."""
+    if "Date" not in df.columns:
+        return None
+    try:
+        return txframe.parse_dates(df["Date"])
+    except Exception:
+        return None
+
+
+def aggregate(df: pd.DataFrame, day=None, recurring_series=None) -> dict:
+    """
+    Single aggregation pass shared by the dashboard payload and every insight.
+    The absolute amount and the day key are computed once, and each
+    dimension gets one groupby with built-in reducers (no Python lambdas).
+    Already parsed days and detected recurring series may be passed in.
+    Money figures are in paise: exact integer sums (mean_abs is a float).
+    """
+    amount = df["Amount"]
+    abs_amount = amount.abs()
+
+    if day is None:
+        day = parse_days(df)
+    if recurring_series is None and "Merchant" in df.columns:
+        recurring_series, _ = recurring.detect(df["Merchant"], amount, day)
+
+    agg = {
+        "abs_amount": abs_amount,
+        "day": day,
+        "count": len(df),
+        "total_abs": abs_amount.sum(),
+        "mean_abs": abs_amount.mean() if len(df) else 0.0,
+        "debits": amount[amount > 0].sum(),
+        "credits": -amount[amount < 0].sum(),
+        "by_category": None,
+        "by_merchant": None,
+        "by_day": None,
+        "recurring": recurring_series,
+    }
+    if "Category" in df.columns:
+        agg["by_category"] = abs_amount.groupby(df["Category"], observed=True).sum()
+    if "Merchant" in df.columns:
+        agg["by_merchant"] = abs_amount.groupby(df["Merchant"], observed=True).agg(["sum", "count"])
+    if day is not None and day.notna().any():
+        agg["by_day"] = abs_amount.groupby(day).agg(["sum", "count"])
+    return agg
+
+
+# ──────────────────────────────────────────────────────────
+# Smart Insights
+# ──────────────────────────────────────────────────────────
+# Transactions above this many paise count as high-value
+HIGH_VALUE_PAISE = 10_000 * money.PAISE_PER_RUPEE
+
+def generate_insights(df: pd.DataFrame, agg: dict = None) -> list:
+    """
+    Generate a list of human-readable insight strings from the analysed DataFrame.
+    Pass the result of aggregate(df) as agg to reuse an existing aggregation.
+    """
+    insights = []
+
+    if df.empty:
+        return ["No transactions to analyse."]
+
+    if agg is None:
+        agg = aggregate(df)
+
+    # Work with absolute amounts for spending analysis
+    amounts = agg["abs_amount"]
+    total = agg["total_abs"]
+    count = agg["count"]
+    avg = agg["mean_abs"]
+
+    # 1. Highest spending category
+    cat_totals = agg["by_category"]
+    if cat_totals is not None and not cat_totals.empty:
+        top_cat = cat_totals.idxmax()
+        top_amt = cat_totals.max()
+        pct = (top_amt / total * 100) if total > 0 else 0
+        insights.append(
+            f"Your highest spending category is {top_cat} at "
+            f"\u20b9{money.rupees(top_amt):,.0f} ({pct:.1f}% of total)"
+        )
+
+    # 2. Largest single transaction
+    idx_max = amounts.idxmax()
+    largest_amt = amounts.loc[idx_max]
+    merchant = df.loc[idx_max, "Merchant"] if "Merchant" in df.columns else "Unknown"
+    insights.append(
+        f"Your largest single transaction was \u20b9{money.rupees(largest_amt):,.0f} to {merchant}"
+    )
+
+    # 3. Transaction count & average
+    insights.append(
+        f"You made {count} transactions averaging \u20b9{money.rupees(avg):,.0f} each"
+    )
+
+    # 4. Most frequent merchant
+    merchants = agg["by_merchant"]
+    if merchants is not None and not merchants.empty:
+        top_merchant = merchants["count"].idxmax()
+        top_count = merchants.loc[top_merchant, "count"]
+        if top_count > 1:
+            insights.append(
+                f"Your most frequent merchant is {top_merchant} with "
+                f"{top_count} transactions"
+            )
+
+    # 5. High-value transactions
+    high_value = int((amounts > HIGH_VALUE_PAISE).sum())
+    if high_value > 0:
+        insights.append(
+            f"You had {high_value} high-value transactions over \u20b910,000"
+        )
+
+    # 6. Busiest spending day
+    daily = agg["by_day"]
+    if daily is not None and not daily.empty:
+        busiest = daily["count"].idxmax()
+        busiest_count = daily.loc[busiest, "count"]
+        busiest_total = daily.loc[busiest, "sum"]
+        insights.append(
+            f"Your busiest spending day was {busiest.date()} with "
+            f"{busiest_count} transactions totaling "
+            f"\u20b9{money.rupees(busiest_total):,.0f}"
+        )
+
+    # 7. Unusual spikes (transactions > 3× average)
+    if avg > 0:
+        spikes = int((amounts > 3 * avg).sum())
+        if spikes > 0:
+            insights.append(
+                f"\u26a0\ufe0f {spikes} transactions were unusually large "
+                f"(over 3\u00d7 your average of \u20b9{money.rupees(avg):,.0f})"
+            )
+
+    # 8. Recurring payments and subscriptions
+    series = agg.get("recurring")
+    if series is not None and not series.empty:
+        top = series.iloc[0]
+        insights.append(
+            f"You have {len(series)} recurring payments costing about "
+            f"\u20b9{money.rupees(series['monthly_burden'].sum()):,.0f} a month; the largest is "
+            f"{top['merchant']} (\u20b9{money.rupees(top['amount']):,.0f} {top['period']}, "
+            f"next due {top['next_expected'].date()})"
+        )
+
+    return insights
+
+
+# ──────────────────────────────────────────────────────────
+# Pipeline
+# ──────────────────────────────────────────────────────────
+def analyze(df: pd.DataFrame) -> tuple:
+    """
+    Take a parsed DataFrame (Date, Description, Amount columns expected),
+    apply categorisation / merchant extraction and recurring-payment
+    detection in place, and return (df, agg) with agg from aggregate().
+    Category and Merchant are added as categoricals (see txframe.py).
+    """
+    # Ensure required columns, in the layout of txframe.py (amount text is
+    # parsed to paise; numeric amounts other than int64 paise are rupees)
+    if "Amount" not in df.columns:
+        df["Amount"] = np.int64(0)
+    if not pd.api.types.is_numeric_dtype(df["Amount"]):
+        df["Amount"] = df["Amount"].map(clean_amt).astype(np.int64)
+    txframe.compact(df)
+
+    # Apply categorisation & merchant extraction (sharded across a process
+    # pool for very large ledgers, see parallel.py)
+    with memguard.stage("categorize"):
+        df["Category"], df["Merchant"] = parallel.categorize_frame(
+            df["Description"].astype(str).tolist(),
+            # Amount rules are written in rupees
+            money.to_rupees(np.abs(df["Amount"].to_numpy())),
+            categorize_many,
+            extract_merchant,
+            cache_view(),
+            RULES,
+        )
+
+        # Recurring series re-label rows the rules left as Others
+        day = parse_days(df)
+        series, row_series = recurring.detect(df["Merchant"], df["Amount"], day)
+        df["Category"] = recurring.apply_categories(df["Category"], row_series, series, SUBSCRIPTION_PRICES)
+        txframe.compact(df)
+
+    with memguard.stage("aggregate"):
+        agg = aggregate(df, day, series)
+    return df, agg
+
+
+def process_file(path, password=None) -> tuple:
+    """Parse and analyse one statement file; returns (df, agg) as analyze()."""
+    df = parse_statement(path, password)
+    if df is None or df.empty:
+        raise ParseError("No transactions found in the statement")
+    return analyze(df)
+
+
+def rows_for_template(df: pd.DataFrame) -> list:
+    """
+    Transaction records as plain values: ISO dates, NaNs filled
+    (txframe.display_frame returns the only copy).
+    """
+    rows = txframe.display_frame(df, fill={
+        "Date": "",
+        "Debit": 0.0,
+        "Credit": 0.0,
+        "Balance": 0.0,
+        "Amount": 0.0,
+        "Merchant": "—",
+        "Category": "Others",
+    })
+    rows.rename(inplace=True, columns={
+        "Date": "Transaction Date",
+        "Description": "Description/Narration",
+        "Category": "AI Category",
+    })
+    return rows.to_dict("records")
+
+
+def dashboard_payload(df: pd.DataFrame, agg: dict = None, result_id: str = None) -> dict:
+    """Summaries and rows of an analysed (categorised) frame for dashboard.html."""
+    if agg is None:
+        agg = aggregate(df)
+
+    # ── Summary metrics ──
+    # If all amounts are positive (common in parsed statements), treat total as debit
+    # Paise become rupees only here
+    total_debit = money.rupees(agg["debits"])
+    total_credit = money.rupees(agg["credits"])
+    net_flow = money.rupees(agg["debits"] - agg["credits"])
+    tx_count = agg["count"]
+    avg_tx = round(money.rupees(agg["mean_abs"]), 2) if tx_count > 0 else 0
+
+    # ── Category summary ──
+    cat_summary = (
+        money.to_rupees(agg["by_category"])
+        .rename("Amount")
+        .reset_index()
+        .sort_values("Amount", ascending=False)
+    )
+    top_category = cat_summary.iloc[0]["Category"] if not cat_summary.empty else "N/A"
+
+    # ── Top merchants (top 10 by absolute spend) ──
+    merchant_spend = (
+        agg["by_merchant"]
+        .rename(columns={"sum": "total"})
+        .assign(total=lambda m: money.to_rupees(m["total"]))
+        .sort_values("total", ascending=False)
+        .head(10)
+        .reset_index()
+    )
+
+    # ── Daily spending ──
+    daily_data = []
+    if agg["by_day"] is not None:
+        daily = money.to_rupees(agg["by_day"]["sum"])
+        daily_data = [[d.strftime("%Y-%m-%d"), v] for d, v in zip(daily.index, daily.tolist())]
+
+    # ── Smart insights ──
+    insights = generate_insights(df, agg)
+
+    return dict(
+        result_id=result_id,
+        rows=rows_for_template(df),
+        total_spend=total_debit,
+        total_credit=total_credit,
+        net_flow=net_flow,
+        total_transactions=tx_count,
+        avg_transaction=avg_tx,
+        top_category=top_category,
+        category_summary=cat_summary.values.tolist(),
+        top_merchants=merchant_spend.values.tolist(),
+        daily_spending=daily_data,
+        insights=insights,
+        categories=online.known_categories(),
+        parse_quality=reconcile.quality(df),
+    )
+
+
+# ──────────────────────────────────────────────────────────
+# Warm-up
+# ──────────────────────────────────────────────────────────
+# Representative narrations used to prime regex and model caches at startup
+_WARM_UP_SAMPLES = [
+    ("UPI-SWIGGY-swiggy123@ybl-412345678901-Payment", 349.0),
+    ("NEFT-UTR1234567890-Rent to Sharma", 15000.0),
+    ("ATM-CW-123456789012-SBI ATM MUMBAI", 2000.0),
+    ("POS TXN DMART STORE PUNE", 1240.5),
+    ("Netflix subscription", 199.0),
+    ("UPI-rahul@oksbi-412345678901", 500.0),
+]
+
+
+def warm_up():
+    """
+    Load the model and exercise every categorisation layer once.
+
+    Meant to run in the gunicorn master (see gunicorn.conf.py) so the
+    unpickled model, sklearn and the compiled regex caches are created
+    before fork and shared copy-on-write by all workers.
+    """
+    _get_model()
+    for desc, amount in _WARM_UP_SAMPLES:
+        # Without the shared cache, which each worker opens for itself
+        RULES.categorize([desc], [amount], ml_predict=_layer2_ml, ml_min_confidence=ML_MIN_CONFIDENCE)
+        extract_merchant(desc)
+        clean_amt(f"{amount:,.2f} Dr")
+        clean_val(f"{amount:,.2f} Cr")
+    _layer2_ml([desc for desc, _ in _WARM_UP_SAMPLES])
@@ -0,0 +1,199 @@
+"""
+Streaming exports of an analysed ledger.
+
+Each exporter is a generator of byte chunks, suitable for a Flask streaming
+response. Rows are processed EXPORT_CHUNK_ROWS at a time, with the optional
+date-range and category filters applied per chunk, so peak memory is one
+chunk of output on top of the stored frame, whatever the ledger size.
+
+    csv      UTF-8 (with BOM, for Excel) CSV, one chunk per slice
+    parquet  one row group per slice, flushed as soon as it is written
+    xlsx     openpyxl write-only workbook (rows are streamed to a temporary
+             file, which is then sent in blocks)
+
+Amounts stay int64 paise (see money.py) up to the writer: CSV and XLSX get
+rupees with two decimals, Parquet gets exact decimal(18, 2) values.
+"""
+import os
+import tempfile
+
+import pandas as pd
+
+import money
+import txframe
+from result_store import arrow_table, parquet_ready
+
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 10_000))
+# Bytes per chunk when sending a finished file
+FILE_BLOCK_SIZE = 256 * 1024
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _filter_chunk(chunk: pd.DataFrame, start=None, end=None, categories=None) -> pd.DataFrame:
+    """Rows of chunk inside [start, end] (inclusive days) and the given categories."""
+    if start is None and end is None and not categories:
+        return chunk
+    mask = pd.Series(True, index=chunk.index)
+    if start is not None or end is not None:
+        day = txframe.parse_dates(chunk["Date"])
+        if start is not None:
+            mask &= day >= start
+        if end is not None:
+            mask &= day <= end
+    if categories:
+        mask &= chunk["Category"].isin(categories)
+    return chunk[mask]
+
+
+def iter_chunks(df: pd.DataFrame, start=None, end=None, categories=None,
+                chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield filtered slices of df, chunk_rows input rows at a time."""
+    start = pd.Timestamp(start).normalize() if start else None
+    end = pd.Timestamp(end).normalize() if end else None
+    categories = [c for c in (categories or []) if c]
+    for pos in range(0, len(df), chunk_rows):
+        chunk = _filter_chunk(df.iloc[pos:pos + chunk_rows], start, end, categories)
+        if not chunk.empty:
+            yield chunk
+
+
+def _in_rupees(chunk: pd.DataFrame) -> pd.DataFrame:
+    """chunk with its paise columns as rupee floats, for text and spreadsheet output."""
+    paise = [c for c in txframe.MONEY_COLUMNS if c in chunk.columns and pd.api.types.is_integer_dtype(chunk[c])]
+    return chunk.assign(**{c: money.to_rupees(chunk[c]) for c in paise}) if paise else chunk
+
+
+def stream_csv(df: pd.DataFrame, **filters):
+    yield ("\ufeff" + df.head(0).to_csv(index=False)).encode("utf-8")
+    for chunk in iter_chunks(df, **filters):
+        yield _in_rupees(chunk).to_csv(index=False, header=False, float_format="%.2f").encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _arrow_schema(df: pd.DataFrame):
+    """
+    Schema for the whole frame; object columns are strings even if a chunk
+    is all-null. Categorical columns are written as plain strings (Parquet
+    dictionary-encodes each row group itself, whereas an Arrow dictionary
+    would repeat every category in every row group), dates as days and
+    paise as exact decimals.
+    """
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(parquet_ready(df.head(1)), preserve_index=False)
+    for i, name in enumerate(schema.names):
+        dtype = df[name].dtype
+        if name in txframe.MONEY_COLUMNS and pd.api.types.is_integer_dtype(dtype):
+            schema = schema.set(i, pa.field(name, pa.decimal128(money.DECIMAL_PRECISION, money.DECIMAL_SCALE)))
+        elif dtype == object or isinstance(dtype, pd.CategoricalDtype):
+            schema = schema.set(i, pa.field(name, pa.string()))
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            schema = schema.set(i, pa.field(name, pa.date32()))
+    return schema
+
+
+def stream_parquet(df: pd.DataFrame, **filters):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(df)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    try:
+        for chunk in iter_chunks(df, **filters):
+            writer.write_table(arrow_table(chunk, schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_xlsx(df: pd.DataFrame, **filters):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Transactions")
+    ws.append([str(c) for c in df.columns])
+    for chunk in iter_chunks(df, **filters):
+        chunk = _in_rupees(chunk)
+        values = chunk.astype(object)
+        for col in chunk.columns[[pd.api.types.is_datetime64_any_dtype(t) for t in chunk.dtypes]]:
+            # Date cells rather than midnight timestamps
+            values[col] = chunk[col].dt.date
+        values = values.where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            ws.append(row)
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        wb.save(path)
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(FILE_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+    finally:
+        os.unlink(path)
+
+
+_STREAMERS = {
+    "csv": stream_csv,
+    "parquet": stream_parquet,
+    "xlsx": stream_xlsx,
+}
+
+
+def export(df: pd.DataFrame, fmt="csv", start=None, end=None, categories=None):
+    """
+    Return (generator of bytes, mimetype, file extension) for df in fmt.
+    Raises ExportError for an unknown format or unparseable date bound.
+    """
+    if fmt not in _STREAMERS:
+        raise ExportError(f"format must be one of {', '.join(_STREAMERS)}")
+    try:
+        for bound in (start, end):
+            if bound:
+                pd.Timestamp(bound)
+    except (ValueError, TypeError):
+        raise ExportError("start and end must be dates (YYYY-MM-DD)")
+    mimetype, extension = FORMATS[fmt]
+    return _STREAMERS[fmt](df, start=start, end=end, categories=categories), mimetype, extension
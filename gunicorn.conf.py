@@ -0,0 +1,31 @@
+import gc
+import os
+
+# ──────────────────────────────────────────────────────────
+# Gunicorn settings (used by the Procfile)
+# ──────────────────────────────────────────────────────────
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+# Exported so each worker's categorisation pool (parallel.py) takes its
+# share of the cores rather than all of them
+workers = int(os.environ.setdefault("WEB_CONCURRENCY", "2"))
+# One request per worker; admission.py sizes its slots for this and never
+# lets a request wait for one
+worker_class = "sync"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# Import app.py once in the master; workers inherit it through fork().
+# Set PRELOAD_APP=0 to fall back to importing the app in every worker.
+preload_app = os.environ.get("PRELOAD_APP", "1") == "1"
+
+
+def when_ready(server):
+    """Warm caches in the master before any worker is forked."""
+    if not preload_app:
+        return
+    import engine
+
+    engine.warm_up()
+    # Move everything allocated so far into the permanent generation so the
+    # cyclic GC in workers never writes to (and un-shares) those pages.
+    gc.collect()
+    gc.freeze()
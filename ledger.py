@@ -0,0 +1,232 @@
+"""
+Optional persistent ledger of categorised transactions (SQLite).
+
+When LEDGER_ENABLED is set, every analysed statement is appended to
+LEDGER_PATH under an account name. Rows are identified by a content hash of
+(day, description, amount, balance, occurrence), so re-uploading an
+overlapping statement never duplicates transactions, while genuinely
+repeated rows within one statement are kept. Inserts run in batched
+transactions of INSERT_BATCH_ROWS.
+
+dashboard() computes the same summaries as the upload dashboard with SQL
+aggregates over any stored date range, and load_frame() returns the rows
+in the parsed-statement layout, so multi-month views need no re-parsing.
+
+Money is stored as INTEGER paise, the frame's own int64 values (see
+money.py), so SQL sums are exact and rupees appear only in dashboard().
+"""
+import hashlib
+import os
+import re
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+import money
+import txframe
+
+LEDGER_PATH = os.environ.get("LEDGER_PATH", "data/ledger.sqlite3")
+LEDGER_ENABLED = os.environ.get("LEDGER_ENABLED", "0") == "1"
+DEFAULT_ACCOUNT = "default"
+INSERT_BATCH_ROWS = 5000
+
+_ACCOUNT_RE = re.compile(r"^[\w.\-]{1,64}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id           INTEGER PRIMARY KEY,
+    account      TEXT NOT NULL,
+    day          TEXT,
+    date_raw     TEXT,
+    description  TEXT NOT NULL,
+    merchant     TEXT,
+    category     TEXT,
+    debit_paise   INTEGER NOT NULL,
+    credit_paise  INTEGER NOT NULL,
+    balance_paise INTEGER NOT NULL,
+    amount_paise  INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    UNIQUE (account, content_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_tx_account_day ON transactions (account, day);
+CREATE INDEX IF NOT EXISTS idx_tx_account_category_day ON transactions (account, category, day);
+CREATE INDEX IF NOT EXISTS idx_tx_account_merchant ON transactions (account, merchant);
+"""
+
+_INSERT = """
+INSERT OR IGNORE INTO transactions
+    (account, day, date_raw, description, merchant, category,
+     debit_paise, credit_paise, balance_paise, amount_paise, content_hash)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class LedgerError(ValueError):
+    pass
+
+
+def valid_account(account) -> str:
+    """Return account (or DEFAULT_ACCOUNT when empty); raise LedgerError if malformed."""
+    account = (account or DEFAULT_ACCOUNT).strip()
+    if not _ACCOUNT_RE.match(account):
+        raise LedgerError("account may only contain letters, digits, '.', '_' and '-' (max 64)")
+    return account
+
+
+def connect(path: str = None) -> sqlite3.Connection:
+    """Open the ledger, creating the schema on first use."""
+    path = path or LEDGER_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _none_if_nan(values):
+    return [None if pd.isna(v) else v for v in values]
+
+
+def _content_hashes(day_keys, descriptions, amounts, balances) -> list:
+    """Hash each row together with how many identical rows precede it."""
+    seen = {}
+    out = []
+    for key in zip(day_keys, descriptions, amounts, balances):
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        out.append(hashlib.sha1(repr(key + (n,)).encode("utf-8")).hexdigest())
+    return out
+
+
+def add_transactions(account: str, df: pd.DataFrame, day=None, path: str = None) -> int:
+    """
+    Append an analysed frame in the layout of txframe.py (Date,
+    Description, Amount, Category, Merchant, optional Debit/Credit/Balance,
+    money in int64 paise) to account. day may be passed in when the
+    dates are already parsed. Returns the number of new rows stored.
+    """
+    account = valid_account(account)
+    if df.empty:
+        return 0
+    if day is None:
+        day = txframe.parse_dates(df["Date"])
+    days = _none_if_nan(day.dt.strftime("%Y-%m-%d"))
+    n = len(df)
+
+    def column(name, default=None):
+        return _none_if_nan(df[name]) if name in df.columns else [default] * n
+
+    def paise(name):
+        # int64 paise of the frame (txframe.py) as Python ints; 0 = absent
+        return df[name].astype("int64").tolist() if name in df.columns else [0] * n
+
+    descriptions = [str(d) for d in df["Description"]]
+    amounts = paise("Amount")
+    balances = paise("Balance")
+    if pd.api.types.is_datetime64_any_dtype(df["Date"]):
+        # Parsed frames (txframe.py) no longer carry the statement's text
+        raw_dates = days
+    else:
+        raw_dates = [None if v is None else str(v) for v in column("Date")]
+    # Rows without a parseable date are keyed on the raw date text instead
+    day_keys = [d if d is not None else r for d, r in zip(days, raw_dates)]
+    hashes = _content_hashes(day_keys, descriptions, amounts, balances)
+
+    rows = list(zip(
+        [account] * n, days, raw_dates, descriptions, column("Merchant"), column("Category"),
+        paise("Debit"), paise("Credit"), balances, amounts, hashes,
+    ))
+    inserted = 0
+    with closing(connect(path)) as conn:
+        for start in range(0, n, INSERT_BATCH_ROWS):
+            with conn:
+                before = conn.total_changes
+                conn.executemany(_INSERT, rows[start:start + INSERT_BATCH_ROWS])
+                inserted += conn.total_changes - before
+    return inserted
+
+
+def _where(account, start=None, end=None):
+    """WHERE clause and parameters for an account and inclusive ISO day range."""
+    clause, params = ["account = ?"], [valid_account(account)]
+    if start:
+        clause.append("day >= ?")
+        params.append(str(pd.Timestamp(start).date()))
+    if end:
+        clause.append("day <= ?")
+        params.append(str(pd.Timestamp(end).date()))
+    return " AND ".join(clause), params
+
+
+def accounts(path: str = None) -> list:
+    """[[account, transactions, first day, last day], ...]"""
+    with closing(connect(path)) as conn:
+        return [list(r) for r in conn.execute(
+            "SELECT account, COUNT(*), MIN(day), MAX(day) FROM transactions "
+            "GROUP BY account ORDER BY account"
+        )]
+
+
+def dashboard(account: str, start=None, end=None, path: str = None) -> dict:
+    """
+    The upload dashboard's summary figures for account over [start, end],
+    computed with SQL aggregates (same keys as app._dashboard_payload).
+    Sums are exact integer paise, turned into rupees at the end.
+    """
+    where, params = _where(account, start, end)
+    with closing(connect(path)) as conn:
+        debits, credits, count, avg_abs = conn.execute(
+            "SELECT COALESCE(SUM(CASE WHEN amount_paise > 0 THEN amount_paise END), 0),"
+            "       COALESCE(-SUM(CASE WHEN amount_paise < 0 THEN amount_paise END), 0),"
+            "       COUNT(*), COALESCE(AVG(ABS(amount_paise)), 0) "
+            f"FROM transactions WHERE {where}", params,
+        ).fetchone()
+        categories = conn.execute(
+            "SELECT category, SUM(ABS(amount_paise)) AS total "
+            f"FROM transactions WHERE {where} GROUP BY category ORDER BY total DESC", params,
+        ).fetchall()
+        merchants = conn.execute(
+            "SELECT merchant, SUM(ABS(amount_paise)) AS total, COUNT(*) "
+            f"FROM transactions WHERE {where} GROUP BY merchant "
+            "ORDER BY total DESC LIMIT 10", params,
+        ).fetchall()
+        daily = conn.execute(
+            "SELECT day, SUM(ABS(amount_paise)) "
+            f"FROM transactions WHERE {where} AND day IS NOT NULL GROUP BY day ORDER BY day",
+            params,
+        ).fetchall()
+
+    return dict(
+        total_spend=money.rupees(debits),
+        total_credit=money.rupees(credits),
+        net_flow=money.rupees(debits - credits),
+        total_transactions=count,
+        avg_transaction=round(money.rupees(avg_abs), 2) if count else 0,
+        top_category=categories[0][0] if categories else "N/A",
+        category_summary=[[c, money.rupees(total)] for c, total in categories],
+        top_merchants=[[m, money.rupees(total), k] for m, total, k in merchants],
+        daily_spending=[[d, money.rupees(total)] for d, total in daily],
+    )
+
+
+def load_frame(account: str, start=None, end=None, path: str = None) -> pd.DataFrame:
+    """
+    Stored rows for account over [start, end], in date order, as an
+    analysed frame in the compact layout of txframe.py.
+    """
+    where, params = _where(account, start, end)
+    with closing(connect(path)) as conn:
+        df = pd.read_sql_query(
+            "SELECT day AS Date, description AS Description, debit_paise AS Debit,"
+            "       credit_paise AS Credit, balance_paise AS Balance, amount_paise AS Amount,"
+            "       category AS Category, merchant AS Merchant "
+            f"FROM transactions WHERE {where} ORDER BY day, id",
+            conn, params=params,
+            dtype={col: "int64" for col in txframe.MONEY_COLUMNS},
+        )
+    df["Date"] = pd.to_datetime(df["Date"], format="%Y-%m-%d")
+    return txframe.compact(df)
@@ -0,0 +1,214 @@
+"""
+Per-stage memory accounting and a cap on how far a worker grows per request.
+
+A request runs inside request_scope(); the pipeline marks its stages with
+stage(name) (open, extract, normalize, categorize, aggregate, render) and
+calls check() inside long loops (per PDF page, every few thousand rows).
+Usage is the process's growth over its size when the request started (so a
+stage's figure is the peak reached while it ran, including what earlier
+stages still hold), measured by one of
+
+    rss          (default) resident set size from /proc/self/statm, sampled
+                 every SAMPLE_INTERVAL seconds by a watchdog thread and at
+                 every stage boundary and check(); cheap enough to leave on
+    tracemalloc  exact peak of Python/NumPy allocations; several times
+                 slower, meant for investigating a specific statement
+    off          no accounting
+
+When usage exceeds PROCESS_MEMORY_CAP_MB (0 disables the cap), the next
+check() or stage boundary raises parsers.MemoryBudgetExceeded, so the
+request is unwound and its memory freed instead of the worker being
+OOM-killed. Both measures are per process, not per request: anything else
+the process allocates meanwhile (other threads, caches filling up) counts
+too. With the sync gunicorn workers of gunicorn.conf.py a worker serves one
+request at a time, so in practice the cap bounds that request.
+"""
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+MEMORY_TRACKING = os.environ.get("MEMORY_TRACKING", "rss")
+# Growth of the worker process allowed while one request runs
+PROCESS_MEMORY_CAP_MB = int(os.environ.get("PROCESS_MEMORY_CAP_MB", 1024))
+SAMPLE_INTERVAL = 0.05
+
+STAGES = ("open", "extract", "normalize", "categorize", "aggregate", "render")
+
+_MB = 2 ** 20
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (0 if unavailable)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class _Scope:
+    def __init__(self, mode, cap_bytes):
+        self.mode = mode
+        self.cap = cap_bytes
+        self.stage = None
+        self.stages = {}
+        self.peak = 0
+        self.over = False
+        self.aborted = False
+        self.baseline = self._usage()
+
+    def _usage(self) -> int:
+        if self.mode == "tracemalloc":
+            import tracemalloc
+            return tracemalloc.get_traced_memory()[1]
+        return rss_bytes()
+
+    def sample(self):
+        used = max(self._usage() - self.baseline, 0)
+        self.peak = max(self.peak, used)
+        if self.stage is not None:
+            self.stages[self.stage] = max(self.stages.get(self.stage, 0), used)
+        if self.cap and used > self.cap:
+            self.over = True
+
+
+# ──────────────────────────────────────────────────────────
+# Watchdog and process-wide figures
+# ──────────────────────────────────────────────────────────
+_local = threading.local()
+_active = set()
+_lock = threading.Lock()
+_watchdog_pid = None
+_stats = {"requests": 0, "aborted": 0, "peak_mb": 0.0, "stages": {}, "last_request": {}}
+
+
+def _watch():
+    while True:
+        time.sleep(SAMPLE_INTERVAL)
+        with _lock:
+            scopes = list(_active)
+        for scope in scopes:
+            scope.sample()
+
+
+def _ensure_watchdog():
+    """One sampling thread per process, started after fork."""
+    global _watchdog_pid
+    if _watchdog_pid != os.getpid():
+        _watchdog_pid = os.getpid()
+        threading.Thread(target=_watch, daemon=True).start()
+
+
+def _record(scope):
+    as_mb = {name: round(used / _MB, 1) for name, used in scope.stages.items()}
+    with _lock:
+        _stats["requests"] += 1
+        _stats["aborted"] += int(scope.aborted)
+        _stats["peak_mb"] = max(_stats["peak_mb"], round(scope.peak / _MB, 1))
+        for name, mb in as_mb.items():
+            entry = _stats["stages"].setdefault(name, {"max_mb": 0.0, "last_mb": 0.0})
+            entry["max_mb"] = max(entry["max_mb"], mb)
+            entry["last_mb"] = mb
+        _stats["last_request"] = as_mb
+
+
+def current():
+    return getattr(_local, "scope", None)
+
+
+@contextmanager
+def request_scope(cap_mb=None):
+    """Account the enclosed request and enforce the growth cap within it."""
+    if MEMORY_TRACKING not in ("rss", "tracemalloc") or current() is not None:
+        yield None
+        return
+
+    started_tracing = False
+    if MEMORY_TRACKING == "tracemalloc":
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(1)
+            started_tracing = True
+    else:
+        _ensure_watchdog()
+
+    cap = PROCESS_MEMORY_CAP_MB if cap_mb is None else cap_mb
+    scope = _Scope(MEMORY_TRACKING, cap * _MB)
+    _local.scope = scope
+    with _lock:
+        _active.add(scope)
+    try:
+        yield scope
+    finally:
+        with _lock:
+            _active.discard(scope)
+        _local.scope = None
+        scope.sample()
+        _record(scope)
+        if started_tracing:
+            import tracemalloc
+            tracemalloc.stop()
+
+
+def check():
+    """Raise MemoryBudgetExceeded if the process outgrew its cap during the current request."""
+    scope = current()
+    if scope is None:
+        return
+    scope.sample()
+    if scope.over:
+        scope.aborted = True
+        from parsers import MemoryBudgetExceeded
+        raise MemoryBudgetExceeded(
+            f"Statement processing grew the worker by more than {scope.cap // _MB} MB "
+            f"(stage: {scope.stage or 'unknown'})"
+        )
+
+
+@contextmanager
+def stage(name):
+    """Attribute the enclosed work to a pipeline stage."""
+    scope = current()
+    if scope is None:
+        yield
+        return
+    previous = scope.stage
+    if scope.mode == "tracemalloc":
+        import tracemalloc
+        tracemalloc.reset_peak()
+    scope.stage = name
+    scope.sample()
+    try:
+        yield
+        check()
+    finally:
+        scope.sample()
+        scope.stage = previous
+
+
+def tracked(view):
+    """Run a Flask view inside request_scope()."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with request_scope():
+            return view(*args, **kwargs)
+
+    return wrapper
+
+
+def stats() -> dict:
+    with _lock:
+        out = {
+            "mode": MEMORY_TRACKING,
+            "process_cap_mb": PROCESS_MEMORY_CAP_MB,
+            "rss_mb": round(rss_bytes() / _MB, 1),
+            "requests": _stats["requests"],
+            "aborted": _stats["aborted"],
+            "peak_mb": _stats["peak_mb"],
+            "stages": {k: dict(v) for k, v in _stats["stages"].items()},
+            "last_request": dict(_stats["last_request"]),
+        }
+    return out
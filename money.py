@@ -0,0 +1,78 @@
+"""
+Money as exact integer paise.
+
+Amounts are parsed from statement text straight into int64 paise (1/100
+rupee) and stay integers through reconciliation, aggregation, the result
+store and the exports, so sums are exact whatever the size of a ledger and
+balances can be compared for equality. Rupees appear only at the edges:
+rupees()/to_rupees() for the dashboard, JSON and spreadsheets, the rupee
+thresholds of the rule table, and decimal_array() for Parquet, which
+stores the paise themselves as decimal(18, 2).
+"""
+import numpy as np
+
+PAISE_PER_RUPEE = 100
+# Parquet/Arrow decimal precision and scale of exported amounts
+DECIMAL_PRECISION = 18
+DECIMAL_SCALE = 2
+
+
+def parse_paise(text: str) -> int:
+    """
+    Paise of a plain decimal rupee string such as "-1234.5"; ValueError if
+    it is not one. Digits past the second decimal round half away from zero.
+    """
+    s = text.strip()
+    whole, _, frac = s.partition(".")
+    if len(frac) == 2 and (whole + frac).lstrip("+-").isdecimal():
+        # The usual two-decimal amount: its digits are the paise
+        return int(whole + frac)
+    sign = 1
+    if s.startswith("-"):
+        sign, s = -1, s[1:]
+    elif s.startswith("+"):
+        s = s[1:]
+    whole, _, frac = s.partition(".")
+    if not (whole + frac).isdecimal():
+        raise ValueError(f"not an amount: {text!r}")
+    paise = int(whole or 0) * PAISE_PER_RUPEE + int((frac + "00")[:2])
+    if len(frac) > 2 and int(frac[2]) >= 5:
+        paise += 1
+    return sign * paise
+
+
+def from_rupees(values) -> np.ndarray:
+    """int64 paise of rupee amounts given as numbers (NaN counts as 0)."""
+    rupees = np.asarray(values, dtype=float)
+    return np.nan_to_num(np.round(rupees * PAISE_PER_RUPEE)).astype(np.int64)
+
+
+def rupees(paise) -> float:
+    """Rupee value of an amount in paise, for display."""
+    return float(paise) / PAISE_PER_RUPEE
+
+
+def to_rupees(paise):
+    """
+    Rupee values of paise (an array or Series) as floats. Each is the
+    double nearest to the exact amount, so it prints back exactly with two
+    decimals.
+    """
+    return paise / PAISE_PER_RUPEE
+
+
+def decimal_array(paise):
+    """
+    pyarrow decimal128(DECIMAL_PRECISION, DECIMAL_SCALE) array of paise. A
+    decimal's unscaled value at scale 2 is the amount in paise, so the
+    int64s become the low words of the 128-bit values as they are.
+    """
+    import pyarrow as pa
+
+    paise = np.asarray(paise, dtype=np.int64)
+    words = np.empty((len(paise), 2), dtype=np.int64)
+    words[:, 0] = paise
+    words[:, 1] = paise >> 63
+    return pa.Array.from_buffers(
+        pa.decimal128(DECIMAL_PRECISION, DECIMAL_SCALE), len(paise), [None, pa.py_buffer(words)],
+    )
@@ -0,0 +1,321 @@
+"""
+Online learning from user category corrections.
+
+Corrections posted from the dashboard are appended to FEEDBACK_PATH (same
+``text,category`` layout as data/training_data.csv). Once enough of them are
+pending, a background thread folds them into a HashingVectorizer +
+SGDClassifier pipeline with ``partial_fit`` and atomically replaces
+ONLINE_MODEL_PATH. Every worker polls that file's mtime and swaps the new
+model in, so no full retrain or restart is needed.
+
+The online pipeline starts as a copy of the base model: it is fitted to the
+base model's own predictions on the training texts, so it only departs from
+the base model where corrections taught it to. When the base model is
+retrained, the online one is rebuilt from it and every correction replayed.
+"""
+import copy
+import csv
+import fcntl
+import io
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+FEEDBACK_PATH = "data/feedback.csv"
+FEEDBACK_LOCK_PATH = "data/feedback.lock"
+TRAIN_LOCK_PATH = "data/online_train.lock"
+ONLINE_MODEL_PATH = "model/online_model.pkl"
+BASE_MODEL_PATH = "model/expense_model.pkl"
+CATEGORIES_PATH = "model/categories.json"
+TRAINING_DATA_PATH = "data/training_data.csv"
+
+# Pending corrections needed before a background update is started
+UPDATE_THRESHOLD = int(os.environ.get("ONLINE_UPDATE_THRESHOLD", 16))
+MINI_BATCH_SIZE = 64
+# Passes over each batch of corrections, so a handful of rows can outweigh
+# what the model learnt from the bootstrap data
+CORRECTION_EPOCHS = 5
+BOOTSTRAP_EPOCHS = 5
+# Seconds between mtime checks for a model written by another worker
+RELOAD_INTERVAL = 2.0
+MAX_DESCRIPTION_LENGTH = 500
+
+log = logging.getLogger(__name__)
+
+
+def make_hashing_pipeline():
+    """Stateless hashed features + a linear model that supports partial_fit."""
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.pipeline import Pipeline
+
+    return Pipeline([
+        ("hashing", HashingVectorizer(
+            ngram_range=(1, 2),
+            analyzer="word",
+            lowercase=True,
+            n_features=2 ** 18,
+            alternate_sign=False,
+        )),
+        ("clf", SGDClassifier(
+            loss="log_loss",
+            alpha=1e-5,
+            random_state=42,
+        )),
+    ])
+
+
+def partial_fit_batches(pipeline, texts, labels, classes, batch_size=MINI_BATCH_SIZE):
+    """Run partial_fit over (texts, labels) in slices of batch_size."""
+    vectorizer = pipeline.named_steps["hashing"]
+    clf = pipeline.named_steps["clf"]
+    for start in range(0, len(texts), batch_size):
+        X = vectorizer.transform(texts[start:start + batch_size])
+        clf.partial_fit(X, labels[start:start + batch_size], classes=classes)
+
+
+def known_categories() -> list:
+    """Categories a correction may target: the trained classes plus Others."""
+    try:
+        with open(CATEGORIES_PATH, encoding="utf-8") as f:
+            categories = list(json.load(f))
+    except (OSError, ValueError):
+        categories = []
+    if "Others" not in categories:
+        categories.append("Others")
+    return categories
+
+
+@contextmanager
+def _file_lock(path, blocking=True):
+    """Exclusive flock on path, shared by every worker on the host.
+
+    Yields False instead of waiting when blocking is off and the lock is held.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(f, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# ──────────────────────────────────────────────────────────
+# Feedback store
+# ──────────────────────────────────────────────────────────
+def record_corrections(corrections) -> int:
+    """
+    Append valid (description, category) pairs to the feedback store and
+    schedule a model update. Returns the number of pairs accepted.
+    """
+    allowed = set(known_categories())
+    rows = []
+    for description, category in corrections:
+        text = str(description or "").replace("\n", " ").strip()[:MAX_DESCRIPTION_LENGTH]
+        if text and category in allowed:
+            rows.append((text, category))
+    if not rows:
+        return 0
+
+    with _file_lock(FEEDBACK_LOCK_PATH):
+        new_file = not os.path.exists(FEEDBACK_PATH)
+        with open(FEEDBACK_PATH, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["text", "category"])
+            writer.writerows(rows)
+
+    _schedule_update()
+    return len(rows)
+
+
+def _read_feedback(offset):
+    """Return (texts, labels, end_offset) for rows written after byte offset."""
+    with _file_lock(FEEDBACK_LOCK_PATH):
+        try:
+            with open(FEEDBACK_PATH, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except OSError:
+            return [], [], offset
+
+    texts, labels = [], []
+    reader = csv.reader(io.StringIO(data.decode("utf-8")))
+    for row in reader:
+        if len(row) != 2 or row == ["text", "category"]:
+            continue
+        texts.append(row[0])
+        labels.append(row[1])
+    return texts, labels, offset + len(data)
+
+
+# ──────────────────────────────────────────────────────────
+# Incremental training
+# ──────────────────────────────────────────────────────────
+def _base_version():
+    """Identity (file mtime) of the base model on disk, or None."""
+    try:
+        return os.stat(BASE_MODEL_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _initial_state(classes):
+    """
+    Starting point for the online model, with no corrections learnt yet: a
+    copy of the base model when it is already a hashed partial_fit pipeline,
+    otherwise a fresh pipeline fitted over a few passes to what the base
+    model predicts for the training texts. The synthetic labels are used only
+    when there is no base model to ask.
+    """
+    state = {"offset": 0, "version": 0, "rows": 0, "base": _base_version()}
+    try:
+        with open(BASE_MODEL_PATH, "rb") as f:
+            base = pickle.load(f)
+    except Exception:
+        base = None
+    if base is not None and "hashing" in base.named_steps:
+        state["pipeline"] = copy.deepcopy(base)
+        return state
+
+    pipeline = make_hashing_pipeline()
+    if not os.path.exists(TRAINING_DATA_PATH):
+        import train
+        train.build_training_dataset()
+    with open(TRAINING_DATA_PATH, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    texts = [r["text"] for r in rows]
+    labels = [r["category"] for r in rows]
+    if base is not None and texts:
+        labels = [str(label) for label in base.predict(texts)]
+    pairs = [(t, c) for t, c in zip(texts, labels) if c in classes]
+    if pairs:
+        texts, labels = map(list, zip(*pairs))
+        for _ in range(BOOTSTRAP_EPOCHS):
+            partial_fit_batches(pipeline, texts, labels, classes)
+    state["pipeline"] = pipeline
+    return state
+
+
+def _load_state():
+    try:
+        with open(ONLINE_MODEL_PATH, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+
+def _save_state(state):
+    """Write the state next to ONLINE_MODEL_PATH and rename it into place."""
+    directory = os.path.dirname(ONLINE_MODEL_PATH)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, ONLINE_MODEL_PATH)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def apply_pending(force=False) -> int:
+    """
+    Fold pending corrections into the online model.
+
+    Only one worker on the host trains at a time; others return 0 right away.
+    Unless force is set, nothing happens until UPDATE_THRESHOLD corrections
+    are pending. A model built from an older base model is discarded and all
+    corrections are learnt again on top of the current one. Returns the
+    number of corrections learnt.
+    """
+    with _file_lock(TRAIN_LOCK_PATH, blocking=False) as acquired:
+        if not acquired:
+            return 0
+
+        classes = known_categories()
+        state = _load_state()
+        if state is None or state.get("base") != _base_version():
+            state = _initial_state(classes)
+        texts, labels, end = _read_feedback(state["offset"])
+        if not texts or (len(texts) < UPDATE_THRESHOLD and not force):
+            return 0
+
+        pipeline = state["pipeline"]
+        clf_classes = list(pipeline.named_steps["clf"].classes_)
+        keep = [i for i, label in enumerate(labels) if label in clf_classes]
+        if len(keep) < len(labels):
+            unknown = sorted(set(labels) - set(clf_classes))
+            log.warning("Skipping %d corrections to categories the online model lacks: %s",
+                        len(labels) - len(keep), ", ".join(unknown))
+        texts = [texts[i] for i in keep]
+        labels = [labels[i] for i in keep]
+        for _ in range(CORRECTION_EPOCHS):
+            partial_fit_batches(pipeline, texts, labels, clf_classes)
+
+        state.update(offset=end, version=state["version"] + 1,
+                     rows=state["rows"] + len(texts))
+        _save_state(state)
+        return len(texts)
+
+
+_update_thread = None
+
+
+def _schedule_update():
+    """Start a background update in this process unless one is running."""
+    global _update_thread
+    if _update_thread is not None and _update_thread.is_alive():
+        return
+    _update_thread = threading.Thread(target=apply_pending, daemon=True)
+    _update_thread.start()
+
+
+# ──────────────────────────────────────────────────────────
+# Hot-swapped model for prediction
+# ──────────────────────────────────────────────────────────
+_state = None
+_state_mtime = None
+_last_check = 0.0
+
+
+def current_model():
+    """
+    Return the newest online pipeline, or None if none has been trained.
+
+    The file is re-read when its mtime changes (checked at most every
+    RELOAD_INTERVAL seconds); the swap is a single reference assignment, so
+    concurrent callers see either the old or the new model, never a mix.
+    """
+    global _state, _state_mtime, _last_check
+    now = time.monotonic()
+    if now - _last_check >= RELOAD_INTERVAL:
+        _last_check = now
+        try:
+            mtime = os.stat(ONLINE_MODEL_PATH).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != _state_mtime:
+            _state = _load_state() if mtime is not None else None
+            _state_mtime = mtime
+    return _state["pipeline"] if _state else None
+
+
+def model_version():
+    """Identity (file mtime) of the model current_model() last returned, or None."""
+    return _state_mtime if _state else None
+
+
+if __name__ == "__main__":
+    print(f"Learnt {apply_pending(force=True)} pending corrections into {ONLINE_MODEL_PATH}")
@@ -0,0 +1,196 @@
+"""
+Sharded multi-process categorisation for very large ledgers.
+
+Above PARALLEL_MIN_ROWS rows, descriptions and amounts are split into shards
+and categorised on a persistent process pool. Each worker imports the
+engine module once (loading the model and compiled rule table, but not
+Flask) and is then reused.
+Shards travel as compact columnar buffers: UTF-8 bytes plus int64 offsets
+for strings, raw float64 for amounts, and int16 codes into a small
+vocabulary for categories. This avoids pickling DataFrames or per-row
+Python objects. Results come back in shard order and are concatenated.
+Workers use the same host-wide categorisation cache (sharedcache.py) as
+the web workers, and send their rule hit counters back with each shard so
+/metrics counts every row.
+
+Every gunicorn worker owns a pool, so by default each pool gets an equal
+share of the cores (WEB_CONCURRENCY, exported by gunicorn.conf.py). If a
+pool worker dies (OOM kill, crash), the pool is discarded and the ledger
+is categorised in process; the next large ledger starts a fresh pool.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+PARALLEL_MIN_ROWS = int(os.environ.get("PARALLEL_MIN_ROWS", 200_000))
+# Web worker processes on this host, each with its own pool
+WEB_WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+CATEGORIZE_WORKERS = int(os.environ.get(
+    "CATEGORIZE_WORKERS", max(1, (os.cpu_count() or 1) // WEB_WORKERS)
+))
+SHARD_ROWS = int(os.environ.get("PARALLEL_SHARD_ROWS", 50_000))
+
+_pool = None
+_pool_pid = None
+
+
+# ──────────────────────────────────────────────────────────
+# Columnar string buffers
+# ──────────────────────────────────────────────────────────
+def encode_strings(strings) -> tuple:
+    """Pack strings into (utf8_blob, int64 end offsets)."""
+    encoded = [s.encode("utf-8") for s in strings]
+    ends = np.cumsum(np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded)))
+    return b"".join(encoded), ends
+
+
+def decode_strings(blob: bytes, ends: np.ndarray) -> list:
+    """Inverse of encode_strings."""
+    starts = np.concatenate(([0], ends[:-1])) if len(ends) else ends
+    return [blob[s:e].decode("utf-8") for s, e in zip(starts.tolist(), ends.tolist())]
+
+
+def extract_merchants(descriptions, extract, shared=None) -> list:
+    """
+    Apply extract(description) once per distinct description. shared, if
+    given, is consulted first (lookup_merchants/store_merchants, keyed by
+    the stripped description) and receives the newly extracted merchants.
+    """
+    cache = {}
+    if shared is not None:
+        keys = {}
+        for desc in descriptions:
+            keys.setdefault(desc, str(desc).strip())
+        found = shared.lookup_merchants(list(keys.values()))
+        missing = []
+        for (desc, text), merchant in zip(keys.items(), found):
+            if merchant is None:
+                merchant = extract(desc)
+                missing.append((text, merchant))
+            cache[desc] = merchant
+        if missing:
+            shared.store_merchants(*zip(*missing))
+    out = []
+    for desc in descriptions:
+        merchant = cache.get(desc)
+        if merchant is None:
+            merchant = cache[desc] = extract(desc)
+        out.append(merchant)
+    return out
+
+
+# ──────────────────────────────────────────────────────────
+# Worker side
+# ──────────────────────────────────────────────────────────
+_engine = None
+
+
+def _init_worker():
+    """Load the categorisation engine (rules + model) once per worker."""
+    global _engine
+    import engine
+
+    engine._get_model()
+    _engine = engine
+
+
+def _categorize_shard(desc_blob, desc_ends, amount_bytes):
+    descs = decode_strings(desc_blob, np.frombuffer(desc_ends, dtype=np.int64))
+    amounts = np.frombuffer(amount_bytes, dtype=np.float64)
+
+    categories = _engine.categorize_many(descs, amounts)
+    vocab, codes = np.unique(categories.astype(str), return_inverse=True)
+
+    merchant_blob, merchant_ends = encode_strings(
+        extract_merchants(descs, _engine.extract_merchant, _engine.cache_view())
+    )
+    return (
+        vocab.tolist(), codes.astype(np.int16).tobytes(), merchant_blob, merchant_ends.tobytes(),
+        _engine.RULES.take_counters(),
+    )
+
+
+# ──────────────────────────────────────────────────────────
+# Parent side
+# ──────────────────────────────────────────────────────────
+def _get_pool():
+    """Persistent pool, recreated if this process was forked from its owner."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        # forkserver children start from a clean interpreter, which is safe
+        # even when the calling worker has background threads
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(
+            max_workers=CATEGORIZE_WORKERS,
+            mp_context=multiprocessing.get_context(method),
+            initializer=_init_worker,
+        )
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def _discard_pool():
+    """Drop a broken pool without waiting for it; _get_pool() starts a new one."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+
+
+def categorize_frame(descriptions, amounts, categorize, extract_merchant, shared=None, rules=None):
+    """
+    Return (categories, merchants) arrays for the given rows.
+
+    categorize(descriptions, amounts) and extract_merchant(description) are
+    the in-process implementations, used directly for ledgers below
+    PARALLEL_MIN_ROWS or when only one worker is configured, with shared
+    as the merchant cache (see extract_merchants). Larger inputs are
+    sharded across the process pool, whose workers open the cache
+    themselves; their rule hit counters are added to rules (a
+    rules.RuleEngine) when given.
+    """
+    descriptions = list(descriptions)
+    amounts = np.ascontiguousarray(amounts, dtype=np.float64)
+    n = len(descriptions)
+
+    if n >= PARALLEL_MIN_ROWS and CATEGORIZE_WORKERS > 1:
+        try:
+            return _categorize_pooled(descriptions, amounts, rules)
+        except BrokenProcessPool:
+            # A pool worker died; this ledger is redone in process
+            _discard_pool()
+
+    categories = categorize(descriptions, amounts)
+    merchants = np.array(extract_merchants(descriptions, extract_merchant, shared), dtype=object)
+    return categories, merchants
+
+
+def _categorize_pooled(descriptions, amounts, rules):
+    n = len(descriptions)
+
+    shards = []
+    for start in range(0, n, SHARD_ROWS):
+        blob, ends = encode_strings(descriptions[start:start + SHARD_ROWS])
+        shards.append((blob, ends.tobytes(), amounts[start:start + SHARD_ROWS].tobytes()))
+
+    categories = np.empty(n, dtype=object)
+    merchants = np.empty(n, dtype=object)
+    pos = 0
+    counters = []
+    for vocab, codes, merchant_blob, merchant_ends, shard_counters in _get_pool().map(
+        _categorize_shard, *zip(*shards)
+    ):
+        codes = np.frombuffer(codes, dtype=np.int16)
+        size = len(codes)
+        categories[pos:pos + size] = np.array(vocab, dtype=object)[codes]
+        merchants[pos:pos + size] = decode_strings(merchant_blob, np.frombuffer(merchant_ends, dtype=np.int64))
+        pos += size
+        counters.append(shard_counters)
+    # Credited only once every shard is back, so a retried ledger counts once
+    if rules is not None:
+        for shard_counters in counters:
+            rules.add_counters(shard_counters)
+    return categories, merchants
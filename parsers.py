@@ -1,10 +1,18 @@
 import os
 import re
 import tempfile
+from bisect import bisect_right
+import numpy as np
 import pandas as pd
-import pdfplumber
-import pikepdf
-import docx
+
+import daterange
+import memguard
+import money
+import reconcile
+import txframe
+
+# pdfplumber, pikepdf and python-docx are imported inside the functions that
+# need them so a process that never sees a PDF or DOCX never pays for them.
 
 class PasswordRequired(Exception):
     pass
@@ -18,6 +26,16 @@ class UnsupportedFormat(Exception):
 class ParseError(Exception):
     pass
 
+class MemoryBudgetExceeded(ParseError):
+    """The worker grew past PROCESS_MEMORY_CAP_MB and the parse was abandoned (see memguard)."""
+    pass
+
+# Rows normalised between memory budget checks
+CHECK_EVERY_ROWS = 5000
+
+# Columns of the frames the parsers hand to _standardize
+STATEMENT_COLUMNS = ("Date", "Description", "Debit", "Credit", "Balance")
+
 # Column header lists for fuzzy matching
 DATE_HEADERS = ["date", "txn date", "transaction date", "value date", "posting date", "tran date"]
 DESC_HEADERS = ["narration", "description", "particulars", "details", "remarks", "transaction details", "particular"]
@@ -27,20 +45,26 @@ BALANCE_HEADERS = ["balance", "bal"]
 AMOUNT_HEADERS = ["amount", "amt", "value", "transaction amount"]
 TYPE_HEADERS = ["type", "dr/cr", "cr/dr", "d/c"]
 
+# clean_val() patterns, compiled once: it runs for every amount cell
+_CURRENCY_RE = re.compile(r"[₹$€£]")
+_DR_SUFFIX_RE = re.compile(r"\bDr\.?\s*$", re.IGNORECASE)
+_CR_SUFFIX_RE = re.compile(r"\bCr\.?\s*$", re.IGNORECASE)
+_NON_NUMERIC_RE = re.compile(r"[^\d.\-]")
+
 def clean_val(v):
     """
-    Clean raw string amount into numeric float value.
-    Returns: (float_value, is_dr, is_cr)
+    Clean raw string amount into exact integer paise (see money.py).
+    Returns: (paise, is_dr, is_cr)
     """
     if v is None:
-        return 0.0, False, False
+        return 0, False, False
     
     s = str(v).strip().replace(",", "")
     if s in ("", "-", "None", "nan", "NaN"):
-        return 0.0, False, False
+        return 0, False, False
     
     # Remove currency symbols
-    s = re.sub(r"[₹$€£]", "", s).strip()
+    s = _CURRENCY_RE.sub("", s).strip()
     
     # Check parenthesized negative amounts
     negative = False
@@ -49,24 +73,20 @@ def clean_val(v):
         s = s[1:-1].strip()
         
     # Check Dr/Cr suffix
-    is_dr = False
-    is_cr = False
-    if re.search(r"\bDr\.?\s*$", s, re.IGNORECASE):
-        is_dr = True
-        s = re.sub(r"\bDr\.?\s*$", "", s, flags=re.IGNORECASE).strip()
-    elif re.search(r"\bCr\.?\s*$", s, re.IGNORECASE):
-        is_cr = True
-        s = re.sub(r"\bCr\.?\s*$", "", s, flags=re.IGNORECASE).strip()
+    s, is_dr = _DR_SUFFIX_RE.subn("", s)
+    is_cr = 0
+    if not is_dr:
+        s, is_cr = _CR_SUFFIX_RE.subn("", s)
 
     # Extract numeric part
-    s = re.sub(r"[^\d.\-]", "", s)
+    s = _NON_NUMERIC_RE.sub("", s)
     try:
-        val = float(s)
+        val = money.parse_paise(s)
         if negative:
             val = -abs(val)
-        return val, is_dr, is_cr
+        return val, bool(is_dr), bool(is_cr)
     except ValueError:
-        return 0.0, False, False
+        return 0, False, False
 
 def find_columns(headers):
     """Fuzzy match list of headers to indices."""
@@ -94,6 +114,9 @@ def try_open_pdf(path, password=None):
     Test and open PDF using pikepdf for decryption and pdfplumber for layout extraction.
     Only prompts for password if it is actually user password protected (cannot open without password).
     """
+    import pdfplumber
+    import pikepdf
+
     try:
         # Try to open without a password first.
         # This succeeds for unencrypted PDFs or PDFs that are only owner-restricted (no user password required to open).
@@ -128,11 +151,173 @@ def try_open_pdf(path, password=None):
         except Exception:
             raise ParseError(f"Unable to read PDF file: {str(e)}")
 
-def parse_pdf_table(pdf):
+# Points of slack around a learnt table region when cropping later pages
+TABLE_CROP_MARGIN = 6.0
+# pdfplumber's default snap tolerance: rules this close are the same column
+TABLE_SNAP_TOLERANCE = 3.0
+
+def _find_header(rows, limit=10):
+    """(row index, column indices) of the first header row naming Date and Description."""
+    for idx in range(min(limit, len(rows))):
+        header_candidate = [str(x).lower() for x in rows[idx]]
+        cols = find_columns(header_candidate)
+        if cols[0] is not None and cols[1] is not None:
+            return idx, cols
+    return None, None
+
+def _table_text(table):
+    """
+    Same result as pdfplumber's Table.extract(), which tests every char
+    against every row and then every cell. Rows and cells of a grid do
+    not overlap, so each char is placed by bisection instead; tables with
+    overlapping rows or cells use Table.extract().
+    """
+    from pdfplumber.utils import extract_text
+
+    rows = table.rows
+    row_boxes = [row.bbox for row in rows]
+    if any(a[3] > b[1] for a, b in zip(row_boxes, row_boxes[1:])):
+        return table.extract()
+    row_tops = [box[1] for box in row_boxes]
+    cell_x0s = []
+    cell_slots = []
+    for row in rows:
+        placed = sorted((cell[0], j) for j, cell in enumerate(row.cells) if cell is not None)
+        for (_, a), (_, b) in zip(placed, placed[1:]):
+            if row.cells[a][2] > row.cells[b][0]:
+                return table.extract()
+        cell_x0s.append([x0 for x0, _ in placed])
+        cell_slots.append([j for _, j in placed])
+
+    buckets = [[[] for _ in row.cells] for row in rows]
+    for char in table.page.chars:
+        v_mid = (char["top"] + char["bottom"]) / 2
+        h_mid = (char["x0"] + char["x1"]) / 2
+        i = bisect_right(row_tops, v_mid) - 1
+        if i < 0:
+            continue
+        x0, top, x1, bottom = row_boxes[i]
+        if not (x0 <= h_mid < x1 and top <= v_mid < bottom):
+            continue
+        k = bisect_right(cell_x0s[i], h_mid) - 1
+        if k < 0:
+            continue
+        j = cell_slots[i][k]
+        x0, top, x1, bottom = rows[i].cells[j]
+        if x0 <= h_mid < x1 and top <= v_mid < bottom:
+            buckets[i][j].append(char)
+
+    return [
+        [
+            None if cell is None else (extract_text(chars) if chars else "")
+            for cell, chars in zip(row.cells, row_chars)
+        ]
+        for row, row_chars in zip(rows, buckets)
+    ]
+
+class _TableGeometry:
+    """
+    Column x-boundaries and vertical extent of a statement's transaction
+    table, learnt from a page where pdfplumber detected it with a matching
+    header. extract() reads a later page with those boundaries as explicit
+    vertical lines, cropped to the learnt region, so only the horizontal
+    rules are searched for; it returns None when the page does not fit
+    (vertical rules elsewhere, no table, another column count, or text
+    left over around the table).
+    """
+
+    def __init__(self, table):
+        self.xs = sorted({x for cell in table.cells for x in (cell[0], cell[2])})
+        self.top, self.bottom = table.bbox[1], table.bbox[3]
+        self.settings = {
+            "vertical_strategy": "explicit",
+            "explicit_vertical_lines": self.xs,
+            "horizontal_strategy": "lines",
+        }
+
+    def refit(self, table):
+        """Move the region to a fresh full detection with the same columns (first vs continuation pages)."""
+        if sorted({x for cell in table.cells for x in (cell[0], cell[2])}) == self.xs:
+            self.top, self.bottom = table.bbox[1], table.bbox[3]
+
+    def extract(self, page):
+        x0, top, x1, bottom = page.bbox
+        region = page.crop((
+            max(self.xs[0] - TABLE_CROP_MARGIN, x0),
+            max(self.top - TABLE_CROP_MARGIN, top),
+            min(self.xs[-1] + TABLE_CROP_MARGIN, x1),
+            min(self.bottom + TABLE_CROP_MARGIN, bottom),
+        ))
+        # Every vertical rule on the page must be one of the learnt columns
+        for edge in region.vertical_edges:
+            x = edge["x0"]
+            k = bisect_right(self.xs, x)
+            if min(abs(x - c) for c in self.xs[max(k - 1, 0):k + 1]) > TABLE_SNAP_TOLERANCE:
+                return None
+        table = region.find_table(self.settings)
+        if table is None:
+            return None
+        rows = _table_text(table)
+        if not rows or len(rows[0]) != len(self.xs) - 1:
+            return None
+        # Text above or below the rows means the table runs past the
+        # learnt region or the layout changed
+        t_top, t_bottom = table.bbox[1], table.bbox[3]
+        for char in region.chars:
+            if char["bottom"] <= t_top or char["top"] >= t_bottom:
+                return None
+        return rows
+
+TABLE_DATE_RE = re.compile(
+    r"\d{1,4}[-/\s.]\d{1,4}[-/\s.]\d{2,4}|\d{1,2}[-/\s.](?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*[-/\s.]\d{2,4}",
+    re.IGNORECASE
+)
+
+def _page_tables(pdf, window=None):
+    """
+    Yield the transaction table of every page (of the pages that can hold
+    rows in window, see daterange.read_pages, with dates from the table's
+    Date column or, lacking one, from the page text). The first table with a
+    recognisable header fixes the geometry used for the following pages;
+    pages that do not fit it get full detection, and the region moves to
+    where that found the table.
+    """
+    geometry = None
+    date_col = None
+
+    def read(page):
+        nonlocal geometry
+        memguard.check()
+        table = geometry.extract(page) if geometry is not None else None
+        if table is None:
+            found = page.find_table()
+            table = _table_text(found) if found is not None else None
+            if table:
+                if geometry is not None:
+                    geometry.refit(found)
+                elif _find_header(table)[0] is not None:
+                    geometry = _TableGeometry(found)
+        return page, table
+
+    def dates(read_page):
+        nonlocal date_col
+        page, table = read_page
+        if table and date_col is None:
+            date_col = _find_header(table)[1]
+            date_col = date_col[0] if date_col else None
+        if not table or date_col is None:
+            # pdfplumber keeps the parsed page, so this costs little more
+            return _text_dates(page.extract_text() or "")
+        cells = (str(r[date_col]).strip() for r in table if date_col < len(r) and r[date_col])
+        return [c for c in cells if TABLE_DATE_RE.search(c)]
+
+    for _, table in daterange.read_pages(pdf.pages, read, dates, window):
+        yield table
+
+def parse_pdf_table(pdf, window=None):
     """Parse table-based PDF pages using pdfplumber."""
     rows = []
-    for page in pdf.pages:
-        table = page.extract_table()
+    for table in _page_tables(pdf, window):
         if table:
             table = [[str(c) if c is not None else "" for c in r] for r in table]
             rows.extend(table)
@@ -140,17 +325,8 @@ def parse_pdf_table(pdf):
     if not rows:
         return None
         
-    header_row_idx = None
-    cols = None
-    
     # Scan first 10 rows for columns headers
-    for idx in range(min(10, len(rows))):
-        header_candidate = [str(x).lower() for x in rows[idx]]
-        idx_date, idx_desc, idx_debit, idx_credit, idx_amount, idx_type, idx_balance = find_columns(header_candidate)
-        if idx_date is not None and idx_desc is not None:
-            header_row_idx = idx
-            cols = (idx_date, idx_desc, idx_debit, idx_credit, idx_amount, idx_type, idx_balance)
-            break
+    header_row_idx, cols = _find_header(rows)
             
     if header_row_idx is None:
         header_candidate = [str(x).lower() for x in rows[0]]
@@ -159,13 +335,9 @@ def parse_pdf_table(pdf):
         cols = (idx_date, idx_desc, idx_debit, idx_credit, idx_amount, idx_type, idx_balance)
         
     idx_date, idx_desc, idx_debit, idx_credit, idx_amount, idx_type, idx_balance = cols
-    final_transactions = []
+    final_transactions = daterange.Rows(window)
     current_tx = None
-    
-    date_pat = re.compile(
-        r"\d{1,4}[-/\s.]\d{1,4}[-/\s.]\d{2,4}|\d{1,2}[-/\s.](?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*[-/\s.]\d{2,4}", 
-        re.IGNORECASE
-    )
+    date_pat = TABLE_DATE_RE
 
     for i in range(header_row_idx + 1, len(rows)):
         row = rows[i]
@@ -175,9 +347,9 @@ def parse_pdf_table(pdf):
         raw_date = row[idx_date] if idx_date is not None else ""
         raw_desc = row[idx_desc] if idx_desc is not None else ""
         
-        debit_val = 0.0
-        credit_val = 0.0
-        balance_val = 0.0
+        debit_val = 0
+        credit_val = 0
+        balance_val = 0
         
         if idx_debit is not None and idx_debit < len(row):
             debit_val, _, _ = clean_val(row[idx_debit])
@@ -210,6 +382,9 @@ def parse_pdf_table(pdf):
         if is_new_tx:
             if current_tx:
                 final_transactions.append(current_tx)
+                if final_transactions.done:
+                    current_tx = None
+                    break
             current_tx = {
                 "Date": clean_date_str,
                 "Description": raw_desc.replace("\n", " ").strip(),
@@ -220,86 +395,168 @@ def parse_pdf_table(pdf):
         else:
             if current_tx and raw_desc.strip():
                 current_tx["Description"] += " " + raw_desc.replace("\n", " ").strip()
-                if current_tx["Debit"] == 0.0 and debit_val != 0.0:
+                if current_tx["Debit"] == 0 and debit_val != 0:
                     current_tx["Debit"] = debit_val
-                if current_tx["Credit"] == 0.0 and credit_val != 0.0:
+                if current_tx["Credit"] == 0 and credit_val != 0:
                     current_tx["Credit"] = credit_val
-                if current_tx["Balance"] == 0.0 and balance_val != 0.0:
+                if current_tx["Balance"] == 0 and balance_val != 0:
                     current_tx["Balance"] = balance_val
 
     if current_tx:
         final_transactions.append(current_tx)
         
-    if not final_transactions:
+    if not final_transactions.seen:
         return None
         
-    return pd.DataFrame(final_transactions)
+    return final_transactions.frame(STATEMENT_COLUMNS)
 
-def parse_pdf_text(pdf):
-    """Parse text-based PDF line by line as fallback."""
-    data = []
-    date_pat = re.compile(
-        r"^(\d{1,2}[-/\s.]\d{1,2}[-/\s.]\d{2,4}|\d{1,2}[-/\s.](?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*[-/\s.]\d{2,4})",
-        re.IGNORECASE
+# Text-layout statement lines: a transaction line starts with a date and
+# carries at least one amount; other lines continue the previous narration
+TEXT_DATE_RE = re.compile(
+    r"^(\d{1,2}[-/\s.]\d{1,2}[-/\s.]\d{2,4}|\d{1,2}[-/\s.](?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*[-/\s.]\d{2,4})",
+    re.IGNORECASE
+)
+TEXT_AMOUNT_RE = re.compile(r"\b\d{1,3}(?:,\d{3})*\.\d{2}\b")
+_TEXT_AMOUNT_SPLIT_RE = re.compile(r"\b(\d{1,3}(?:,\d{3})*\.\d{2})\b")
+# Continuation lines containing these (lower-cased) are page furniture
+TEXT_NOISE_WORDS = ("page", "statement", "date", "balance", "total")
+def _amount_flags(line, a):
+    """(value, is_dr, is_cr) of amount a, with a Cr/Dr suffix after its first occurrence."""
+    v, dr_flag, cr_flag = clean_val(a)
+    idx = line.find(a)
+    if idx != -1:
+        suffix = line[idx + len(a):idx + len(a) + 3].lower()
+        if "cr" in suffix:
+            cr_flag = True
+        elif "dr" in suffix:
+            dr_flag = True
+    return v, dr_flag, cr_flag
+
+def _tokenize_line_slow(line, date_str, amounts):
+    """Reference tokenizer: str.replace of the date and every amount, everywhere."""
+    amt_details = [_amount_flags(line, a) for a in amounts]
+    desc = line.replace(date_str, "")
+    for a in amounts:
+        desc = desc.replace(a, "")
+    return amt_details, " ".join(desc.split())
+
+def tokenize_line(line):
+    """
+    Split a stripped statement line into (date, amounts, description), or
+    return None when it is not a transaction line. amounts holds
+    (value, is_dr, is_cr) per amount, in order.
+
+    The description is defined as the line with the date and every amount
+    text removed wherever they occur. One re.split of the text after the
+    date yields the description pieces and the amounts together; lines
+    where a token's text also occurs elsewhere, or where removing it could
+    splice digits into a new amount, go through _tokenize_line_slow.
+    """
+    date_match = TEXT_DATE_RE.match(line)
+    if date_match is None:
+        return None
+    date_str = date_match.group(1)
+    rest = line[date_match.end():]
+
+    # With whitespace after the date no amount can straddle it, so the
+    # line's amounts are those inside the date (01.02 of 01.02.2023)
+    # followed by those of the rest
+    if not rest[:1].isspace():
+        amounts = TEXT_AMOUNT_RE.findall(line)
+        if not amounts:
+            return None
+        amt_details, desc = _tokenize_line_slow(line, date_str, amounts)
+        return date_str, amt_details, desc
+    parts = _TEXT_AMOUNT_SPLIT_RE.split(rest)
+    amounts = parts[1::2]
+    if "." in date_str:
+        amounts = TEXT_AMOUNT_RE.findall(date_str) + amounts
+    if not amounts:
+        return None
+
+    # A "," or "." beside an amount could splice into a new amount once
+    # the amount is removed (amounts never touch digits, by \b)
+    pieces = parts[0::2]
+    joined = "\0".join(pieces)
+    simple = (
+        line.count(date_str) == 1
+        and "\0" not in rest
+        and ",\0" not in joined and ".\0" not in joined
+        and "\0," not in joined and "\0." not in joined
     )
-    amt_pat = re.compile(r"\b\d{1,3}(?:,\d{3})*\.\d{2}\b")
+    if simple:
+        after = parts[1::2]
+        for a in amounts:
+            if rest.count(a) != after.count(a):
+                simple = False
+                break
+    if not simple:
+        amt_details, desc = _tokenize_line_slow(line, date_str, amounts)
+        return date_str, amt_details, desc
+
+    # Cr/Dr suffix after the first occurrence of each amount text
+    amt_details = []
+    for a in amounts:
+        idx = line.find(a) + len(a)
+        suffix = line[idx:idx + 3].lower()
+        cr_flag = "cr" in suffix
+        # TEXT_AMOUNT_RE amounts have exactly two decimals: the digits are the paise
+        amt_details.append((int(a.replace(",", "").replace(".", "")), not cr_flag and "dr" in suffix, cr_flag))
+    return date_str, amt_details, " ".join(joined.replace("\0", "").split())
+
+def text_transactions(lines, window=None):
+    """
+    Group text lines into raw transactions: dicts of Date, Description,
+    amt_details (only those kept by daterange.Rows for window).
+    """
+    raw_lines = daterange.Rows(window)
     current_tx = None
-    raw_lines = []
-    
-    for page in pdf.pages:
-        text = page.extract_text()
-        if not text:
+    for line in lines:
+        line = line.strip()
+        if not line:
             continue
-            
-        for line in text.split("\n"):
-            line = line.strip()
-            if not line:
-                continue
-                
-            date_match = date_pat.search(line)
-            amounts = amt_pat.findall(line)
-            
-            if date_match and amounts:
-                if current_tx:
-                    raw_lines.append(current_tx)
-                    
-                date_str = date_match.group(1)
-                
-                # Extract details for each amount
-                amt_details = []
-                for a in amounts:
-                    v, dr_flag, cr_flag = clean_val(a)
-                    # Suffix check
-                    idx = line.find(a)
-                    if idx != -1:
-                        suffix = line[idx + len(a):idx + len(a) + 3].lower()
-                        if "cr" in suffix:
-                            cr_flag = True
-                        elif "dr" in suffix:
-                            dr_flag = True
-                    amt_details.append((v, dr_flag, cr_flag))
-                    
-                # Clean description
-                desc = line
-                desc = desc.replace(date_str, "")
-                for a in amounts:
-                    desc = desc.replace(a, "")
-                desc = re.sub(r"\s+", " ", desc).strip()
-                
-                current_tx = {
-                    "Date": date_str,
-                    "Description": desc,
-                    "amt_details": amt_details
-                }
-            else:
-                if current_tx:
-                    if not any(k in line.lower() for k in ("page", "statement", "date", "balance", "total")):
-                        current_tx["Description"] += " " + line
-                        
+
+        tokens = tokenize_line(line)
+        if tokens is not None:
+            if current_tx:
+                raw_lines.append(current_tx)
+                if raw_lines.done:
+                    current_tx = None
+                    break
+            date_str, amt_details, desc = tokens
+            current_tx = {
+                "Date": date_str,
+                "Description": desc,
+                "amt_details": amt_details
+            }
+        elif current_tx:
+            lowered = line.lower()
+            if not any(k in lowered for k in TEXT_NOISE_WORDS):
+                current_tx["Description"] += " " + line
+
     if current_tx:
         raw_lines.append(current_tx)
-        
-    if not raw_lines:
+    return raw_lines
+
+def _text_dates(text):
+    """Transaction date strings of a page's text, in order."""
+    tokens = map(tokenize_line, (line.strip() for line in text.split("\n")))
+    return [t[0] for t in tokens if t is not None]
+
+def _page_lines(pdf, window=None):
+    def read(page):
+        memguard.check()
+        return page.extract_text() or ""
+
+    for text in daterange.read_pages(pdf.pages, read, _text_dates, window):
+        if text:
+            yield from text.split("\n")
+
+def parse_pdf_text(pdf, window=None):
+    """Parse text-based PDF line by line as fallback."""
+    raw_lines = text_transactions(_page_lines(pdf, window), window)
+
+    if not raw_lines.seen:
         return None
         
     # Resolve type and amounts for each transaction
@@ -313,9 +570,9 @@ def parse_pdf_text(pdf):
         if "credit card" in desc_lower or "cc payment" in desc_lower:
             is_credit_desc = False
             
-        debit_val = 0.0
-        credit_val = 0.0
-        balance_val = 0.0
+        debit_val = 0
+        credit_val = 0
+        balance_val = 0
         
         if len(amt_details) == 1:
             v, dr_flag, cr_flag = amt_details[0]
@@ -350,55 +607,27 @@ def parse_pdf_text(pdf):
                     credit_val = tx2_val
             balance_val = bal_val
             
-        processed_txs.append({
+        processed = {
             "Date": tx["Date"],
             "Description": tx["Description"],
             "Debit": debit_val,
             "Credit": credit_val,
             "Balance": balance_val,
-            "TxAmt": amt_details[0][0] if amt_details else 0.0
-        })
+            "TxAmt": amt_details[0][0] if amt_details else 0
+        }
+        if "InRange" in tx:
+            processed["InRange"] = tx["InRange"]
+        processed_txs.append(processed)
         
-    # Refine Debit/Credit using balance differences if possible
-    is_reverse = False
-    if len(processed_txs) >= 2:
-        try:
-            d1 = pd.to_datetime(processed_txs[0]["Date"], errors="coerce", dayfirst=True)
-            dn = pd.to_datetime(processed_txs[-1]["Date"], errors="coerce", dayfirst=True)
-            if pd.notna(d1) and pd.notna(dn) and d1 > dn:
-                is_reverse = True
-        except Exception:
-            pass
-            
-    if is_reverse:
-        processed_txs.reverse()
-        
-    for i in range(1, len(processed_txs)):
-        prev_bal = processed_txs[i-1]["Balance"]
-        curr_bal = processed_txs[i]["Balance"]
-        tx_amt = processed_txs[i]["TxAmt"]
-        
-        # Only verify if both balances are non-zero
-        if prev_bal > 0.05 and curr_bal > 0.05:
-            diff = curr_bal - prev_bal
-            if diff > 0.05:
-                processed_txs[i]["Credit"] = tx_amt
-                processed_txs[i]["Debit"] = 0.0
-            elif diff < -0.05:
-                processed_txs[i]["Debit"] = tx_amt
-                processed_txs[i]["Credit"] = 0.0
-                
-    if is_reverse:
-        processed_txs.reverse()
-        
-    # Remove temp TxAmt key
-    for tx in processed_txs:
-        tx.pop("TxAmt", None)
-        
-    return pd.DataFrame(processed_txs)
+    # TxAmt (the first amount on the line) is kept for reconcile(), which
+    # settles the direction from balance differences in parse_statement
+    return pd.DataFrame(processed_txs) if processed_txs else pd.DataFrame(columns=STATEMENT_COLUMNS + ("TxAmt",))
 
-def process_dataframe(df):
-    """Normalize raw pandas DataFrame parsed from CSV, Excel, or DOCX."""
+def process_dataframe(df, window=None):
+    """
+    Normalize raw pandas DataFrame parsed from CSV, Excel, or DOCX, keeping
+    only the transactions daterange.Rows keeps for window.
+    """
     rows = df.values.tolist()
     headers = [str(c).lower() for c in df.columns]
     idx_date, idx_desc, idx_debit, idx_credit, idx_amount, idx_type, idx_balance = find_columns(headers)
@@ -422,7 +651,7 @@ def process_dataframe(df):
         raise ParseError("Could not find Date and Description columns in the statement structure")
         
     idx_date, idx_desc, idx_debit, idx_credit, idx_amount, idx_type, idx_balance = cols
-    final_transactions = []
+    final_transactions = daterange.Rows(window)
     start_row = header_row_idx + 1 if header_row_idx != -1 else 0
     
     date_pat = re.compile(
@@ -432,6 +661,8 @@ def process_dataframe(df):
     current_tx = None
     
     for i in range(start_row, len(rows)):
+        if i % CHECK_EVERY_ROWS == 0:
+            memguard.check()
         row = rows[i]
         if len(row) <= max(idx_date or 0, idx_desc or 0):
             continue
@@ -439,9 +670,9 @@ def process_dataframe(df):
         raw_date = str(row[idx_date]) if row[idx_date] is not None and not pd.isna(row[idx_date]) else ""
         raw_desc = str(row[idx_desc]) if row[idx_desc] is not None and not pd.isna(row[idx_desc]) else ""
         
-        debit_val = 0.0
-        credit_val = 0.0
-        balance_val = 0.0
+        debit_val = 0
+        credit_val = 0
+        balance_val = 0
         
         if idx_debit is not None and idx_debit < len(row) and not pd.isna(row[idx_debit]):
             debit_val, _, _ = clean_val(row[idx_debit])
@@ -476,6 +707,9 @@ def process_dataframe(df):
         if is_new_tx:
             if current_tx:
                 final_transactions.append(current_tx)
+                if final_transactions.done:
+                    current_tx = None
+                    break
             current_tx = {
                 "Date": clean_date_str,
                 "Description": raw_desc.replace("\n", " ").strip(),
@@ -486,23 +720,34 @@ def process_dataframe(df):
         else:
             if current_tx and raw_desc.strip():
                 current_tx["Description"] += " " + raw_desc.replace("\n", " ").strip()
-                if current_tx["Debit"] == 0.0 and debit_val != 0.0:
+                if current_tx["Debit"] == 0 and debit_val != 0:
                     current_tx["Debit"] = debit_val
-                if current_tx["Credit"] == 0.0 and credit_val != 0.0:
+                if current_tx["Credit"] == 0 and credit_val != 0:
                     current_tx["Credit"] = credit_val
-                if current_tx["Balance"] == 0.0 and balance_val != 0.0:
+                if current_tx["Balance"] == 0 and balance_val != 0:
                     current_tx["Balance"] = balance_val
                     
     if current_tx:
         final_transactions.append(current_tx)
         
-    if not final_transactions:
+    if not final_transactions.seen:
         raise ParseError("No valid transactions found in statement data")
         
-    return pd.DataFrame(final_transactions)
+    return final_transactions.frame(STATEMENT_COLUMNS)
 
-def parse_csv(file_path):
+def parse_csv(file_path, window=None):
     """Parse CSV statements with dynamic separator detection."""
+    df = None
+    with memguard.stage("extract"):
+        df = _read_csv(file_path)
+
+    if df is None:
+        raise ParseError("Unable to read or decode CSV file")
+
+    with memguard.stage("normalize"):
+        return process_dataframe(df, window)
+
+def _read_csv(file_path):
     df = None
     for encoding in ("utf-8", "latin-1", "utf-16"):
         try:
@@ -517,55 +762,78 @@ def parse_csv(file_path):
                 break
         except Exception:
             continue
-            
-    if df is None:
-        raise ParseError("Unable to read or decode CSV file")
-        
-    return process_dataframe(df)
+    return df
 
-def parse_excel(file_path):
+def parse_excel(file_path, window=None):
     """Parse Excel sheets (.xlsx / .xls)."""
     try:
-        xl = pd.ExcelFile(file_path, engine="openpyxl")
-        df = xl.parse(xl.sheet_names[0])
+        with memguard.stage("open"):
+            xl = pd.ExcelFile(file_path, engine="openpyxl")
+        with memguard.stage("extract"):
+            df = xl.parse(xl.sheet_names[0])
+    except MemoryBudgetExceeded:
+        raise
     except Exception as e:
         raise ParseError(f"Unable to read Excel file: {str(e)}")
         
-    return process_dataframe(df)
+    with memguard.stage("normalize"):
+        return process_dataframe(df, window)
 
-def parse_docx(file_path):
+def parse_docx(file_path, window=None):
     """Parse Word DOCX table structures."""
+    import docx
+
     try:
-        doc = docx.Document(file_path)
+        with memguard.stage("open"):
+            doc = docx.Document(file_path)
         all_tables = []
-        for table in doc.tables:
-            table_data = []
-            for row in table.rows:
-                row_cells = [cell.text.strip() for cell in row.cells]
-                table_data.append(row_cells)
-            if table_data:
-                all_tables.extend(table_data)
+        with memguard.stage("extract"):
+            for table in doc.tables:
+                memguard.check()
+                table_data = []
+                for row in table.rows:
+                    row_cells = [cell.text.strip() for cell in row.cells]
+                    table_data.append(row_cells)
+                if table_data:
+                    all_tables.extend(table_data)
         if not all_tables:
             raise ParseError("No table found inside Word document")
             
         df = pd.DataFrame(all_tables)
-        return process_dataframe(df)
+        with memguard.stage("normalize"):
+            return process_dataframe(df, window)
+    except MemoryBudgetExceeded:
+        raise
     except Exception as e:
         raise ParseError(f"Error parsing Word tables: {str(e)}")
 
-def parse_statement(file_path, password=None):
+def parse_statement(file_path, password=None, date_from=None, date_to=None):
     """
     Universal entry point to parse any bank statement file.
-    Normalizes Output format to have Date, Description, Debit, Credit, Balance, and Amount.
+    Normalizes Output format to have Date, Description, Debit, Credit, Balance, and Amount,
+    in the compact dtypes of txframe.py.
+
+    date_from / date_to (inclusive; ISO strings or dates, either optional)
+    restrict the result to that range. The range is pushed down into the
+    parsers (see daterange.py), so pages and rows outside it are skipped or
+    dropped as early as the format allows. Raises ValueError for an invalid
+    range; a range with no transactions gives an empty frame.
     """
     _, ext = os.path.splitext(file_path.lower())
+    window = daterange.DateRange.of(date_from, date_to)
     
+    text_layout = False
+    pages = None
     if ext == ".pdf":
-        pdf_obj, temp_path = try_open_pdf(file_path, password)
+        with memguard.stage("open"):
+            pdf_obj, temp_path = try_open_pdf(file_path, password)
         try:
-            df = parse_pdf_table(pdf_obj)
-            if df is None or df.empty:
-                df = parse_pdf_text(pdf_obj)
+            with memguard.stage("extract"):
+                pages = len(pdf_obj.pages)
+                df = parse_pdf_table(pdf_obj, window)
+                if df is None:
+                    df = parse_pdf_text(pdf_obj, window)
+                    text_layout = True
         finally:
             pdf_obj.close()
             if temp_path:
@@ -574,35 +842,52 @@ def parse_statement(file_path, password=None):
                 except OSError:
                     pass
                     
-        if df is None or df.empty:
+        if df is None:
             raise ParseError("Could not extract tabular or textual transaction lines from the PDF statement")
             
     elif ext == ".csv":
-        df = parse_csv(file_path)
+        df = parse_csv(file_path, window)
     elif ext in (".xlsx", ".xls"):
-        df = parse_excel(file_path)
+        df = parse_excel(file_path, window)
     elif ext == ".docx":
-        df = parse_docx(file_path)
+        df = parse_docx(file_path, window)
     else:
         raise UnsupportedFormat()
         
-    # Standardize columns
-    if "Debit" not in df.columns:
-        df["Debit"] = 0.0
-    else:
-        df["Debit"] = df["Debit"].fillna(0.0)
+    with memguard.stage("normalize"):
+        return _standardize(df, text_layout, pages)
 
-    if "Credit" not in df.columns:
-        df["Credit"] = 0.0
-    else:
-        df["Credit"] = df["Credit"].fillna(0.0)
+def _standardize(df, text_layout, pages):
+    """Common column layout, balance reconciliation and signed Amount."""
+    # Standardize columns: amounts in int64 paise, 0 when absent
+    for col in ("Debit", "Credit", "Balance", "TxAmt"):
+        if col in df.columns:
+            df[col] = df[col].fillna(0).astype(np.int64)
+        elif col != "TxAmt":
+            df[col] = np.int64(0)
+
+    # Check amounts against the running balance. Text-extracted PDFs only
+    # guess direction from keywords, so there the balance movement decides.
+    # Rows kept only as neighbours of a date range are dropped afterwards.
+    in_range = df.pop("InRange").astype(bool).to_numpy() if "InRange" in df.columns else None
+    df["Date"] = txframe.parse_dates(df["Date"])
+    df = reconcile.reconcile(
+        df,
+        magnitude=df["TxAmt"] if text_layout else None,
+        follow_balance=text_layout,
+        counted=in_range,
+    )
+    if in_range is not None:
+        attrs = df.attrs
+        df = df[in_range].reset_index(drop=True)
+        df.attrs = attrs
 
-    if "Balance" not in df.columns:
-        df["Balance"] = 0.0
-    else:
-        df["Balance"] = df["Balance"].fillna(0.0)
-        
     # Standardize Amount format: Debit is positive, Credit is negative
-    df["Amount"] = df.apply(lambda r: r["Debit"] if r["Debit"] > 0 else -r["Credit"], axis=1).fillna(0.0)
-    
-    return df[["Date", "Description", "Debit", "Credit", "Balance", "Amount"]]
+    debit = df["Debit"].to_numpy()
+    df["Amount"] = np.where(debit > 0, debit, -df["Credit"].to_numpy())
+
+    # The compact layout of txframe.py, used by every later stage
+    df = txframe.compact(df)[["Date", "Description", "Debit", "Credit", "Balance", "Amount", "Reconciled"]]
+    if pages is not None:
+        df.attrs["pages"] = pages
+    return df
@@ -0,0 +1,212 @@
+"""
+Store for uploads waiting on a PDF password.
+
+Files are kept as <directory>/<uuid><ext> and indexed in memory by id, so
+/retry-password finds its file with a dict lookup (or, when another worker
+accepted the upload, a stat of the few supported extensions) instead of a
+glob over the directory. Ids must be canonical UUIDs, which also keeps
+user input out of file paths.
+
+Entries expire after PENDING_TTL_SECONDS. A daemon thread, started lazily
+in each worker process, deletes expired files every SWEEP_INTERVAL
+seconds and re-reads the directory to pick up other workers' files. The
+directory is capped at PENDING_QUOTA_MB: an upload that does not fit is
+refused (QuotaExceeded) rather than evicting anyone else's pending file,
+and space comes back as files are retried, discarded or expire.
+
+check_password() only asks pikepdf to decrypt, so a wrong password is
+rejected before the full parse is started.
+"""
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from parsers import ParseError, UnsupportedFormat, WrongPassword
+
+PENDING_TTL_SECONDS = int(os.environ.get("PENDING_TTL_SECONDS", 15 * 60))
+PENDING_QUOTA_MB = int(os.environ.get("PENDING_QUOTA_MB", 512))
+SWEEP_INTERVAL = 60.0
+
+# Extensions an upload may be cached with (lower-case, see PendingStore.put)
+EXTENSIONS = (".pdf", ".csv", ".xlsx", ".xls", ".docx")
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def canonical_id(file_id):
+    """The canonical string form of a UUID file id, or None if it is not one."""
+    try:
+        canonical = str(uuid.UUID(str(file_id)))
+    except (ValueError, AttributeError, TypeError):
+        return None
+    return canonical if canonical == file_id else None
+
+
+def check_password(path, password):
+    """
+    Raise WrongPassword unless password opens the PDF at path. Only the
+    encryption dictionary is checked; nothing is extracted or re-saved.
+    """
+    import pikepdf
+
+    try:
+        with pikepdf.open(path, password=password or ""):
+            pass
+    except pikepdf.PasswordError:
+        raise WrongPassword()
+    except Exception as e:
+        raise ParseError(f"Unable to read PDF file: {str(e)}")
+
+
+class _Entry:
+    __slots__ = ("path", "size", "created")
+
+    def __init__(self, path, size, created):
+        self.path = path
+        self.size = size
+        self.created = created
+
+
+class PendingStore:
+    def __init__(self, directory, ttl=PENDING_TTL_SECONDS, quota_bytes=PENDING_QUOTA_MB * 2 ** 20):
+        self.directory = directory
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self._index = {}
+        self._lock = threading.Lock()
+        self._sweeper_pid = None
+        self._counters = {"stored": 0, "expired": 0, "refused": 0}
+
+    # ── Index ──
+    def _rescan(self):
+        """Rebuild the index from the directory (files written by any worker)."""
+        index = {}
+        try:
+            scan = list(os.scandir(self.directory))
+        except OSError:
+            scan = []
+        for item in scan:
+            file_id, ext = os.path.splitext(item.name)
+            if ext not in EXTENSIONS or canonical_id(file_id) is None:
+                continue
+            try:
+                st = item.stat()
+            except OSError:
+                continue
+            index[file_id] = _Entry(item.path, st.st_size, st.st_mtime)
+        with self._lock:
+            self._index = index
+
+    def _remove(self, file_id, entry):
+        with self._lock:
+            if self._index.get(file_id) is entry:
+                del self._index[file_id]
+        try:
+            os.unlink(entry.path)
+        except OSError:
+            pass
+
+    # ── Background sweep ──
+    def _ensure_sweeper(self):
+        """Start the sweeper once per process (threads do not survive fork)."""
+        if self._sweeper_pid == os.getpid():
+            return
+        self._sweeper_pid = os.getpid()
+        self._rescan()
+        threading.Thread(target=self._sweep_forever, daemon=True).start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(SWEEP_INTERVAL)
+            try:
+                self.sweep()
+            except Exception:
+                pass
+
+    def sweep(self):
+        """Refresh the index from disk and delete expired files."""
+        self._rescan()
+        now = time.time()
+        with self._lock:
+            expired = [(i, e) for i, e in self._index.items() if now - e.created > self.ttl]
+        for file_id, entry in expired:
+            self._remove(file_id, entry)
+        self._counters["expired"] += len(expired)
+
+    def _check_room(self, size):
+        """Raise QuotaExceeded unless size more bytes fit in the quota."""
+        # Count the files every worker has stored, not just this one's
+        self._rescan()
+        with self._lock:
+            used = sum(e.size for e in self._index.values())
+        if used + size > self.quota_bytes:
+            self._counters["refused"] += 1
+            raise QuotaExceeded()
+
+    # ── Public API ──
+    def put(self, src_path, ext) -> str:
+        """
+        Move src_path into the store and return its new file id. Raises
+        UnsupportedFormat for an extension outside EXTENSIONS and
+        QuotaExceeded when the store is full.
+        """
+        self._ensure_sweeper()
+        ext = ext.lower()
+        if ext not in EXTENSIONS:
+            raise UnsupportedFormat(ext)
+        size = os.path.getsize(src_path)
+        self._check_room(size)
+        os.makedirs(self.directory, exist_ok=True)
+        file_id = str(uuid.uuid4())
+        path = os.path.join(self.directory, f"{file_id}{ext}")
+        shutil.move(src_path, path)
+        with self._lock:
+            self._index[file_id] = _Entry(path, size, time.time())
+        self._counters["stored"] += 1
+        return file_id
+
+    def get(self, file_id):
+        """Path of a live pending upload, or None if unknown, invalid or expired."""
+        self._ensure_sweeper()
+        if canonical_id(file_id) is None:
+            return None
+        with self._lock:
+            entry = self._index.get(file_id)
+        if entry is None:
+            # Accepted by another worker since our last rescan
+            for ext in EXTENSIONS:
+                path = os.path.join(self.directory, f"{file_id}{ext}")
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entry = _Entry(path, st.st_size, st.st_mtime)
+                with self._lock:
+                    self._index[file_id] = entry
+                break
+        if entry is None:
+            return None
+        if time.time() - entry.created > self.ttl or not os.path.exists(entry.path):
+            self._remove(file_id, entry)
+            return None
+        return entry.path
+
+    def discard(self, file_id):
+        with self._lock:
+            entry = self._index.get(file_id)
+        if entry is not None:
+            self._remove(file_id, entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._counters,
+                files=len(self._index),
+                bytes=sum(e.size for e in self._index.values()),
+                quota_bytes=self.quota_bytes,
+                ttl_seconds=self.ttl,
+            )
@@ -0,0 +1,188 @@
+"""
+Opt-in profiling of statement requests.
+
+Views wrapped with @profiled run under cProfile when either PROFILE_ALL=1
+or the request carries an X-Profile header equal to PROFILE_TOKEN. The
+whole view is profiled: parsing, categorisation and template rendering.
+
+Each profiled request gets a request id (returned in the X-Profile-Id
+response header) and two artifacts in PROFILE_DIR:
+
+    <id>.prof   raw pstats dump (snakeviz, pstats, ...)
+    <id>.json   endpoint, status, timings, file type, page and row counts
+                (from note()) and the top functions by cumulative time in
+                the parsers, categorisation and template layers
+
+Upload contents are never written. Only the newest PROFILE_KEEP requests
+are kept.
+"""
+import cProfile
+import functools
+import hmac
+import json
+import os
+import pstats
+import time
+import uuid
+
+from flask import g, make_response, request
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "data/profiles")
+PROFILE_ALL = os.environ.get("PROFILE_ALL", "0") == "1"
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 50))
+TOP_FUNCTIONS = 40
+HEADER = "X-Profile"
+
+# Source file (or package directory) -> layer reported in the summary
+LAYERS = {
+    "parsers.py": "parsers",
+    "reconcile.py": "parsers",
+    "pdfplumber": "parsers",
+    "pdfminer": "parsers",
+    "pikepdf": "parsers",
+    "rules.py": "categorization",
+    "parallel.py": "categorization",
+    "recurring.py": "categorization",
+    "engine.py": "categorization",
+    "app.py": "app",
+    "cube.py": "app",
+    "result_store.py": "app",
+    "jinja2": "templates",
+}
+
+
+def authorized(token) -> bool:
+    """True when an admin token is configured and token matches it."""
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(str(token or ""), PROFILE_TOKEN)
+
+
+def _requested() -> bool:
+    return PROFILE_ALL or authorized(request.headers.get(HEADER))
+
+
+def note(**fields):
+    """Attach metadata (file_type, pages, rows, ...) to the current profile, if any."""
+    meta = g.get("profile_meta")
+    if meta is not None:
+        meta.update(fields)
+
+
+def _layer(filename):
+    base = os.path.basename(filename)
+    if base in LAYERS:
+        return LAYERS[base]
+    parts = filename.replace("\\", "/").split("/")
+    for part in parts:
+        if part in LAYERS:
+            return LAYERS[part]
+    return None
+
+
+def summarize(profiler, limit=TOP_FUNCTIONS) -> list:
+    """Top functions of the tracked layers by cumulative time."""
+    stats = pstats.Stats(profiler).stats
+    rows = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.items():
+        layer = _layer(filename)
+        if layer is None:
+            continue
+        rows.append({
+            "layer": layer,
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "calls": calls,
+            "tottime": round(tottime, 6),
+            "cumtime": round(cumtime, 6),
+        })
+    rows.sort(key=lambda r: r["cumtime"], reverse=True)
+    return rows[:limit]
+
+
+def _prune():
+    try:
+        names = [n for n in os.listdir(PROFILE_DIR) if n.endswith(".json")]
+    except OSError:
+        return
+    paths = sorted((os.path.join(PROFILE_DIR, n) for n in names), key=os.path.getmtime)
+    for path in paths[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else paths:
+        for p in (path, path[:-len(".json")] + ".prof"):
+            try:
+                os.unlink(p)
+            except OSError:
+                pass
+
+
+def _save(request_id, profiler, meta):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{request_id}.prof"))
+    meta["top_functions"] = summarize(profiler)
+    with open(os.path.join(PROFILE_DIR, f"{request_id}.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, default=str)
+    _prune()
+
+
+def profiled(view):
+    """Run view under cProfile when profiling is requested (see module docstring)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _requested():
+            return view(*args, **kwargs)
+
+        request_id = uuid.uuid4().hex
+        g.profile_meta = {
+            "request_id": request_id,
+            "endpoint": request.endpoint,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active in this process
+            return view(*args, **kwargs)
+
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = make_response(view(*args, **kwargs))
+            status = response.status_code
+        finally:
+            profiler.disable()
+            g.profile_meta.update(
+                status=status,
+                duration_seconds=round(time.perf_counter() - started, 4),
+            )
+            _save(request_id, profiler, g.profile_meta)
+        response.headers["X-Profile-Id"] = request_id
+        return response
+
+    return wrapper
+
+
+def artifact_path(request_id, kind="prof"):
+    """Path of a stored artifact, or None if the id is malformed or unknown."""
+    try:
+        request_id = uuid.UUID(hex=request_id).hex
+    except (ValueError, TypeError):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{request_id}.{kind}")
+    return path if os.path.isfile(path) else None
+
+
+def list_profiles() -> list:
+    """Metadata (without function tables) of stored profiles, newest first."""
+    try:
+        names = [n for n in os.listdir(PROFILE_DIR) if n.endswith(".json")]
+    except OSError:
+        return []
+    out = []
+    for name in names:
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta.pop("top_functions", None)
+        out.append(meta)
+    out.sort(key=lambda m: m.get("started", ""), reverse=True)
+    return out
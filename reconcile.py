@@ -0,0 +1,124 @@
+"""
+Running-balance reconciliation, run on the output of every parser.
+
+Consecutive rows of a statement must satisfy
+    balance[i] = balance[i - 1] + credit[i] - debit[i]
+in chronological order. reconcile() detects whether the statement is
+printed newest-first, computes the balance deltas with NumPy in integer
+paise (see money.py, so "matches" means exactly equal), and
+
+  * fixes the debit/credit direction where the delta's size matches the
+    row's amount (or, for text-extracted PDFs, wherever the delta is
+    non-zero, because their direction is only a keyword guess);
+  * fills in the amount of rows that have none but whose balance moved;
+  * flags rows whose amount disagrees with the balance movement.
+
+Rows that cannot be checked (first row, missing balances) are treated as
+reconciled. Everything is vectorised, so the stage is linear in the number
+of rows.
+"""
+import numpy as np
+import pandas as pd
+
+# Paise by which amounts may differ and still count as equal. Amounts are
+# exact integers (see money.py), so there is no rounding drift to absorb.
+TOLERANCE = 0
+
+
+def _is_descending(dates) -> bool:
+    """True when most date changes between consecutive rows go backwards."""
+    days = pd.to_datetime(pd.Series(dates), errors="coerce", dayfirst=True).dropna()
+    if len(days) < 2:
+        return False
+    steps = np.sign(np.diff(days.to_numpy().astype("datetime64[D]").astype(np.int64)))
+    backwards, forwards = int((steps < 0).sum()), int((steps > 0).sum())
+    if backwards != forwards:
+        return backwards > forwards
+    return days.iloc[0] > days.iloc[-1]
+
+
+def reconcile(df: pd.DataFrame, magnitude=None, follow_balance=False, counted=None) -> pd.DataFrame:
+    """
+    Check and correct Debit/Credit against Balance (int64 paise, 0 = absent).
+
+    magnitude optionally gives each row's transaction amount when it is not
+    simply the non-zero one of Debit/Credit. With follow_balance, the sign
+    of any clear balance movement decides the direction even if its size
+    disagrees with the amount. Returns a copy with a boolean Reconciled
+    column; df.attrs["reconciliation"] holds the counts from quality(),
+    over the rows selected by the boolean mask counted (all by default).
+    """
+    out = df.copy()
+    n = len(out)
+    debit = out["Debit"].to_numpy(dtype=np.int64, copy=True)
+    credit = out["Credit"].to_numpy(dtype=np.int64, copy=True)
+    balance = out["Balance"].to_numpy(dtype=np.int64)
+    if magnitude is None:
+        magnitude = np.where(debit > 0, debit, credit)
+    magnitude = np.abs(np.asarray(magnitude, dtype=np.int64))
+
+    # Chronological positions: reverse a newest-first statement
+    order = np.arange(n)[::-1] if "Date" in out.columns and _is_descending(out["Date"]) else np.arange(n)
+    bal = balance[order]
+    mag = magnitude[order]
+
+    checkable = np.zeros(n, dtype=bool)
+    delta = np.zeros(n, dtype=np.int64)
+    if n >= 2:
+        checkable[1:] = (np.abs(bal[1:]) > TOLERANCE) & (np.abs(bal[:-1]) > TOLERANCE)
+        delta[1:] = bal[1:] - bal[:-1]
+    moved = checkable & (np.abs(delta) > TOLERANCE)
+
+    # Rows with no amount take it from the balance movement
+    filled = moved & (mag <= TOLERANCE)
+    mag = np.where(filled, np.abs(delta), mag)
+
+    agrees = np.abs(np.abs(delta) - mag) <= TOLERANCE
+    settle = moved & (agrees | follow_balance)
+    is_credit = settle & (delta > 0)
+    is_debit = settle & (delta < 0)
+
+    new_debit = debit.copy()
+    new_credit = credit.copy()
+    rows = order[is_credit]
+    new_credit[rows], new_debit[rows] = mag[is_credit], 0
+    rows = order[is_debit]
+    new_debit[rows], new_credit[rows] = mag[is_debit], 0
+
+    reconciled = np.ones(n, dtype=bool)
+    reconciled[order[checkable]] = agrees[checkable]
+
+    changed = (new_debit != debit) | (new_credit != credit)
+    out["Debit"] = new_debit
+    out["Credit"] = new_credit
+    out["Reconciled"] = reconciled
+
+    counted = np.ones(n, dtype=bool) if counted is None else np.asarray(counted, dtype=bool)
+    in_order = counted[order]
+    out.attrs["reconciliation"] = {
+        "rows": int(counted.sum()),
+        "checked": int((checkable & in_order).sum()),
+        "mismatched": int((~reconciled & counted).sum()),
+        "corrected": int((changed & counted).sum()),
+        "filled": int((filled & in_order).sum()),
+        "descending": bool(n and order[0] != 0),
+    }
+    return out
+
+
+def quality(df: pd.DataFrame) -> dict:
+    """
+    Parse-quality summary for an analysed frame: how many rows could be
+    checked against the balance and what share of those reconcile.
+    """
+    report = dict(df.attrs.get("reconciliation") or {})
+    if not report and "Reconciled" in df.columns:
+        report = {"rows": len(df), "mismatched": int((~df["Reconciled"].astype(bool)).sum())}
+    if not report:
+        return {}
+    checked = report.get("checked")
+    mismatched = report.get("mismatched", 0)
+    report["reconciled_pct"] = (
+        round(100.0 * (checked - mismatched) / checked, 1) if checked else None
+    )
+    return report
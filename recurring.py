@@ -0,0 +1,169 @@
+"""
+Recurring-payment and subscription detection.
+
+Debits are grouped by canonical merchant and amount band (amounts within
+AMOUNT_TOLERANCE of their neighbour, sorted, fall in the same band), then
+each group's sorted date gaps are compared with the PERIODS windows. A group
+is recurring when its median gap falls in a window and at least
+MIN_REGULARITY of its gaps do too. Everything is done with sorts and
+grouped reductions over arrays, so detection is O(n log n) in the number
+of transactions.
+
+Detected series feed categorisation (recurring rows still "Others" become
+subscriptions or bills) and the dashboard insights.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+import money
+
+# name: (min gap days, max gap days, min occurrences, period offset, periods per month)
+PERIODS = {
+    "weekly": (6, 8, 4, pd.DateOffset(days=7), 30.4375 / 7),
+    "monthly": (26, 35, 3, pd.DateOffset(months=1), 1.0),
+    "yearly": (350, 380, 3, pd.DateOffset(years=1), 1 / 12),
+}
+# Relative step between sorted amounts that starts a new amount band
+AMOUNT_TOLERANCE = 0.10
+# Share of a series' gaps that must fall inside its period window
+MIN_REGULARITY = 0.75
+
+# Amount rule whose rounded_in prices mark a recurring series as a subscription
+SUBSCRIPTION_RULE = "subscription-price"
+SUBSCRIPTION_CATEGORY = "Entertainment"
+RECURRING_CATEGORY = "Bills"
+
+SERIES_COLUMNS = ["merchant", "period", "occurrences", "amount", "first_date",
+                  "last_date", "next_expected", "monthly_burden"]
+
+_NON_ALPHA = re.compile(r"[^A-Z ]+")
+_SPACES = re.compile(r"\s+")
+
+
+def _canonical_codes(merchants) -> np.ndarray:
+    """Integer code per row; merchants differing only in case, digits or punctuation share a code."""
+    codes, uniques = pd.factorize(pd.Series(merchants, dtype=object).fillna("").astype(str))
+    canonical = [_SPACES.sub(" ", _NON_ALPHA.sub(" ", u.upper())).strip() for u in uniques]
+    canon_codes, _ = pd.factorize(pd.Series(canonical, dtype=object))
+    return canon_codes[codes] if len(codes) else codes
+
+
+def _empty():
+    return pd.DataFrame(columns=SERIES_COLUMNS)
+
+
+def detect(merchants, amounts, day) -> tuple:
+    """
+    Find recurring debit series.
+
+    merchants, amounts (paise, debits positive) and day (parsed dates) are
+    aligned per transaction. Returns (series, row_series): a DataFrame with
+    one row per detected series (SERIES_COLUMNS, largest monthly burden
+    first; amount and monthly_burden in paise) and an int array giving each
+    transaction's series position, or -1.
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    n = len(amounts)
+    row_series = np.full(n, -1, dtype=np.int64)
+    if day is None or n == 0:
+        return _empty(), row_series
+
+    day = pd.Series(pd.to_datetime(pd.Series(day).to_numpy(), errors="coerce"))
+    rows = np.flatnonzero((amounts > 0) & day.notna().to_numpy())
+    if len(rows) < 2:
+        return _empty(), row_series
+
+    merchant_codes = _canonical_codes(merchants)[rows]
+    amt = amounts[rows]
+    days = day.to_numpy()[rows].astype("datetime64[D]").astype(np.int64)
+
+    # Amount bands: sort by (merchant, amount), break on merchant change or a jump
+    order = np.lexsort((amt, merchant_codes))
+    m_sorted, a_sorted = merchant_codes[order], amt[order]
+    breaks = np.ones(len(order), dtype=bool)
+    breaks[1:] = (m_sorted[1:] != m_sorted[:-1]) | (a_sorted[1:] > a_sorted[:-1] * (1 + AMOUNT_TOLERANCE))
+    group = np.empty(len(order), dtype=np.int64)
+    group[order] = np.cumsum(breaks) - 1
+
+    # Date gaps inside each group
+    order = np.lexsort((days, group))
+    g_sorted, d_sorted = group[order], days[order]
+    same = g_sorted[1:] == g_sorted[:-1]
+    gap_group = g_sorted[1:][same]
+    gaps = (d_sorted[1:] - d_sorted[:-1])[same]
+    if not len(gaps):
+        return _empty(), row_series
+
+    occurrences = np.bincount(group)
+    median_gap = pd.Series(gaps).groupby(gap_group).median()
+
+    period_of = pd.Series(None, index=median_gap.index, dtype=object)
+    for name, (lo, hi, min_count, _, _) in PERIODS.items():
+        in_window = pd.Series((gaps >= lo) & (gaps <= hi)).groupby(gap_group).mean()
+        hit = (
+            median_gap.between(lo, hi)
+            & (in_window >= MIN_REGULARITY)
+            & (occurrences[median_gap.index] >= min_count)
+            & period_of.isna()
+        )
+        period_of[hit] = name
+    period_of = period_of.dropna()
+    if period_of.empty:
+        return _empty(), row_series
+
+    # One summary row per recurring group
+    frame = pd.DataFrame({
+        "group": group,
+        "merchant": pd.Series(merchants, dtype=object).to_numpy()[rows],
+        "amount": amt,
+        "day": days.astype("datetime64[D]"),
+    })
+    frame = frame[frame["group"].isin(period_of.index)]
+    grouped = frame.groupby("group")
+    series = pd.DataFrame({
+        "merchant": grouped["merchant"].first(),
+        "period": period_of,
+        "occurrences": grouped.size(),
+        "amount": grouped["amount"].median().round().astype(np.int64),
+        "first_date": grouped["day"].min(),
+        "last_date": grouped["day"].max(),
+    })
+    series["next_expected"] = [
+        last + PERIODS[period][3] for last, period in zip(series["last_date"], series["period"])
+    ]
+    series["monthly_burden"] = (
+        series["amount"] * series["period"].map({k: v[4] for k, v in PERIODS.items()})
+    ).round().astype(np.int64)
+    series = series.sort_values("monthly_burden", ascending=False)
+
+    position = pd.Series(np.arange(len(series)), index=series.index)
+    detected = np.isin(group, series.index)
+    row_series[rows[detected]] = position[group[detected]].to_numpy()
+    return series.reset_index(drop=True)[SERIES_COLUMNS], row_series
+
+
+def subscription_prices(engine) -> list:
+    """Rounded prices of the subscription amount rule in a rules.RuleEngine."""
+    for rule in engine.rules:
+        if rule.get("name") == SUBSCRIPTION_RULE:
+            return list(rule.get("rounded_in", []))
+    return []
+
+
+def apply_categories(categories, row_series, series, prices) -> np.ndarray:
+    """
+    Recategorise recurring rows still marked Others: a subscription when the
+    series' typical amount is a known subscription price, a bill otherwise.
+    """
+    categories = np.asarray(categories, dtype=object).copy()
+    target = (row_series >= 0) & (categories == "Others")
+    if target.any():
+        # Prices in the rule table are rupees
+        rupees = np.round(money.to_rupees(series["amount"].to_numpy()))
+        is_subscription = np.isin(rupees, np.asarray(prices, dtype=float))
+        categories[target] = np.where(
+            is_subscription[row_series[target]], SUBSCRIPTION_CATEGORY, RECURRING_CATEGORY,
+        )
+    return categories
@@ -0,0 +1,240 @@
+"""
+Bounded store for analysis results.
+
+Every analysis is saved under a random result id, which the web app records
+in the user's session, so exports, pagination and re-renders read that
+user's own result instead of whatever the last request left behind.
+
+Results are written through to RESULTS_DIR as Parquet (one directory per
+result, renamed into place once complete) so any gunicorn worker can serve
+them. Each process keeps recently used results in memory, accounted with
+``memory_usage(deep=True)`` and evicted least-recently-used once
+RESULT_MEMORY_BUDGET_MB is exceeded; evicted results are re-read from disk
+on demand. Results older than RESULT_TTL_SECONDS are dropped from both.
+"""
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+
+import money
+
+RESULTS_DIR = os.environ.get("RESULTS_DIR", "data/results")
+RESULT_MEMORY_BUDGET_MB = int(os.environ.get("RESULT_MEMORY_BUDGET_MB", 256))
+RESULT_TTL_SECONDS = int(os.environ.get("RESULT_TTL_SECONDS", 3600))
+# Minimum seconds between expiry sweeps of RESULTS_DIR
+SWEEP_INTERVAL = 60.0
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def is_result_id(value) -> bool:
+    """True if value has the shape of an id issued by ResultStore.put."""
+    return isinstance(value, str) and bool(_ID_RE.match(value))
+
+
+def frames_nbytes(frames: dict) -> int:
+    """Deep in-memory size of a dict of DataFrames."""
+    return int(sum(f.memory_usage(index=True, deep=True).sum() for f in frames.values()))
+
+
+def parquet_ready(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parquet needs one type per column; parsed statements can mix strings
+    with numbers or timestamps in object columns, so those are stored as
+    strings (missing values stay missing).
+    """
+    out = None
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == object:
+            if out is None:
+                out = df.copy(deep=False)
+            out[col] = s.where(s.isna(), s.astype(str))
+    return df if out is None else out
+
+
+def arrow_table(df: pd.DataFrame, schema):
+    """
+    pyarrow Table of df in schema. Decimal fields are built from the int64
+    paise of money columns (money.decimal_array), everything else is
+    converted by pyarrow.
+    """
+    import pyarrow as pa
+
+    frame = parquet_ready(df)
+    arrays = [
+        money.decimal_array(frame[field.name]) if pa.types.is_decimal(field.type)
+        else pa.array(frame[field.name], type=field.type, from_pandas=True)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class _Entry:
+    __slots__ = ("frames", "nbytes", "created")
+
+    def __init__(self, frames, nbytes, created):
+        self.frames = frames
+        self.nbytes = nbytes
+        self.created = created
+
+
+class ResultStore:
+    """
+    Result id -> dict of named DataFrames (e.g. {"frame": ..., "cube": ...}).
+
+    Thread-safe within a process; the on-disk copy is shared between
+    processes.
+    """
+
+    def __init__(self, directory=RESULTS_DIR, budget_bytes=RESULT_MEMORY_BUDGET_MB * 2 ** 20,
+                 ttl=RESULT_TTL_SECONDS):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._counters = {"puts": 0, "memory_hits": 0, "disk_loads": 0, "misses": 0,
+                          "evictions": 0, "expired": 0, "write_errors": 0}
+
+    # ── In-memory LRU ──
+    def _insert(self, result_id, entry):
+        """Add entry as most recently used and evict down to the budget. Caller holds the lock."""
+        old = self._entries.pop(result_id, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        self._entries[result_id] = entry
+        self._bytes += entry.nbytes
+        # The newest entry is always kept, even if it alone exceeds the budget
+        while self._bytes > self.budget_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self._counters["evictions"] += 1
+
+    def _drop(self, result_id):
+        entry = self._entries.pop(result_id, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    # ── Disk ──
+    def _path(self, result_id):
+        return os.path.join(self.directory, result_id)
+
+    def _write(self, result_id, frames):
+        """Write every frame to a temp directory, then rename it into place."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = os.path.join(self.directory, f".{result_id}.tmp")
+        try:
+            os.makedirs(tmp)
+            for name, frame in frames.items():
+                parquet_ready(frame).to_parquet(
+                    os.path.join(tmp, f"{name}.parquet"), compression="zstd",
+                )
+            os.rename(tmp, self._path(result_id))
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def _read(self, result_id):
+        """Return (frames, created) from disk, or None if absent."""
+        path = self._path(result_id)
+        try:
+            created = os.stat(path).st_mtime
+            frames = {
+                name[:-len(".parquet")]: pd.read_parquet(os.path.join(path, name))
+                for name in os.listdir(path) if name.endswith(".parquet")
+            }
+        except (OSError, ValueError):
+            return None
+        return (frames, created) if frames else None
+
+    # ── Public API ──
+    def put(self, frames: dict) -> str:
+        """Store the frames under a new result id and return it."""
+        result_id = uuid.uuid4().hex
+        entry = _Entry(frames, frames_nbytes(frames), time.time())
+        try:
+            self._write(result_id, frames)
+        except Exception:
+            # Still served from this worker's memory while it stays cached
+            self._counters["write_errors"] += 1
+        with self._lock:
+            self._insert(result_id, entry)
+            self._counters["puts"] += 1
+        self.sweep()
+        return result_id
+
+    def get(self, result_id, name="frame"):
+        """The named frame of a result, or None if unknown or expired."""
+        if not is_result_id(result_id):
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None:
+                if now - entry.created > self.ttl:
+                    self._drop(result_id)
+                    self._counters["expired"] += 1
+                    entry = None
+                else:
+                    self._entries.move_to_end(result_id)
+                    self._counters["memory_hits"] += 1
+        if entry is None:
+            loaded = self._read(result_id)
+            if loaded is None or now - loaded[1] > self.ttl:
+                with self._lock:
+                    self._counters["misses"] += 1
+                return None
+            frames, created = loaded
+            entry = _Entry(frames, frames_nbytes(frames), created)
+            with self._lock:
+                self._insert(result_id, entry)
+                self._counters["disk_loads"] += 1
+        return entry.frames.get(name)
+
+    def delete(self, result_id):
+        if not is_result_id(result_id):
+            return
+        with self._lock:
+            self._drop(result_id)
+        shutil.rmtree(self._path(result_id), ignore_errors=True)
+
+    def sweep(self, force=False):
+        """Drop expired results from memory and disk (at most every SWEEP_INTERVAL seconds)."""
+        now = time.time()
+        if not force and time.monotonic() - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = time.monotonic()
+        with self._lock:
+            for result_id in [r for r, e in self._entries.items() if now - e.created > self.ttl]:
+                self._drop(result_id)
+                self._counters["expired"] += 1
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.stat(path).st_mtime > self.ttl:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._counters,
+                entries=len(self._entries),
+                memory_bytes=self._bytes,
+                budget_bytes=self.budget_bytes,
+                ttl_seconds=self.ttl,
+            )
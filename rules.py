@@ -0,0 +1,434 @@
+"""
+Declarative categorisation rules for layers 1 (keywords), 3 (patterns) and
+4 (amount heuristics).
+
+The rule table is JSON (model/rules.json, or RULES_PATH per deployment):
+
+    {
+        "version": "1",
+        "noise_words": ["upi", "neft", ...],
+        "rules": [
+            {"name": "keywords-food", "layer": "keywords", "category": "Food",
+             "keywords": ["swiggy", "zomato", ...]},
+            {"name": "pos-shopping", "layer": "keywords", "category": "Shopping",
+             "patterns": ["pos.*mall"], "ignore_case": true},
+            {"name": "small-amount", "layer": "amount", "category": "Food",
+             "gt": 0, "lt": 20}
+        ]
+    }
+
+Within a layer the first rule in table order wins. Keywords are matched on
+the description after noise-word removal: multi-word keywords against the
+spaced text, single words against the text with spaces stripped. Patterns
+are regexes matched against the raw description. Amount rules refine rows
+that are still "Others" and may combine gt/lt/ge/le (on the amount),
+rounded_min/rounded_multiple_of/rounded_in (on the rounded amount) and
+contains_any (case-insensitive substrings of the description).
+
+Each text layer is compiled into a keyword trie regex plus one combined
+pattern regex, each reporting the highest-priority rule matching anywhere
+in a description, so a description is scanned once per layer however many
+rules there are. Descriptions are de-duplicated before matching and amount
+rules are evaluated with NumPy over the frame. Text-layer results can be
+kept across calls (and processes) by passing a cache to categorize(); see
+sharedcache.py.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+RULES_PATH = os.environ.get("RULES_PATH", "model/rules.json")
+
+KEYWORD_LAYER = "keywords"
+PATTERN_LAYER = "patterns"
+AMOUNT_LAYER = "amount"
+LAYERS = (KEYWORD_LAYER, PATTERN_LAYER, AMOUNT_LAYER)
+
+AMOUNT_CONDITIONS = ("gt", "lt", "ge", "le", "rounded_min", "rounded_multiple_of",
+                     "rounded_in", "contains_any")
+
+# Rows decided by the ML layer are counted under this name in stats()
+ML_HIT = "layer2-ml"
+
+_NON_ALNUM = re.compile(r"[^a-z0-9 ]")
+_SPACES = re.compile(r"\s+")
+
+
+class RuleError(Exception):
+    pass
+
+
+def clean_for_keyword_match(desc: str, noise_words) -> str:
+    """Strip bank noise and special chars for keyword matching."""
+    raw = desc.lower()
+    for noise in noise_words:
+        raw = raw.replace(noise, " ")
+    # Collapse non-alpha chars but keep spaces for multi-word matching
+    raw = _NON_ALNUM.sub(" ", raw)
+    raw = _SPACES.sub(" ", raw).strip()
+    return raw
+
+
+def _trie_regex(words) -> str:
+    """Regex source for a set of literals, factored into a prefix trie."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Greedy optional tail: the longest keyword at a position wins
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class _KeywordMatcher:
+    """
+    Literal keywords from many rules in one trie-shaped regex, so the cost per
+    character does not grow with the number of keywords. At each position the
+    regex reports the longest keyword starting there; every other keyword
+    starting there is a prefix of it, so a precomputed "best rule among my
+    prefixes" table gives the highest-priority rule at that position.
+    """
+
+    def __init__(self, keywords):
+        # keywords: list of (rule_index, keyword)
+        self.pattern = None
+        self.min_index = None
+        if not keywords:
+            return
+        owner = {}
+        for idx, kw in keywords:
+            owner[kw] = min(idx, owner.get(kw, idx))
+        self.best_prefix = {
+            kw: min(i for other, i in owner.items() if kw.startswith(other))
+            for kw in owner
+        }
+        self.pattern = re.compile(f"(?=({_trie_regex(owner)}))")
+        self.min_index = min(owner.values())
+
+    def first(self, text: str, best: int) -> int:
+        """Return the lowest matching rule index in text, or best if lower."""
+        if self.pattern is None:
+            return best
+        for m in self.pattern.finditer(text):
+            idx = self.best_prefix[m.group(1)]
+            if idx < best:
+                best = idx
+                if best <= self.min_index:
+                    break
+        return best
+
+
+class _PatternMatcher:
+    """
+    Regex rules in one regex. Each rule becomes a named alternative inside a
+    lookahead, ordered by priority, so at every position the engine reports
+    the highest-priority rule starting there; the minimum over all positions
+    is the first rule (in table order) that matches anywhere in the text.
+    """
+
+    def __init__(self, alternatives):
+        # alternatives: list of (rule_index, regex_source)
+        self.pattern = None
+        self.min_index = None
+        if alternatives:
+            body = "|".join(f"(?P<r{idx}>{source})" for idx, source in alternatives)
+            self.pattern = re.compile(f"(?=(?:{body}))")
+            self.min_index = alternatives[0][0]
+
+    def first(self, text: str, best: int) -> int:
+        """Return the lowest matching rule index in text, or best if lower."""
+        if self.pattern is None:
+            return best
+        for m in self.pattern.finditer(text):
+            idx = int(m.lastgroup[1:])
+            if idx < best:
+                best = idx
+                if best <= self.min_index:
+                    break
+        return best
+
+
+class RuleEngine:
+    """A compiled rule table with per-rule hit counters and per-layer timings."""
+
+    def __init__(self, table: dict):
+        self.version = str(table.get("version", "0"))
+        # Identifies the exact table, for caches of its results
+        self.fingerprint = hashlib.sha1(
+            json.dumps(table, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+        self.noise_words = list(table.get("noise_words", []))
+        self.rules = list(table.get("rules", []))
+        self._compile()
+
+        self._lock = threading.Lock()
+        self._hits = np.zeros(len(self.rules) + 1, dtype=np.int64)  # last slot = ML
+        self._timings = {layer: {"calls": 0, "rows": 0, "seconds": 0.0} for layer in LAYERS}
+
+    # ── Compilation ──
+    def _compile(self):
+        spaced = {KEYWORD_LAYER: [], PATTERN_LAYER: []}
+        single = {KEYWORD_LAYER: [], PATTERN_LAYER: []}
+        regex = {KEYWORD_LAYER: [], PATTERN_LAYER: []}
+        self._amount_rules = []
+        self._rule_categories = np.array(
+            [r.get("category") for r in self.rules] + ["Others"], dtype=object
+        )
+
+        for idx, rule in enumerate(self.rules):
+            name = rule.get("name", f"rule-{idx}")
+            layer = rule.get("layer")
+            if layer not in LAYERS:
+                raise RuleError(f"Rule {name!r} has unknown layer {layer!r}")
+            if not rule.get("category"):
+                raise RuleError(f"Rule {name!r} has no category")
+
+            if layer == AMOUNT_LAYER:
+                if not any(key in rule for key in AMOUNT_CONDITIONS):
+                    raise RuleError(f"Amount rule {name!r} has no conditions")
+                self._amount_rules.append(idx)
+                continue
+
+            keywords = [str(kw).lower() for kw in rule.get("keywords", []) if kw]
+            multi = [kw for kw in keywords if " " in kw]
+            words = [kw for kw in keywords if " " not in kw]
+            spaced[layer].extend((idx, kw) for kw in multi)
+            single[layer].extend((idx, kw) for kw in words)
+
+            flags = "i" if rule.get("ignore_case") else ""
+            sources = []
+            for source in rule.get("patterns", []):
+                try:
+                    re.compile(source)
+                except re.error as e:
+                    raise RuleError(f"Rule {name!r} has an invalid pattern {source!r}: {e}")
+                sources.append(f"(?{flags}:{source})" if flags else f"(?:{source})")
+            if sources:
+                regex[layer].append((idx, "|".join(sources)))
+
+            if not (multi or words or sources):
+                raise RuleError(f"Rule {name!r} has no keywords or patterns")
+
+        self._matchers = {
+            layer: (_KeywordMatcher(spaced[layer]), _KeywordMatcher(single[layer]),
+                    _PatternMatcher(regex[layer]))
+            for layer in (KEYWORD_LAYER, PATTERN_LAYER)
+        }
+        self._needs_cleaning = {
+            layer: self._matchers[layer][0].pattern is not None
+            or self._matchers[layer][1].pattern is not None
+            for layer in (KEYWORD_LAYER, PATTERN_LAYER)
+        }
+
+    # ── Evaluation ──
+    def _match_layer(self, layer, texts) -> np.ndarray:
+        """First matching rule index per text for a text layer, -1 if none."""
+        started = time.perf_counter()
+        spaced, single, regex = self._matchers[layer]
+        none = len(self.rules)
+        out = np.full(len(texts), -1, dtype=np.int64)
+        for i, text in enumerate(texts):
+            best = none
+            if self._needs_cleaning[layer]:
+                cleaned = clean_for_keyword_match(text, self.noise_words)
+                best = spaced.first(cleaned, best)
+                best = single.first(cleaned.replace(" ", ""), best)
+            best = regex.first(text, best)
+            if best < none:
+                out[i] = best
+        self._record_time(layer, len(texts), started)
+        return out
+
+    def _apply_amount_rules(self, categories, decided, unique_upper, codes, amounts, mask):
+        """Vectorised layer 4 over the rows selected by mask (in place)."""
+        started = time.perf_counter()
+        rounded = np.round(amounts)
+        remaining = mask.copy()
+        for idx in self._amount_rules:
+            if not remaining.any():
+                break
+            rule = self.rules[idx]
+            cond = remaining.copy()
+            if "gt" in rule:
+                cond &= amounts > rule["gt"]
+            if "lt" in rule:
+                cond &= amounts < rule["lt"]
+            if "ge" in rule:
+                cond &= amounts >= rule["ge"]
+            if "le" in rule:
+                cond &= amounts <= rule["le"]
+            if "rounded_min" in rule:
+                cond &= rounded >= rule["rounded_min"]
+            if "rounded_multiple_of" in rule:
+                cond &= rounded % rule["rounded_multiple_of"] == 0
+            if "rounded_in" in rule:
+                cond &= np.isin(rounded, np.asarray(rule["rounded_in"], dtype=float))
+            if "contains_any" in rule:
+                needles = [str(n).upper() for n in rule["contains_any"]]
+                has = np.fromiter(
+                    (any(n in text for n in needles) for text in unique_upper),
+                    dtype=bool, count=len(unique_upper),
+                )
+                cond &= has[codes]
+            categories[cond] = rule["category"]
+            decided[cond] = idx
+            remaining &= ~cond
+        self._record_time(AMOUNT_LAYER, int(mask.sum()), started)
+
+    def _text_layers(self, texts, ml_predict, ml_min_confidence) -> tuple:
+        """Layers 1-3 over distinct non-empty texts: (categories, deciding rule or -1)."""
+        none = len(self.rules)
+        rule_categories = self._rule_categories
+
+        decided = self._match_layer(KEYWORD_LAYER, texts)
+        cats = rule_categories[np.where(decided >= 0, decided, none)]
+
+        if ml_predict is not None:
+            need = (cats == "Others") | (cats == "Transfer")
+            if need.any():
+                positions = np.flatnonzero(need)
+                labels, confidences = ml_predict([texts[i] for i in positions])
+                for pos, label, conf in zip(positions, labels, confidences):
+                    if label and conf > ml_min_confidence:
+                        cats[pos] = label
+                        decided[pos] = none
+
+        others = np.flatnonzero(cats == "Others")
+        if len(others):
+            matched = self._match_layer(PATTERN_LAYER, [texts[i] for i in others])
+            hit = matched >= 0
+            cats[others[hit]] = rule_categories[matched[hit]]
+            decided[others[hit]] = matched[hit]
+        return cats, decided
+
+    def categorize(self, descriptions, amounts, ml_predict=None, ml_min_confidence=0.4,
+                   cache=None) -> np.ndarray:
+        """
+        Categorise many transactions at once.
+
+        Layer 1 keyword rules run first. ml_predict(list_of_texts), if given,
+        is called once for every description that layer 1 left as Others or
+        Transfer. It returns (labels, confidences), and a label replaces the
+        category when its confidence beats ml_min_confidence. Layer 3
+        patterns then run on whatever is still Others, and layer 4 amount
+        rules refine Others by amount. Empty descriptions are always Others.
+
+        cache, if given, holds layer 1-3 results per description:
+        cache.lookup_categories(texts) returns a (category, rule index) or
+        None per text and cache.store_categories(texts, categories, rules)
+        records new ones. Only descriptions it misses go through the text
+        layers; amount rules always run. The caller keys the cache by this
+        table's fingerprint and the ML model.
+        Returns an object array of categories aligned with descriptions.
+        """
+        descs = [str(d).strip() for d in descriptions]
+        amounts = np.asarray(amounts, dtype=float)
+        n = len(descs)
+
+        # De-duplicate: every text layer runs once per distinct description
+        index = {}
+        codes = np.fromiter((index.setdefault(d, len(index)) for d in descs), dtype=np.int64, count=n)
+        uniques = list(index)
+        nonempty = np.fromiter((bool(u) for u in uniques), dtype=bool, count=len(uniques))
+
+        none = len(self.rules)
+        cats = np.full(len(uniques), "Others", dtype=object)
+        decided = np.full(len(uniques), -1, dtype=np.int64)
+        todo = np.flatnonzero(nonempty)
+        if cache is not None and len(todo):
+            found = cache.lookup_categories([uniques[i] for i in todo])
+            hit = np.fromiter((f is not None for f in found), dtype=bool, count=len(found))
+            for pos, (category, rule) in zip(todo[hit], (f for f in found if f is not None)):
+                cats[pos] = category
+                decided[pos] = rule if -1 <= rule <= none else -1
+            todo = todo[~hit]
+        if len(todo):
+            texts = [uniques[i] for i in todo]
+            cats[todo], decided[todo] = self._text_layers(texts, ml_predict, ml_min_confidence)
+            if cache is not None:
+                cache.store_categories(texts, cats[todo].tolist(), decided[todo].tolist())
+
+        categories = cats[codes]
+        decided = decided[codes]
+        if self._amount_rules:
+            mask = (categories == "Others") & nonempty[codes]
+            if mask.any():
+                unique_upper = [u.upper() for u in uniques]
+                self._apply_amount_rules(categories, decided, unique_upper, codes, amounts, mask)
+
+        counts = np.bincount(decided[decided >= 0], minlength=none + 1)
+        with self._lock:
+            self._hits += counts
+        return categories
+
+    # ── Instrumentation ──
+    def _record_time(self, layer, rows, started):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            t = self._timings[layer]
+            t["calls"] += 1
+            t["rows"] += rows
+            t["seconds"] += elapsed
+
+    def take_counters(self) -> tuple:
+        """
+        Hit counts and layer timings recorded since the last call, which
+        are reset, as a picklable (fingerprint, hits, timings) for
+        add_counters() in another process (see parallel.py).
+        """
+        with self._lock:
+            hits, self._hits = self._hits, np.zeros_like(self._hits)
+            timings = self._timings
+            self._timings = {layer: {"calls": 0, "rows": 0, "seconds": 0.0} for layer in LAYERS}
+        return self.fingerprint, hits.tobytes(), timings
+
+    def add_counters(self, counters: tuple):
+        """Add counters from take_counters(); ignored if they come from another table."""
+        fingerprint, hits, timings = counters
+        if fingerprint != self.fingerprint:
+            return
+        with self._lock:
+            self._hits += np.frombuffer(hits, dtype=np.int64)
+            for layer, t in timings.items():
+                for key, value in t.items():
+                    self._timings[layer][key] += value
+
+    def stats(self) -> dict:
+        """Per-rule hit counts (rows decided by each rule) and per-layer timing."""
+        with self._lock:
+            hits = self._hits.tolist()
+            timings = {layer: dict(t) for layer, t in self._timings.items()}
+        rules = [
+            {"name": r.get("name", f"rule-{i}"), "layer": r["layer"],
+             "category": r["category"], "hits": hits[i]}
+            for i, r in enumerate(self.rules)
+        ]
+        rules.append({"name": ML_HIT, "layer": "ml", "category": None, "hits": hits[-1]})
+        for t in timings.values():
+            t["seconds"] = round(t["seconds"], 6)
+        return {"version": self.version, "rules": rules, "layers": timings}
+
+
+def load_rules(path: str = None) -> RuleEngine:
+    """Load and compile a rule table from JSON."""
+    path = path or RULES_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            table = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuleError(f"Unable to load rules from {path}: {e}")
+    return RuleEngine(table)
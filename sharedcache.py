@@ -0,0 +1,276 @@
+"""
+Host-wide categorisation cache shared by every worker through one
+memory-mapped file.
+
+The file is a fixed-size open-addressing hash table of SLOT_SIZE-byte
+slots keyed by the stripped narration. A slot holds the text-layer
+category of the narration (keywords, ML and patterns; amount rules still
+run per row), the deciding rule index and the extracted merchant, and is
+stamped with the version of the rules and model that produced them, so
+entries from an older rule table or model read as misses.
+
+Reads take no locks: each slot carries a sequence number that writers make
+odd while they write, plus a CRC of its contents, and a reader that sees
+the number change, an odd number or a bad CRC treats the slot as a miss.
+Writers of all processes are serialised by flock() on the file (and a
+thread lock within a process) and write in batches, one lock per call.
+The mapping survives fork, but each process opens its own descriptor to
+lock with, since forked children would otherwise share one flock().
+Probing is linear over PROBE_SLOTS slots; when all are taken by live
+entries of other keys, the key's home slot is overwritten.
+
+The file is created (or re-created, when its geometry changes) under the
+lock and swapped in with os.replace, so a process still mapping an older
+file keeps a consistent view of it.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH", "data/catcache.bin")
+# 0 disables the shared cache
+SHARED_CACHE_MB = int(os.environ.get("SHARED_CACHE_MB", 64))
+SLOT_SIZE = 256
+PROBE_SLOTS = 8
+
+MAGIC = b"SSCACHE1"
+_HEADER = struct.Struct("<8sIIQ")          # magic, layout version, slot size, slot count
+HEADER_SIZE = 64
+LAYOUT_VERSION = 1
+# seq, key, stamp, text length, category length, merchant length, rule, crc
+_SLOT = struct.Struct("<IQQHBBhI")
+_SEQ = struct.Struct("<I")
+_PAYLOAD = SLOT_SIZE - _SLOT.size
+NO_RULE = -1
+
+
+def text_key(text: bytes) -> int:
+    """Non-zero 64-bit key of a UTF-8 narration, identical in every process."""
+    return int.from_bytes(hashlib.blake2b(text, digest_size=8).digest(), "little") or 1
+
+
+def stamp_of(*parts) -> int:
+    """Non-zero 64-bit version stamp of the rules and model identities."""
+    return text_key("\x1f".join(str(p) for p in parts).encode("utf-8"))
+
+
+def _crc(key, stamp, tl, cl, ml, rule, payload) -> int:
+    return zlib.crc32(payload, zlib.crc32(struct.pack("<QQHBBh", key, stamp, tl, cl, ml, rule)))
+
+
+class SharedCache:
+    def __init__(self, path=SHARED_CACHE_PATH, size_mb=SHARED_CACHE_MB):
+        self.path = path
+        self.slots = max(PROBE_SLOTS, size_mb * 2 ** 20 // SLOT_SIZE)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stale": 0, "stored": 0, "evicted": 0}
+        self._open()
+
+    # ── File ──
+    def _valid(self, f) -> bool:
+        f.seek(0)
+        head = f.read(_HEADER.size)
+        if len(head) != _HEADER.size:
+            return False
+        magic, version, slot_size, slots = _HEADER.unpack(head)
+        return (magic, version, slot_size, slots) == (MAGIC, LAYOUT_VERSION, SLOT_SIZE, self.slots) \
+            and os.fstat(f.fileno()).st_size == HEADER_SIZE + slots * SLOT_SIZE
+
+    def _open(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        lock_path = self.path + ".lock"
+        with open(lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    f = open(self.path, "r+b")
+                except FileNotFoundError:
+                    f = None
+                if f is None or not self._valid(f):
+                    if f is not None:
+                        f.close()
+                    tmp = f"{self.path}.{os.getpid()}.tmp"
+                    with open(tmp, "wb") as out:
+                        out.truncate(HEADER_SIZE + self.slots * SLOT_SIZE)
+                        out.write(_HEADER.pack(MAGIC, LAYOUT_VERSION, SLOT_SIZE, self.slots))
+                    os.replace(tmp, self.path)
+                    f = open(self.path, "r+b")
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self._mm = mmap.mmap(f.fileno(), 0)
+        self._inode = os.fstat(f.fileno()).st_ino
+        f.close()
+        self._writer = None
+        self._writer_pid = None
+
+    def _writer_file(self):
+        """
+        This process's descriptor on the mapped file, for flock(); None if
+        the path now holds another file (re-created with another geometry),
+        in which case this process only reads its old mapping.
+        """
+        if self._writer_pid != os.getpid():
+            self._writer_pid = os.getpid()
+            self._lock = threading.Lock()
+            try:
+                f = open(self.path, "rb")
+            except OSError:
+                f = None
+            if f is not None and os.fstat(f.fileno()).st_ino != self._inode:
+                f.close()
+                f = None
+            self._writer = f
+        return self._writer
+
+    # ── Reads (lock-free) ──
+    def _read(self, text: bytes, key: int, stamp: int):
+        """(category, rule, merchant) for text, None on a miss; False if stale."""
+        mm = self._mm
+        home = key % self.slots
+        stale = None
+        for i in range(PROBE_SLOTS):
+            off = HEADER_SIZE + ((home + i) % self.slots) * SLOT_SIZE
+            seq, k, st, tl, cl, ml, rule, crc = _SLOT.unpack_from(mm, off)
+            if k == 0:
+                break
+            if k != key or seq & 1:
+                continue
+            start = off + _SLOT.size
+            payload = mm[start:start + tl + cl + ml]
+            if _SEQ.unpack_from(mm, off)[0] != seq or crc != _crc(k, st, tl, cl, ml, rule, payload):
+                return None
+            if payload[:tl] != text:
+                continue
+            if st != stamp:
+                stale = False
+                continue
+            category = payload[tl:tl + cl].decode("utf-8") if cl else None
+            merchant = payload[tl + cl:].decode("utf-8") if ml else None
+            return category, rule, merchant
+        return stale
+
+    def get_many(self, texts, stamp) -> list:
+        """Per text (a str): (category, rule, merchant) with None for unknown fields, or None."""
+        out = []
+        hits = stale = 0
+        for text in texts:
+            raw = text.encode("utf-8")
+            found = self._read(raw, text_key(raw), stamp) if len(raw) <= _PAYLOAD else None
+            if found:
+                hits += 1
+            elif found is False:
+                stale += 1
+                found = None
+            out.append(found)
+        self._counters["hits"] += hits
+        self._counters["stale"] += stale
+        self._counters["misses"] += len(out) - hits
+        return out
+
+    # ── Writes (one lock per batch) ──
+    def _write(self, off, key, stamp, text, category, rule, merchant):
+        cat = category.encode("utf-8") if category else b""
+        mer = merchant.encode("utf-8") if merchant else b""
+        payload = text + cat + mer
+        if len(cat) > 255 or len(mer) > 255 or len(payload) > _PAYLOAD:
+            return False
+        mm = self._mm
+        seq = _SEQ.unpack_from(mm, off)[0]
+        _SEQ.pack_into(mm, off, (seq + 1) | 1)
+        start = off + _SLOT.size
+        mm[start:start + len(payload)] = payload
+        crc = _crc(key, stamp, len(text), len(cat), len(mer), rule, payload)
+        struct.pack_into("<QQHBBhI", mm, off + _SEQ.size, key, stamp, len(text), len(cat), len(mer), rule, crc)
+        _SEQ.pack_into(mm, off, ((seq + 1) | 1) + 1)
+        return True
+
+    def _put(self, text: bytes, stamp, category, rule, merchant):
+        mm = self._mm
+        key = text_key(text)
+        home = key % self.slots
+        free = None
+        for i in range(PROBE_SLOTS):
+            off = HEADER_SIZE + ((home + i) % self.slots) * SLOT_SIZE
+            _, k, st, tl, cl, ml, old_rule, _ = _SLOT.unpack_from(mm, off)
+            if k == 0 or st != stamp:
+                if free is None:
+                    free = off
+                if k == 0:
+                    break
+                continue
+            if k == key and mm[off + _SLOT.size:off + _SLOT.size + tl] == text:
+                # Same narration and version: fill in the fields not given
+                start = off + _SLOT.size + tl
+                if category is None and cl:
+                    category, rule = mm[start:start + cl].decode("utf-8"), old_rule
+                if merchant is None and ml:
+                    merchant = mm[start + cl:start + cl + ml].decode("utf-8")
+                return self._write(off, key, stamp, text, category, rule, merchant)
+        if free is None:
+            free = HEADER_SIZE + home * SLOT_SIZE
+            self._counters["evicted"] += 1
+        return self._write(free, key, stamp, text, category, rule, merchant)
+
+    def put_many(self, entries, stamp):
+        """Store (text, category, rule, merchant) tuples; None keeps a field as it is."""
+        stored = 0
+        writer = self._writer_file()
+        if writer is None:
+            return
+        with self._lock:
+            fcntl.flock(writer, fcntl.LOCK_EX)
+            try:
+                for text, category, rule, merchant in entries:
+                    raw = text.encode("utf-8")
+                    if raw and len(raw) <= _PAYLOAD:
+                        stored += self._put(raw, stamp, category, NO_RULE if rule is None else int(rule), merchant)
+            finally:
+                fcntl.flock(writer, fcntl.LOCK_UN)
+        self._counters["stored"] += stored
+
+    def view(self, stamp):
+        return CacheView(self, stamp)
+
+    def stats(self) -> dict:
+        return dict(self._counters, path=self.path, slots=self.slots, bytes=HEADER_SIZE + self.slots * SLOT_SIZE)
+
+
+class CacheView:
+    """A SharedCache bound to one rules/model stamp, in the shape rules.py and parallel.py use."""
+
+    def __init__(self, cache, stamp):
+        self.cache = cache
+        self.stamp = stamp
+
+    def lookup_categories(self, texts) -> list:
+        """(category, rule) per text, or None when not cached."""
+        return [
+            (e[0], e[1]) if e is not None and e[0] is not None else None
+            for e in self.cache.get_many(texts, self.stamp)
+        ]
+
+    def store_categories(self, texts, categories, rules):
+        self.cache.put_many(
+            ((t, c, r, None) for t, c, r in zip(texts, categories, rules)), self.stamp
+        )
+
+    def lookup_merchants(self, texts) -> list:
+        return [e[2] if e is not None else None for e in self.cache.get_many(texts, self.stamp)]
+
+    def store_merchants(self, texts, merchants):
+        self.cache.put_many(((t, None, None, m) for t, m in zip(texts, merchants)), self.stamp)
+
+
+def open_cache():
+    """The host's shared cache, or None when disabled or the file cannot be mapped."""
+    if SHARED_CACHE_MB <= 0:
+        return None
+    try:
+        return SharedCache()
+    except (OSError, ValueError):
+        return None
@@ -1,7 +1,11 @@
 import os
 import json
 import csv
+import time
 import random
+import argparse
+import resource
+import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
@@ -9,6 +13,8 @@ from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 import pickle
+import itertools
+import statistics
 
 # Ensure directories exist
 os.makedirs("data", exist_ok=True)
@@ -200,9 +206,254 @@ def build_training_dataset():
         
     print(f"Dataset generated with {len(samples)} examples at {csv_path}")
 
-def train_model():
+def build_large_dataset(n_rows, csv_path="data/training_data_large.csv"):
+    """Stream n_rows synthetic examples to csv_path without holding them in memory."""
+    categories = list(CANDIDATE_DATA.items())
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["text", "category"])
+        for _ in range(n_rows):
+            category, brands = random.choice(categories)
+            writer.writerow((generate_sample(category, random.choice(brands)), category))
+    print(f"Dataset generated with {n_rows} examples at {csv_path}")
+
+def _peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _iter_chunks(csv_path, chunksize):
+    return pd.read_csv(csv_path, usecols=["text", "category"], dtype=str,
+                       chunksize=chunksize, keep_default_na=False)
+
+def train_streaming(csv_path="data/training_data.csv", chunksize=50_000, epochs=3,
+                    holdout_every=10, model_path="model/expense_model.pkl"):
+    """
+    Out-of-core training for datasets that do not fit in memory.
+
+    The CSV is read in chunks of `chunksize` rows and fed to a stateless
+    HashingVectorizer + SGDClassifier with partial_fit, so memory is bounded
+    by the chunk size rather than the dataset. Rows whose text hashes into
+    bucket 0 of `holdout_every` are held out from training and scored after
+    every epoch. Samples/sec, peak RSS and held-out accuracy are printed per
+    epoch and returned as a list of dicts.
+    """
+    from online import make_hashing_pipeline, partial_fit_batches
+
+    if not os.path.exists(csv_path):
+        build_training_dataset()
+
+    # partial_fit needs every class up front; one cheap pass over the labels
+    classes = set()
+    for chunk in _iter_chunks(csv_path, chunksize):
+        classes.update(chunk["category"].unique())
+    classes = sorted(classes)
+
+    model = make_hashing_pipeline()
+    rng = np.random.default_rng(42)
+    report = []
+
+    for epoch in range(1, epochs + 1):
+        trained = 0
+        started = time.perf_counter()
+        for chunk in _iter_chunks(csv_path, chunksize):
+            holdout = pd.util.hash_pandas_object(chunk["text"], index=False).values % holdout_every == 0
+            train_rows = chunk[~holdout]
+            order = rng.permutation(len(train_rows))
+            texts = train_rows["text"].values[order].tolist()
+            labels = train_rows["category"].values[order].tolist()
+            partial_fit_batches(model, texts, labels, classes, batch_size=1000)
+            trained += len(texts)
+        elapsed = time.perf_counter() - started
+
+        correct = total = 0
+        for chunk in _iter_chunks(csv_path, chunksize):
+            holdout = pd.util.hash_pandas_object(chunk["text"], index=False).values % holdout_every == 0
+            test_rows = chunk[holdout]
+            if len(test_rows):
+                predictions = model.predict(test_rows["text"].tolist())
+                correct += int((predictions == test_rows["category"].values).sum())
+                total += len(test_rows)
+
+        stats = {
+            "epoch": epoch,
+            "samples": trained,
+            "samples_per_sec": round(trained / elapsed, 1) if elapsed > 0 else 0.0,
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "holdout_accuracy": round(correct / total, 4) if total else None,
+        }
+        report.append(stats)
+        print(
+            f"Epoch {epoch}/{epochs}: {stats['samples']} samples at "
+            f"{stats['samples_per_sec']:,.0f}/s, peak RSS {stats['peak_rss_mb']} MB, "
+            f"held-out accuracy {stats['holdout_accuracy']}"
+        )
+
+    with open(model_path, "wb") as f:
+        pickle.dump(model, f)
+    print(f"Model trained and saved successfully at {model_path}!")
+
+    classes_path = "model/categories.json"
+    with open(classes_path, "w", encoding="utf-8") as f:
+        json.dump(list(model.classes_), f, indent=4)
+    print(f"Saved categories list at {classes_path}")
+
+    return report
+
+# Search space for search_models(): vectorizer shape x feature cap x regularisation
+SEARCH_VECTORIZERS = [
+    {"analyzer": "word", "ngram_range": (1, 2)},
+    {"analyzer": "word", "ngram_range": (1, 3)},
+    {"analyzer": "char_wb", "ngram_range": (2, 4)},
+    {"analyzer": "char_wb", "ngram_range": (3, 5)},
+]
+SEARCH_MAX_FEATURES = [None, 20000, 5000]
+SEARCH_C = [1.0, 5.0, 20.0]
+
+def _build_pipeline(vectorizer, max_features, C):
+    return Pipeline([
+        ("tfidf", TfidfVectorizer(
+            lowercase=True,
+            sublinear_tf=True,
+            max_features=max_features,
+            **vectorizer
+        )),
+        ("clf", LogisticRegression(
+            max_iter=1000,
+            class_weight="balanced",
+            C=C
+        ))
+    ])
+
+def _fit_candidate(params, X_train, y_train, X_test, y_test):
+    """Fit one configuration and return (params, model, accuracy). Runs in a worker."""
+    model = _build_pipeline(**params)
+    model.fit(X_train, y_train)
+    accuracy = float((model.predict(X_test) == y_test).mean())
+    return params, model, accuracy
+
+def _measure_latency(model, texts, single_runs=200, batch_size=1000):
+    """
+    Latency as seen by engine._layer2_ml, which calls only predict_proba:
+    median ms for one row, and per-row ms over a batch_size batch.
+    """
+    single = []
+    for i in range(single_runs):
+        row = [texts[i % len(texts)]]
+        started = time.perf_counter()
+        model.predict_proba(row)
+        single.append((time.perf_counter() - started) * 1000)
+
+    batch = (texts * (batch_size // len(texts) + 1))[:batch_size]
+    started = time.perf_counter()
+    model.predict_proba(batch)
+    batch_ms = (time.perf_counter() - started) * 1000
+
+    return statistics.median(single), batch_ms / batch_size
+
+def _pareto_front(candidates):
+    """Flag candidates no other candidate beats on accuracy, latency and size at once."""
+    keys = ("single_row_ms", "batch_row_ms", "model_bytes")
+    for c in candidates:
+        c["pareto"] = not any(
+            o is not c
+            and o["accuracy"] >= c["accuracy"]
+            and all(o[k] <= c[k] for k in keys)
+            and (o["accuracy"] > c["accuracy"] or any(o[k] < c[k] for k in keys))
+            for o in candidates
+        )
+
+def search_models(csv_path="data/training_data.csv", n_jobs=-1, latency_budget_ms=None,
+                  model_path="model/expense_model.pkl", report_path="model/search_report.json"):
+    """
+    Grid-search vectorizer and regularisation settings and keep the best model
+    that fits a per-request latency budget.
+
+    Candidates are fitted in parallel on all cores with joblib. Latency is
+    then measured one candidate at a time in this process, so the timings do
+    not compete with each other for CPU. The saved model is the most accurate
+    Pareto-optimal candidate whose single-row latency is within
+    latency_budget_ms (or the fastest Pareto candidate if none fit). Every
+    candidate's scores are written to report_path.
+    """
+    from joblib import Parallel, delayed
+
+    if not os.path.exists(csv_path):
+        build_training_dataset()
+
+    data = pd.read_csv(csv_path)
+    X_train, X_test, y_train, y_test = train_test_split(
+        data["text"], data["category"], test_size=0.20, random_state=42, stratify=data["category"]
+    )
+
+    grid = [
+        {"vectorizer": v, "max_features": m, "C": c}
+        for v, m, c in itertools.product(SEARCH_VECTORIZERS, SEARCH_MAX_FEATURES, SEARCH_C)
+    ]
+    print(f"Fitting {len(grid)} candidates in parallel...")
+    fitted = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_candidate)(params, X_train, y_train, X_test, y_test) for params in grid
+    )
+
+    sample_texts = X_test.tolist()
+    candidates = []
+    models = []
+    for params, model, accuracy in fitted:
+        single_ms, batch_ms = _measure_latency(model, sample_texts)
+        candidates.append({
+            "analyzer": params["vectorizer"]["analyzer"],
+            "ngram_range": list(params["vectorizer"]["ngram_range"]),
+            "max_features": params["max_features"],
+            "C": params["C"],
+            "accuracy": round(accuracy, 4),
+            "single_row_ms": round(single_ms, 3),
+            "batch_row_ms": round(batch_ms, 4),
+            "model_bytes": len(pickle.dumps(model)),
+        })
+        models.append(model)
+    _pareto_front(candidates)
+
+    front = [i for i, c in enumerate(candidates) if c["pareto"]]
+    within_budget = [
+        i for i in front
+        if latency_budget_ms is None or candidates[i]["single_row_ms"] <= latency_budget_ms
+    ]
+    if within_budget:
+        best = max(within_budget, key=lambda i: (candidates[i]["accuracy"], -candidates[i]["single_row_ms"]))
+    else:
+        best = min(front, key=lambda i: candidates[i]["single_row_ms"])
+    candidates[best]["selected"] = True
+
+    for c in sorted(candidates, key=lambda c: -c["accuracy"]):
+        print(
+            f"{'*' if c.get('selected') else ' '}{'P' if c['pareto'] else ' '} "
+            f"{c['analyzer']:<7} {str(tuple(c['ngram_range'])):<7} max_features={str(c['max_features']):<5} "
+            f"C={c['C']:<4} acc={c['accuracy']:.4f} single={c['single_row_ms']:.2f}ms "
+            f"batch={c['batch_row_ms']:.3f}ms/row size={c['model_bytes'] / 1024:.0f}KB"
+        )
+
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "latency_budget_ms": latency_budget_ms,
+            "train_rows": len(X_train),
+            "test_rows": len(X_test),
+            "candidates": candidates,
+        }, f, indent=4)
+    print(f"Search report saved at {report_path}")
+
+    model = models[best]
+    with open(model_path, "wb") as f:
+        pickle.dump(model, f)
+    print(f"Selected model saved successfully at {model_path}!")
+
+    classes_path = "model/categories.json"
+    with open(classes_path, "w", encoding="utf-8") as f:
+        json.dump(list(model.classes_), f, indent=4)
+    print(f"Saved categories list at {classes_path}")
+
+    return candidates[best]
+
+def train_model(csv_path="data/training_data.csv"):
     """Load dataset, train model pipeline, and save expense_model.pkl & categories.json."""
-    csv_path = "data/training_data.csv"
     if not os.path.exists(csv_path):
         build_training_dataset()
         
@@ -253,4 +504,32 @@ def train_model():
     print(f"Saved categories list at {classes_path}")
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the expense categorisation model.")
+    parser.add_argument("--stream", action="store_true",
+                        help="out-of-core training with hashed features and partial_fit")
+    parser.add_argument("--data", default=None,
+                        help="training CSV (text,category); default data/training_data.csv")
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--synthetic-rows", type=int, default=0,
+                        help="first generate this many synthetic rows into --data (required)")
+    parser.add_argument("--search", action="store_true",
+                        help="parallel hyperparameter search with latency-aware model selection")
+    parser.add_argument("--latency-budget-ms", type=float, default=None,
+                        help="max single-row predict latency for --search")
+    parser.add_argument("--jobs", type=int, default=-1, help="worker processes for --search")
+    args = parser.parse_args()
+
+    # Synthetic rows overwrite --data, so never default it to the curated set
+    if args.synthetic_rows and not args.data:
+        parser.error("--synthetic-rows needs an explicit --data file to write")
+    data = args.data or "data/training_data.csv"
+
+    if args.synthetic_rows:
+        build_large_dataset(args.synthetic_rows, data)
+    if args.search:
+        search_models(data, n_jobs=args.jobs, latency_budget_ms=args.latency_budget_ms)
+    elif args.stream:
+        train_streaming(data, chunksize=args.chunksize, epochs=args.epochs)
+    else:
+        train_model(data)
@@ -0,0 +1,110 @@
+"""
+Compact typed layout of the transaction frame.
+
+Every stage from parse_statement() to the exports works on one schema:
+
+    Date                            datetime64[ns], normalised to the day
+                                    (NaT when the statement's text cannot
+                                    be read as a date)
+    Category, Merchant              category (dictionary-encoded: they
+                                    repeat across a ledger)
+    Description                     category when narrations repeat
+                                    (at most MAX_UNIQUE_RATIO distinct),
+                                    else object strings
+    Debit, Credit, Balance, Amount  int64 paise (exact, see money.py)
+    Reconciled                      bool
+
+compact() converts a frame to this layout in place, leaving columns that
+already have it alone, so every stage can call it cheaply (only a plain
+Description is counted again); money given as floats is taken to be
+rupees. Categorical columns only accept values among
+their categories, so code that fills or renders rows goes through
+display_frame(), which turns the frame back into plain strings and rupees.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import money
+
+CATEGORICAL_COLUMNS = ("Category", "Merchant")
+# Columns dictionary-encoded only when their values repeat enough for it to
+# save memory. Real narrations mostly carry a UPI/NEFT reference, so nearly
+# every one is unique, and a dictionary of unique strings costs more than
+# the plain column.
+REPEATED_COLUMNS = ("Description",)
+MAX_UNIQUE_RATIO = 0.5
+MONEY_COLUMNS = ("Debit", "Credit", "Balance", "Amount")
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def parse_dates(values) -> pd.Series:
+    """
+    Day of each date as datetime64 (NaT if unreadable). Text is read day
+    first with the format guessed from the first date; dates in another
+    format are retried one by one.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.normalize()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        days = pd.to_datetime(values, errors="coerce", dayfirst=True)
+        missing = days.isna() & values.notna()
+        if missing.any():
+            days[missing] = pd.to_datetime(values[missing], errors="coerce", dayfirst=True, format="mixed")
+    return days.dt.normalize()
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the columns of df present in the schema to their compact dtypes (in place)."""
+    if "Date" in df.columns and not pd.api.types.is_datetime64_dtype(df["Date"]):
+        df["Date"] = parse_dates(df["Date"])
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    for col in REPEATED_COLUMNS:
+        if col in df.columns and df[col].dtype == object:
+            codes, uniques = pd.factorize(df[col])
+            if len(uniques) <= MAX_UNIQUE_RATIO * len(df):
+                df[col] = pd.Categorical.from_codes(codes, uniques)
+    for col in MONEY_COLUMNS:
+        if col in df.columns and df[col].dtype != np.int64:
+            values = df[col]
+            if pd.api.types.is_integer_dtype(values):
+                df[col] = values.astype(np.int64)
+            else:
+                df[col] = money.from_rupees(pd.to_numeric(values, errors="coerce"))
+    if "Reconciled" in df.columns and df["Reconciled"].dtype != bool:
+        df["Reconciled"] = df["Reconciled"].astype(bool)
+    return df
+
+
+def display_frame(df: pd.DataFrame, fill: dict = None) -> pd.DataFrame:
+    """
+    A copy of df with dates as ISO day strings, money in rupees and
+    categorical columns as plain objects, missing values replaced from fill
+    (column -> value).
+    """
+    fill = fill or {}
+    columns = {}
+    for col in df.columns:
+        s = df[col]
+        if col in MONEY_COLUMNS:
+            s = money.to_rupees(s)
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            s = s.dt.strftime(DATE_FORMAT)
+        elif isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype(object)
+        if col in fill:
+            s = s.fillna(fill[col])
+        columns[col] = s
+    out = pd.DataFrame(columns, index=df.index)
+    out.attrs = df.attrs
+    return out
+
+
+def bytes_per_row(df: pd.DataFrame) -> float:
+    """Deep in-memory size of df per row."""
+    return float(df.memory_usage(index=True, deep=True).sum()) / max(len(df), 1)